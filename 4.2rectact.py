@@ -4,6 +4,7 @@ from tavily import TavilyClient
 from typing import Literal, Dict, Any
 from llm_client import HelloAgentsLLM
 from tool import ToolExecutor
+from tools.local_search import LocalSearchTool  # 导入 tool 时已把 my-hello-agents 加入导入路径
 import re
 
 load_dotenv()
@@ -103,7 +104,9 @@ class REACTAgent:
             print(f"--- 第 {current_step} 步 ---")
 
             # 1. 格式化提示词
-            tools_desc = self.tool_executor.getAvailableTools()
+            # 以问题和最近一次观察作为检索依据，工具很多时只列出相关的工具
+            tool_query = question + ("\n" + self.history[-1] if self.history else "")
+            tools_desc = self.tool_executor.getAvailableTools(tool_query)
             history_str = "\n".join(self.history)
             prompt = REACT_PROMPT_TEMPLATE.format(
                 tools=tools_desc,
@@ -192,6 +195,11 @@ if __name__ == '__main__':
     search_description = "一个网页搜索引擎，当你需要回答关于时事、事实一级在你的知识中找不到的信息时，应用此工具。"
     tool_executor.registerTool("Search", search_description, search)
 
+    # 3. 设置 LOCAL_DOCS_DIR 后注册离线的本地文档搜索，内部资料直接查本地索引，无需联网
+    docs_dir = os.getenv("LOCAL_DOCS_DIR")
+    if docs_dir:
+        index_dir = os.getenv("LOCAL_SEARCH_INDEX_DIR", ".local_search_index")
+        tool_executor.registerToolObject(LocalSearchTool(index_dir, docs_dir))
 
     agent = REACTAgent(llm_client, tool_executor)
     agent.run("华为最新手机以及它的卖点")
\ No newline at end of file
@@ -1,5 +1,14 @@
-from llm_client import HelloAgentsLLM
-import ast
+from llm_client import HelloAgentsLLM, estimate_tokens
+from structured_output import StructuredOutputEngine, StructuredOutputError, parse_lenient
+from text_similarity import bigram_cosine, bigram_vector
+import re
+import time
+import queue
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,14 +26,185 @@ PLANER_PROMPT_TEMPLATE = """
 ```
 """
 
+class PlanCache:
+    """
+    计划缓存：模板化的相似问题直接复用已有计划，跳过规划阶段的 LLM 调用。
+
+    - 问题中的数字和引号内的实体被替换为槽位，得到问题模板；缓存键为 (计划格式, 模板)，
+      普通计划（字符串列表）与 DAG 计划（带依赖的字典列表）即使共用一个缓存也互不命中
+    - 模板完全相同时 O(1) 命中；否则按字符二元组余弦相似度查找，超过阈值视为命中
+    - 命中后把新问题的槽位值代入缓存的计划
+    - 按 LRU 淘汰，并统计命中率
+    """
+    # 不匹配占位符内部的编号（如 <N0>）
+    NUMBER_PATTERN = re.compile(r"(?<![\d.])(?<!<N)(?<!<E)\d+(?:\.\d+)?")
+    ENTITY_PATTERN = re.compile(r"[“\"「『]([^”\"」』]+)[”\"」』]")
+    SLOT_PATTERN = re.compile(r"<([NE])(\d+)>")
+
+    def __init__(self, capacity: int = 256, similarity_threshold: float = 0.9):
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[tuple[str, str], dict]" = OrderedDict()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+
+    @classmethod
+    def extract_template(cls, question: str) -> tuple[str, list[str], list[str]]:
+        """将问题拆分为模板与槽位值，返回 (模板, 实体列表, 数字列表)"""
+        entities: list[str] = []
+        numbers: list[str] = []
+
+        def replace_entity(match):
+            entities.append(match.group(1))
+            return f"<E{len(entities) - 1}>"
+
+        def replace_number(match):
+            numbers.append(match.group(0))
+            return f"<N{len(numbers) - 1}>"
+
+        template = cls.ENTITY_PATTERN.sub(replace_entity, question)
+        template = cls.NUMBER_PATTERN.sub(replace_number, template)
+        return " ".join(template.split()), entities, numbers
+
+    @staticmethod
+    def _step_text(item) -> str:
+        return str(item["step"] if isinstance(item, dict) else item)
+
+    @staticmethod
+    def _with_step_text(item, text: str):
+        return dict(item, step=text) if isinstance(item, dict) else text
+
+    def _templatize_plan(self, plan: list, entities: list[str], numbers: list[str]) -> Optional[list]:
+        """
+        将计划中出现的槽位值替换为占位符。
+        计划中若含有问题里没有的数字（例如已经算出的中间结果），换了数字后就会出错，此时不缓存
+        """
+        templated = []
+        for item in plan:
+            text = self._step_text(item)
+            for i, entity in enumerate(entities):
+                text = text.replace(entity, f"<E{i}>")
+
+            def replace_number(match):
+                value = match.group(0)
+                return f"<N{numbers.index(value)}>" if value in numbers else match.group(0)
+
+            text = self.NUMBER_PATTERN.sub(replace_number, text)
+            # 占位符内的编号不算数字，其余数字说明计划依赖了具体数值
+            if self.NUMBER_PATTERN.search(self.SLOT_PATTERN.sub("", text)):
+                return None
+            templated.append(self._with_step_text(item, text))
+        return templated
+
+    def _fill_plan(self, plan_template: list, entities: list[str], numbers: list[str]) -> list:
+        def replace_slot(match):
+            kind, index = match.group(1), int(match.group(2))
+            return (entities if kind == "E" else numbers)[index]
+
+        return [
+            self._with_step_text(item, self.SLOT_PATTERN.sub(replace_slot, self._step_text(item)))
+            for item in plan_template
+        ]
+
+    def get(self, question: str, kind: str = "steps") -> Optional[list]:
+        """
+        查找可复用的计划，未命中返回 None
+
+        kind 为计划格式："steps" 为字符串列表，"dag" 为带依赖关系的字典列表
+        """
+        self.lookups += 1
+        template, entities, numbers = self.extract_template(question)
+
+        entry = self._entries.get((kind, template))
+        if entry is not None:
+            self._entries.move_to_end((kind, template))
+            self.exact_hits += 1
+            return self._fill_plan(entry["plan"], entities, numbers)
+
+        vector = bigram_vector(template)
+        best_key, best_score = None, 0.0
+        for key, candidate in self._entries.items():
+            # 格式不同的计划不能复用，槽位数量不同的模板无法代入
+            if key[0] != kind or candidate["slots"] != (len(entities), len(numbers)):
+                continue
+            score = bigram_cosine(vector, candidate["vector"])
+            if score > best_score:
+                best_key, best_score = key, score
+
+        if best_key is not None and best_score >= self.similarity_threshold:
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            print(f"♻️ 计划缓存相似命中（相似度 {best_score:.2f}）")
+            return self._fill_plan(self._entries[best_key]["plan"], entities, numbers)
+        return None
+
+    def put(self, question: str, plan: list, kind: str = "steps"):
+        """缓存一个计划；计划依赖具体数值而无法模板化时不缓存"""
+        if not plan:
+            return
+        template, entities, numbers = self.extract_template(question)
+        plan_template = self._templatize_plan(plan, entities, numbers)
+        if plan_template is None:
+            return
+
+        self._entries[(kind, template)] = {
+            "plan": plan_template,
+            "vector": bigram_vector(template),
+            "slots": (len(entities), len(numbers)),
+        }
+        self._entries.move_to_end((kind, template))
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.exact_hits + self.similar_hits) / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> dict:
+        """返回缓存的命中统计"""
+        hits = self.exact_hits + self.similar_hits
+        return {
+            "size": len(self._entries),
+            "lookups": self.lookups,
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.lookups - hits,
+            "hit_rate": self.hit_rate,
+        }
+
+
 class Planner:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    # 写入计划缓存时的计划格式
+    PLAN_KIND = "steps"
+
+    def __init__(self, llm_client: HelloAgentsLLM, cache: Optional[PlanCache] = None,
+                 engine: Optional[StructuredOutputEngine] = None):
         self.llm_client = llm_client
+        self.cache = cache
+        # 结构化输出引擎：本地修复格式问题，仍不合法时只追问一次，而不是整体重新规划
+        self.engine = engine or StructuredOutputEngine()
     
     def plan(self, question: str) -> list[str]:
         """
         根据用户问题生成一个行动计划
         """
+        if self.cache is not None:
+            cached_plan = self.cache.get(question, self.PLAN_KIND)
+            if cached_plan is not None:
+                print(f"✅ 命中计划缓存，跳过规划：{cached_plan}")
+                return cached_plan
+
+        plan = self._generate(question)
+        if self.cache is not None:
+            self.cache.put(question, plan, self.PLAN_KIND)
+        return plan
+
+    def _generate(self, question: str) -> list[str]:
+        """
+        调用 LLM 生成计划
+        """
         prompt = PLANER_PROMPT_TEMPLATE.format(question=question)
 
         # 为了生成计划，创建一个简单的消息列表
@@ -36,20 +216,17 @@ class Planner:
 
         print(f"✅ 计划已生成:\n{response_text}")
 
-        # 解析LLM输出的列表字符串
+        # 解析LLM输出的列表：容忍缺失的代码块围栏、JSON 写法、尾逗号与被截断的输出
         try:
-            # 找到 ```python 和 ``` 之间的内容
-            plan_str = response_text.split("```python")[1].split("```")[0].strip()
-            # 使用 ast.literal_eval 来安全地执行字符串，将其转换为 Python 列表
-            plan = ast.literal_eval(plan_str)
-            return plan if isinstance(plan, list) else []
-        except (ValueError, SyntaxError, IndexError) as e:
+            result = self.engine.generate(self._ask, messages, List[str], response=response_text)
+            return result.value
+        except StructuredOutputError as e:
             print(f"❌ 解析计划时出错: {e}")
             print(f"原始响应：{response_text}")
             return []
-        except Exception as e:
-            print(f"❌ 解析计划时发生未知错误: {e}")
-            return []
+
+    def _ask(self, messages: list[dict], response_format: Optional[dict] = None) -> Optional[str]:
+        return self.llm_client.think(messages=messages, response_format=response_format)
         
 EXECUTOR_PROMPT_TEMPLATE = """
 你是一位顶级的AI执行专家，你的任务是严格按照给定的计划，一步步地解决问题。
@@ -71,49 +248,576 @@ EXECUTOR_PROMPT_TEMPLATE = """
 请仅输出针对“当前步骤”的回答：
 """
 
+class ContextPolicy(ABC):
+    """
+    执行器的上下文策略：决定每一步的提示词中包含计划的哪些部分、以及哪些历史结果。
+    子类通过 render_plan / render_history 控制提示词内容，通过 record 记录每一步的结果。
+    """
+    # 追加在执行提示词末尾的额外指令
+    instruction = ""
+
+    def reset(self):
+        """开始执行新计划前清空状态"""
+        pass
+
+    def render_plan(self, plan: list[dict], index: int) -> str:
+        return str([item["step"] for item in plan])
+
+    @abstractmethod
+    def render_history(self, plan: list[dict], index: int) -> str:
+        """返回当前步骤提示词中的历史部分"""
+        pass
+
+    @abstractmethod
+    def record(self, plan: list[dict], index: int, result: str):
+        """记录一步的执行结果"""
+        pass
+
+
+class FullHistoryPolicy(ContextPolicy):
+    """
+    原始行为：每一步都带上完整计划和之前所有步骤的完整结果。
+    提示词随步骤数线性增长，整个计划的提示词总量按平方增长。
+    """
+    def reset(self):
+        self.history = ""
+
+    def render_history(self, plan: list[dict], index: int) -> str:
+        return self.history
+
+    def record(self, plan: list[dict], index: int, result: str):
+        self.history += f"步骤 {index+1}：{plan[index]['step']}\n结果：{result}\n\n"
+
+
+class WindowedPlanPolicy(ContextPolicy):
+    """
+    有界上下文策略的公共部分：计划只展示当前步骤附近的窗口，单个结果超长时截断。
+    """
+    def __init__(self, plan_window: int = 2, max_result_chars: int = 500):
+        self.plan_window = plan_window
+        self.max_result_chars = max_result_chars
+
+    def render_plan(self, plan: list[dict], index: int) -> str:
+        start = max(0, index - self.plan_window)
+        end = min(len(plan), index + self.plan_window + 1)
+        lines = [f"（共 {len(plan)} 步，当前为第 {index+1} 步）"]
+        for i in range(start, end):
+            marker = "👉 " if i == index else ""
+            lines.append(f"{marker}{i+1}. {plan[i]['step']}")
+        return "\n".join(lines)
+
+    def _clip(self, text: str) -> str:
+        if len(text) <= self.max_result_chars:
+            return text
+        return text[:self.max_result_chars] + "……（已截断）"
+
+
+class DependencyPolicy(WindowedPlanPolicy):
+    """
+    只包含当前步骤声明的依赖步骤的结果。
+    普通的字符串计划没有声明依赖，默认依赖上一步。
+    """
+    def reset(self):
+        self.results: dict[int, str] = {}
+
+    def render_history(self, plan: list[dict], index: int) -> str:
+        ids = {item["id"]: i for i, item in enumerate(plan)}
+        return "\n\n".join(
+            f"步骤 {ids[d]+1}：{plan[ids[d]]['step']}\n结果：{self._clip(self.results[d])}"
+            for d in plan[index]["depends_on"] if d in self.results
+        )
+
+    def record(self, plan: list[dict], index: int, result: str):
+        self.results[plan[index]["id"]] = result
+
+
+class RollingSummaryPolicy(WindowedPlanPolicy):
+    """
+    最近 recent_steps 步的结果原样保留，更早的结果滚动压缩进一段长度有界的摘要。
+    摘要超过 summary_max_chars 时，若提供了 summarizer（例如一次 LLM 调用）则用它重新压缩，
+    否则丢弃最早的摘要行。
+    """
+    def __init__(
+        self,
+        recent_steps: int = 2,
+        summary_line_chars: int = 80,
+        summary_max_chars: int = 800,
+        summarizer: Optional[Callable[[str], str]] = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.recent_steps = recent_steps
+        self.summary_line_chars = summary_line_chars
+        self.summary_max_chars = summary_max_chars
+        self.summarizer = summarizer
+
+    def reset(self):
+        self.summary_lines: list[str] = []
+        self.recent: list[tuple[int, str]] = []
+
+    def render_history(self, plan: list[dict], index: int) -> str:
+        parts = []
+        if self.summary_lines:
+            parts.append("更早步骤的摘要：\n" + "\n".join(self.summary_lines))
+        for i, result in self.recent:
+            parts.append(f"步骤 {i+1}：{plan[i]['step']}\n结果：{self._clip(result)}")
+        return "\n\n".join(parts)
+
+    def record(self, plan: list[dict], index: int, result: str):
+        self.recent.append((index, result))
+        while len(self.recent) > self.recent_steps:
+            old_index, old_result = self.recent.pop(0)
+            line = " ".join(old_result.split())[:self.summary_line_chars]
+            self.summary_lines.append(f"- 步骤 {old_index+1}：{line}")
+        self._bound_summary()
+
+    def _bound_summary(self):
+        if sum(len(line) + 1 for line in self.summary_lines) <= self.summary_max_chars:
+            return
+        if self.summarizer is not None:
+            compressed = self.summarizer("\n".join(self.summary_lines))
+            self.summary_lines = [compressed[:self.summary_max_chars]]
+            return
+        while self.summary_lines and sum(len(line) + 1 for line in self.summary_lines) > self.summary_max_chars:
+            self.summary_lines.pop(0)
+
+
+class ScratchpadPolicy(WindowedPlanPolicy):
+    """
+    键值草稿本：要求模型在结果末尾以“事实：名称=值”的形式给出关键结论，
+    后续步骤只看到这些提取出的事实和上一步的结果，而不是全部历史。
+    """
+    FACT_PATTERN = re.compile(r"^\s*事实[:：]\s*(.+?)\s*[=＝]\s*(.+?)\s*$", re.MULTILINE)
+    instruction = "\n如果本步骤得出了后续步骤可能用到的关键数值或结论，请在回答末尾另起一行，以“事实：名称=值”的格式列出，每行一条。"
+
+    def __init__(self, max_facts: int = 20, **kwargs):
+        super().__init__(**kwargs)
+        self.max_facts = max_facts
+
+    def reset(self):
+        self.facts: dict[str, str] = {}
+        self.last: Optional[tuple[int, str]] = None
+
+    def render_history(self, plan: list[dict], index: int) -> str:
+        parts = []
+        if self.facts:
+            parts.append("已知事实：\n" + "\n".join(f"- {k} = {v}" for k, v in self.facts.items()))
+        if self.last is not None:
+            i, result = self.last
+            parts.append(f"上一步（步骤 {i+1}：{plan[i]['step']}）的结果：\n{self._clip(result)}")
+        return "\n\n".join(parts)
+
+    def record(self, plan: list[dict], index: int, result: str):
+        for key, value in self.FACT_PATTERN.findall(result):
+            # 同名事实以最新的为准，并移动到末尾
+            self.facts.pop(key, None)
+            self.facts[key] = value
+        while len(self.facts) > self.max_facts:
+            self.facts.pop(next(iter(self.facts)))
+        self.last = (index, result)
+
+
 class Executor:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def __init__(self, llm_client: HelloAgentsLLM, context_policy: Optional[ContextPolicy] = None):
+        """
+        context_policy 决定每一步提示词中的上下文，默认保留完整历史（原始行为）
+        """
         self.llm_client = llm_client
+        self.context_policy = context_policy or FullHistoryPolicy()
+        self.step_prompt_tokens: list[int] = [] # 每一步提示词的估算 token 数
     
-    def execute(self, question: str, plan: list[str]) -> str:
+    def execute(self, question: str, plan: list) -> str:
         """
         根据计划，逐步执行并解决问题
         """
-        history = "" # 用于存储历史步骤和结果的字符串
+        # 统一为带编号与依赖的步骤，普通字符串计划视为依次依赖
+        plan = normalize_dag_plan(plan)
+        policy = self.context_policy
+        policy.reset()
+        self.step_prompt_tokens = []
+        response_text = ""
 
         print("\n--- 正在执行计划 ---")
 
-        for i, step in enumerate(plan):
+        for i, item in enumerate(plan):
+            step = item["step"]
             print(f"\n-> 正在执行步骤 {i+1}/{len(plan)}: {step}")
 
+            history = policy.render_history(plan, i)
             prompt = EXECUTOR_PROMPT_TEMPLATE.format(
                 question=question,
-                plan=plan,
+                plan=policy.render_plan(plan, i),
                 history=history if history else "无", # 如果是第一步，则历史为空
                 current_step=step 
-            )
+            ) + policy.instruction
+            self.step_prompt_tokens.append(estimate_tokens(prompt))
 
             messages = [{"role": "user", "content": prompt}]
 
             response_text = self.llm_client.think(messages=messages) or ""
 
-            # 更新历史记录，为下一步做准备
-            history += f"步骤 {i+1}：{step}\n结果：{response_text}\n\n"
+            # 更新上下文，为下一步做准备
+            policy.record(plan, i, response_text)
 
             print(f"✅ 步骤 {i+1} 已完成，结果: {response_text}")
+
+        print(
+            f"\n📊 提示词 token 统计（{type(policy).__name__}）：每步 {self.step_prompt_tokens}，"
+            f"合计 {sum(self.step_prompt_tokens)}"
+        )
         
         # 循环结束后，最后一步的响应就是最终答案
         final_answer = response_text
         return final_answer
 
+DAG_PLANNER_PROMPT_TEMPLATE = """
+你是一个顶级的 AI 规划专家，你的任务是将用户提出的复杂问题分解成一个由多个简单步骤组成的行动计划。
+请确保计划中的每个步骤都是一个独立的、可执行的子任务，并明确标注它依赖哪些之前的步骤。
+互不依赖的步骤可以被同时执行，所以请只声明真正需要的依赖。
+你的输出必须是一个 Python 列表，其中每个元素都是一个字典，包含以下字段：
+- "id": 步骤编号（从 1 开始的整数）
+- "step": 描述子任务的字符串
+- "depends_on": 该步骤依赖的步骤编号列表，只能引用编号更小的步骤，没有依赖时为 []
+
+问题：{question}
+
+请严格按照以下格式输出你的计划，```python 与 ``` 作为前后缀是必要的:
+```python
+[
+    {{"id": 1, "step": "步骤1", "depends_on": []}},
+    {{"id": 2, "step": "步骤2", "depends_on": []}},
+    {{"id": 3, "step": "步骤3", "depends_on": [1, 2]}}
+]
+```
+"""
+
+class DAGPlanner(Planner):
+    """
+    生成带依赖关系的计划。
+    计划中的每个步骤形如 {"id": 1, "step": "...", "depends_on": [...]}
+    """
+    PLAN_KIND = "dag"
+
+    def _generate(self, question: str) -> list[dict]:
+        """
+        调用 LLM 生成一个带依赖关系的行动计划
+        """
+        prompt = DAG_PLANNER_PROMPT_TEMPLATE.format(question=question)
+        messages = [{"role": "user", "content": prompt}]
+
+        print("--- 正在生成计划（DAG）---")
+        response_text = self.llm_client.think(messages=messages) or ""
+
+        try:
+            raw_plan = self.engine.generate(self._ask, messages, List[Any], response=response_text).value
+        except StructuredOutputError as e:
+            print(f"❌ 解析计划时出错: {e}")
+            print(f"原始响应：{response_text}")
+            return []
+
+        return normalize_dag_plan(raw_plan)
+
+
+def normalize_dag_plan(raw_plan) -> list[dict]:
+    """
+    校验并规范化计划：
+    - 兼容普通的字符串列表（视为依次依赖的顺序计划）
+    - 去掉不存在的依赖和指向自身或之后步骤的依赖，保证计划一定是无环的
+    """
+    if not isinstance(raw_plan, list):
+        return []
+
+    plan = []
+    seen_ids = set()
+    for index, item in enumerate(raw_plan, 1):
+        if isinstance(item, str):
+            step_id = index
+            step = item
+            depends_on = [index - 1] if index > 1 else []
+        elif isinstance(item, dict) and item.get("step"):
+            step_id = item.get("id", index)
+            step = str(item["step"])
+            depends_on = item.get("depends_on") or []
+        else:
+            print(f"⚠️ 忽略无法识别的计划步骤: {item}")
+            continue
+
+        if step_id in seen_ids:
+            step_id = max(seen_ids) + 1
+        # 只允许依赖已经出现过的步骤，从而排除环
+        valid_deps = [d for d in depends_on if d in seen_ids]
+        if len(valid_deps) != len(depends_on):
+            print(f"⚠️ 步骤 {step_id} 的依赖 {depends_on} 中包含无效编号，已忽略。")
+
+        seen_ids.add(step_id)
+        plan.append({"id": step_id, "step": step, "depends_on": valid_deps})
+    return plan
+
+
+def critical_path_length(plan: list[dict]) -> int:
+    """计划中最长依赖链的步骤数，即并行执行时串行 LLM 调用的最少次数"""
+    depth = {}
+    for item in plan:
+        depth[item["id"]] = 1 + max((depth[d] for d in item["depends_on"]), default=0)
+    return max(depth.values(), default=0)
+
+
+STREAMING_PLANNER_PROMPT_TEMPLATE = """
+你是一个顶级的 AI 规划专家，你的任务是将用户提出的复杂问题分解成一个由多个简单步骤组成的行动计划。
+请确保计划中的每个步骤都是一个独立的、可执行的子任务，并明确标注它依赖哪些之前的步骤。
+互不依赖的步骤可以被同时执行，所以请只声明真正需要的依赖。
+
+你的输出必须是 JSON Lines 格式：每行一个 JSON 对象，表示一个步骤，包含以下字段：
+- "id": 步骤编号（从 1 开始的整数）
+- "step": 描述子任务的字符串
+- "depends_on": 该步骤依赖的步骤编号列表，只能引用编号更小的步骤，没有依赖时为 []
+
+每个步骤写完后立即换行，不要输出任何其他文字。示例：
+{{"id": 1, "step": "步骤1", "depends_on": []}}
+{{"id": 2, "step": "步骤2", "depends_on": []}}
+{{"id": 3, "step": "步骤3", "depends_on": [1, 2]}}
+
+问题：{question}
+"""
+
+class IncrementalPlanParser:
+    """
+    JSON Lines 计划的增量解析器。
+    不断喂入流式文本片段，每当一行完整的步骤到达就立即返回，无需等待整个响应结束。
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._next_id = 1
+
+    def feed(self, chunk: str) -> list[dict]:
+        """喂入一个文本片段，返回其中新完成的步骤"""
+        self._buffer += chunk
+        steps = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            step = self._parse_line(line)
+            if step is not None:
+                steps.append(step)
+        return steps
+
+    def close(self) -> list[dict]:
+        """流结束时处理缓冲区中最后一行（可能没有换行符）"""
+        line, self._buffer = self._buffer, ""
+        step = self._parse_line(line)
+        return [step] if step is not None else []
+
+    def _parse_line(self, line: str) -> Optional[dict]:
+        # 容忍代码块围栏、列表符号和行尾逗号
+        line = line.strip().lstrip("-*").strip().rstrip(",")
+        if not line.startswith("{"):
+            return None
+        item, truncated = parse_lenient(line)
+        if truncated:
+            print(f"⚠️ 计划行不完整，已按现有内容解析: {line}")
+        if not isinstance(item, dict) or not item.get("step"):
+            return None
+
+        step_id = item.get("id") if isinstance(item.get("id"), int) else self._next_id
+        self._next_id = max(self._next_id, step_id) + 1
+        depends_on = [d for d in item.get("depends_on") or [] if isinstance(d, int)]
+        return {"id": step_id, "step": str(item["step"]), "depends_on": depends_on}
+
+
+class StreamingPlanner:
+    """
+    以 JSON Lines 格式流式生成计划，每解析出一个步骤就立即交给调用方
+    """
+    # 步骤与 DAGPlanner 的格式相同，两者可以共用缓存条目
+    PLAN_KIND = "dag"
+
+    def __init__(self, llm_client: HelloAgentsLLM, cache: Optional[PlanCache] = None):
+        self.llm_client = llm_client
+        self.cache = cache
+
+    def plan_stream(self, question: str) -> Iterator[dict]:
+        if self.cache is not None:
+            cached_plan = self.cache.get(question, self.PLAN_KIND)
+            if cached_plan is not None:
+                print("✅ 命中计划缓存，跳过规划")
+                yield from cached_plan
+                return
+
+        prompt = STREAMING_PLANNER_PROMPT_TEMPLATE.format(question=question)
+        messages = [{"role": "user", "content": prompt}]
+        parser = IncrementalPlanParser()
+        plan = []
+
+        print("--- 正在流式生成计划 ---")
+        for chunk in self.llm_client.stream_think(messages=messages):
+            for step in parser.feed(chunk):
+                print(f"📋 计划步骤 {step['id']} 已生成: {step['step']}")
+                plan.append(step)
+                yield step
+        for step in parser.close():
+            print(f"📋 计划步骤 {step['id']} 已生成: {step['step']}")
+            plan.append(step)
+            yield step
+
+        if self.cache is not None:
+            self.cache.put(question, plan, self.PLAN_KIND)
+
+    def plan(self, question: str) -> list[dict]:
+        """一次性返回完整计划，兼容非流水线的执行方式"""
+        return list(self.plan_stream(question))
+
+
+DAG_EXECUTOR_PROMPT_TEMPLATE = """
+你是一位顶级的AI执行专家，你的任务是解决一个大问题中的一个子步骤。
+你将收到原始问题、当前步骤，以及当前步骤所依赖的前置步骤的结果。
+请你专注于解决“当前步骤”，并仅输出该步骤的最终答案，不要输出任何额外的解释或对话。
+
+# 原始问题：
+{question}
+
+# 前置步骤与结果：
+{dependencies}
+
+# 当前步骤：
+{current_step}
+
+请仅输出针对“当前步骤”的回答：
+"""
+
+class DAGExecutor:
+    """
+    按依赖关系并行执行计划。
+    所有依赖都已完成的步骤会被同时提交到线程池，每个步骤的提示词只包含它所依赖步骤的结果，
+    总耗时约等于关键路径上的 LLM 延迟之和，而不是所有步骤的延迟之和。
+    """
+    def __init__(self, llm_client: HelloAgentsLLM, max_workers: int = 4):
+        self.llm_client = llm_client
+        self.max_workers = max_workers
+
+    def execute(self, question: str, plan: list[dict]) -> str:
+        """
+        根据计划并行执行，返回最后一个步骤的结果
+        """
+        events = queue.Queue()
+        for item in plan:
+            events.put(("step", item))
+        events.put(("plan_done", None))
+        return self._run(question, events)
+
+    def execute_stream(self, question: str, steps: Iterator[dict]) -> str:
+        """
+        边接收计划边执行：规划在后台线程中流式进行，
+        每个步骤一到达且依赖已满足就立即开始执行，规划与执行的耗时相互重叠
+        """
+        events = queue.Queue()
+
+        def consume_plan():
+            try:
+                for item in steps:
+                    events.put(("step", item))
+            except Exception as e:
+                print(f"❌ 流式生成计划时出错: {e}")
+            finally:
+                events.put(("plan_done", None))
+
+        threading.Thread(target=consume_plan, daemon=True).start()
+        return self._run(question, events)
+
+    def _run(self, question: str, events: "queue.Queue") -> str:
+        """
+        事件驱动的调度循环。
+        事件有三种：("step", 步骤) 新步骤到达，("plan_done", None) 计划已完整，("done", 步骤编号) 步骤执行完毕
+        """
+        steps: dict[int, dict] = {}
+        order: list[int] = []
+        results: dict[int, str] = {}
+        submitted: set[int] = set()
+        plan_done = False
+
+        print("\n--- 正在并行执行计划 ---")
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit_ready():
+                for step_id in order:
+                    item = steps[step_id]
+                    if step_id in submitted or not all(d in results for d in item["depends_on"]):
+                        continue
+                    submitted.add(step_id)
+                    print(f"\n-> 开始执行步骤 {step_id}: {item['step']}")
+                    future = pool.submit(self._execute_step, question, item, {d: (steps[d], results[d]) for d in item["depends_on"]})
+                    future.add_done_callback(lambda f, step_id=step_id: events.put(("done", (step_id, f))))
+
+            while not (plan_done and len(results) == len(steps)):
+                kind, payload = events.get()
+                if kind == "step":
+                    # 只保留对已到达步骤的依赖，保证调度过程中不会出现环
+                    item = dict(payload, depends_on=[d for d in payload["depends_on"] if d in steps])
+                    steps[item["id"]] = item
+                    order.append(item["id"])
+                elif kind == "plan_done":
+                    plan_done = True
+                elif kind == "done":
+                    step_id, future = payload
+                    try:
+                        results[step_id] = future.result()
+                    except Exception as e:
+                        results[step_id] = f"（步骤执行失败：{e}）"
+                    print(f"✅ 步骤 {step_id} 已完成，结果: {results[step_id]}")
+                submit_ready()
+
+        elapsed = time.perf_counter() - start_time
+        plan = [steps[i] for i in order]
+        print(f"\n⏱️ 共 {len(plan)} 个步骤，关键路径长度 {critical_path_length(plan)}，耗时 {elapsed:.2f} 秒")
+
+        # 最后一个步骤的结果就是最终答案
+        return results[order[-1]] if order else ""
+
+    def _execute_step(self, question: str, item: dict, dependencies: dict[int, tuple[dict, str]]) -> str:
+        if dependencies:
+            dependencies_text = "\n\n".join(
+                f"步骤 {dep_id}：{dep_item['step']}\n结果：{dep_result}"
+                for dep_id, (dep_item, dep_result) in dependencies.items()
+            )
+        else:
+            dependencies_text = "无"
+
+        prompt = DAG_EXECUTOR_PROMPT_TEMPLATE.format(
+            question=question,
+            dependencies=dependencies_text,
+            current_step=item["step"]
+        )
+        messages = [{"role": "user", "content": prompt}]
+        # 多个步骤并发执行，关闭流式打印以免输出交错
+        return self.llm_client.think(messages=messages, verbose=False) or ""
+
 class PlanAndSolveAgent:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def __init__(
+        self,
+        llm_client: HelloAgentsLLM,
+        use_dag: bool = False,
+        max_workers: int = 4,
+        context_policy: Optional[ContextPolicy] = None,
+        pipelined: bool = False,
+        plan_cache: Optional[PlanCache] = None
+    ):
         """
         初始化智能体，同时创建规划器和执行器实例
+        use_dag 为 True 时使用带依赖关系的计划，并行执行互不依赖的步骤
+        context_policy 用于顺序执行器，控制每一步提示词中的上下文
+        pipelined 为 True 时流式生成计划，第一个步骤生成后立即开始执行（隐含 use_dag）
+        plan_cache 用于复用相似问题的计划，可在多个智能体之间共享
         """
         self.llm_client = llm_client
-        self.planner = Planner(self.llm_client)
-        self.executor = Executor(self.llm_client)
+        self.pipelined = pipelined
+        if pipelined:
+            self.planner = StreamingPlanner(self.llm_client, cache=plan_cache)
+            self.executor = DAGExecutor(self.llm_client, max_workers=max_workers)
+        elif use_dag:
+            self.planner = DAGPlanner(self.llm_client, cache=plan_cache)
+            self.executor = DAGExecutor(self.llm_client, max_workers=max_workers)
+        else:
+            self.planner = Planner(self.llm_client, cache=plan_cache)
+            self.executor = Executor(self.llm_client, context_policy=context_policy)
     
     def run(self, question: str):
         """
@@ -121,6 +825,15 @@ class PlanAndSolveAgent:
         """
         print(f"\n--- 开始处理问题 ---\n问题：{question}")
 
+        # 流水线模式：规划与执行同时进行
+        if self.pipelined:
+            final_answer = self.executor.execute_stream(question, self.planner.plan_stream(question))
+            if not final_answer:
+                print("\n--- 任务终止 --- \n 无法生成有效的行动计划。")
+                return
+            print(f"\n--- 任务完成 ---\n最终答案： {final_answer}")
+            return
+
         # 1. 调用规划器生成计划
         plan = self.planner.plan(question)
 
@@ -1,6 +1,17 @@
-from typing import List, Dict, Any, Optional
+import os
+import re
+import ast
+import sys
+import json
+import math
+import tempfile
+import threading
+import difflib
+import subprocess
+from typing import List, Dict, Any, Optional, Callable, Sequence, Literal
 from dotenv import load_dotenv
-from llm_client import HelloAgentsLLM
+from llm_client import HelloAgentsLLM, estimate_tokens
+from text_similarity import BigramVector, bigram_cosine, bigram_vector
 
 
 load_dotenv()
@@ -8,48 +19,583 @@ load_dotenv()
 class Memory:
     """
     一个简单的短期记忆模块，用于存储智能体的行动与反思轨迹
+
+    - 按类型记录最新一条记录的位置，获取最近的代码或反馈是 O(1) 的
+    - 轨迹文本随记录增量维护，不在每次调用时重新拼接
+    - 设置 window_rounds 后只保留最近若干轮的完整内容，更早的轮次压缩为一行摘要
+    - 可以保存到 JSON 文件并重新加载
     """
 
-    def __init__(self):
+    # 记录类型 -> 轨迹中的标题
+    TRAJECTORY_TITLES = {
+        "execution": "--- 上一轮尝试（代码）---",
+        "reflection": "--- 评审员反馈 ---",
+        "measurement": "--- 实测性能 ---",
+    }
+
+    def __init__(self, window_rounds: Optional[int] = None, summary_chars: int = 80):
         """
         初始化一个空列表来存储所有记录
+
+        参数：
+        - window_rounds(Optional[int]): 轨迹中保留完整内容的最近轮数，None 表示全部保留。
+          每条 'execution' 记录开启新的一轮。
+        - summary_chars(int): 被压缩轮次中反馈摘要的最大长度。
         """
         self.records: List[Dict[str, Any]] = []
+        self.window_rounds = window_rounds
+        self.summary_chars = summary_chars
+
+        self._last_index: Dict[str, int] = {}  # 记录类型 -> 最新一条记录的下标
+        self._parts: List[str] = []            # 每条记录格式化后的轨迹片段
+        self._round_starts: List[int] = []     # 每一轮第一条记录的下标
+        self._summary_lines: List[str] = []    # 已压缩轮次的摘要
+        self._window_start = 0                 # 轨迹中完整保留的第一条记录的下标
+        self._trajectory: Optional[str] = ""   # 缓存的轨迹文本，None 表示需要重建
     
     def add_record(self, record_type: str, content: str):
         """
         向记忆中添加一条新记录。
 
         参数：
-        - record_type(str): 记录的类型 ('execution' 或 'reflection')。
+        - record_type(str): 记录的类型 ('execution'、'reflection' 或 'measurement')。
         - content(str): 记录的具体内容（例如，生成的代码或反思的反馈）。
         """
-        record = {"type": record_type, "content": content}
-        self.records.append(record)
+        self._append(record_type, content)
         print(f"📝 记忆已更新，新增一条 '{record_type}' 记录。")
+
+    def _append(self, record_type: str, content: str):
+        index = len(self.records)
+        self.records.append({"type": record_type, "content": content})
+        self._last_index[record_type] = index
+
+        title = self.TRAJECTORY_TITLES.get(record_type)
+        part = f"{title}\n{content}" if title else ""
+        self._parts.append(part)
+
+        if record_type == "execution":
+            self._round_starts.append(index)
+            if self.window_rounds is not None and len(self._round_starts) > self.window_rounds:
+                self._fold_oldest_rounds()
+
+        # 没有发生压缩时，直接在缓存的轨迹末尾追加
+        if self._trajectory is not None and part:
+            self._trajectory = f"{self._trajectory}\n\n{part}" if self._trajectory else part
+
+    def _fold_oldest_rounds(self):
+        """把超出窗口的最早轮次压缩为摘要行"""
+        while len(self._round_starts) > self.window_rounds:
+            round_start = self._round_starts.pop(0)
+            round_end = self._round_starts[0]
+            self._summary_lines.append(self._summarize_round(round_start, round_end))
+            self._window_start = round_end
+        self._trajectory = None
+
+    def _summarize_round(self, start: int, end: int) -> str:
+        round_number = len(self._summary_lines) + 1
+        pieces = []
+        for record in self.records[start:end]:
+            content = record["content"] or ""
+            if record["type"] == "execution":
+                pieces.append(f"代码 {len(content.splitlines())} 行")
+            elif record["type"] == "measurement":
+                complexity = next((line for line in content.splitlines() if "复杂度" in line), None)
+                if complexity:
+                    pieces.append(complexity.strip())
+            elif record["type"] == "reflection":
+                feedback = " ".join(content.split())
+                if len(feedback) > self.summary_chars:
+                    feedback = feedback[:self.summary_chars] + "……"
+                pieces.append(f"反馈：{feedback}")
+        return f"- 第 {round_number} 轮：" + "；".join(pieces)
     
     def get_trajectory(self) -> str:
         """
-        将所有记忆记录格式化为一个连贯的字符串文本，用于构建提示词。
+        将记忆记录格式化为一个连贯的字符串文本，用于构建提示词。
+        窗口之外的轮次以摘要形式出现在开头。
         """
-        trajectory_parts = []
-        for record in self.records:
-            if record['type'] == 'execution':
-                trajectory_parts.append(f"--- 上一轮尝试（代码）---\n{record['content']}")
-            elif record['type'] == 'reflection':
-                trajectory_parts.append(f"--- 评审员反馈 ---\n{record['content']}")
-        
-        return "\n\n".join(trajectory_parts)
+        if self._trajectory is None:
+            parts = []
+            if self._summary_lines:
+                parts.append("--- 更早轮次的摘要 ---\n" + "\n".join(self._summary_lines))
+            parts.extend(p for p in self._parts[self._window_start:] if p)
+            self._trajectory = "\n\n".join(parts)
+        return self._trajectory
     
     def get_last_execution(self) -> Optional[str]:
         """
         获取最近一次的执行结果（例如，最新生成的代码）。
         如果不存在，则返回 None
         """
-        for record in reversed(self.records):
-            if record['type'] == 'execution':
-                return record['content']
-        return None    
+        index = self._last_index.get("execution")
+        return self.records[index]["content"] if index is not None else None
+
+    def get_last_reflection(self) -> Optional[str]:
+        """
+        获取最近一次的反思反馈，如果不存在，则返回 None
+        """
+        index = self._last_index.get("reflection")
+        return self.records[index]["content"] if index is not None else None
+
+    def save(self, path: str):
+        """将记忆保存为 JSON 文件"""
+        data = {
+            "window_rounds": self.window_rounds,
+            "summary_chars": self.summary_chars,
+            "records": self.records,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Memory":
+        """从 JSON 文件加载记忆，并重建索引与轨迹"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        memory = cls(window_rounds=data.get("window_rounds"), summary_chars=data.get("summary_chars", 80))
+        for record in data.get("records", []):
+            memory._append(record["type"], record["content"])
+        return memory
+
+
+
+def extract_code(text: str) -> str:
+    """
+    从 LLM 响应中提取代码，去掉 ```python 代码块围栏
+    """
+    match = re.search(r"```(?:python|py)?\s*\n(.*?)```", text or "", re.DOTALL)
+    return match.group(1).strip() if match else (text or "").strip()
+
+
+# 在独立子进程中运行的测量脚本：从标准输入读取代码与测试用例，每完成一个规模就输出一行 JSON
+BENCHMARK_WORKER_SCRIPT = r"""
+import sys, json, time, hashlib
+payload = json.loads(sys.stdin.read())
+# 在子进程内部设置资源上限：父进程可能是多线程的，不能使用 preexec_fn
+try:
+    import resource
+    for name, value in payload["limits"].items():
+        resource.setrlimit(getattr(resource, name), (value, value))
+except (ImportError, ValueError, OSError):
+    pass
+namespace = {"__name__": "__sandbox__"}
+try:
+    exec(compile(payload["code"], "<candidate>", "exec"), namespace)
+    func = namespace[payload["func_name"]]
+except BaseException as e:
+    print(json.dumps({"error": f"加载代码失败: {type(e).__name__}: {e}"}), flush=True)
+    sys.exit(0)
+for n, args in payload["cases"]:
+    best = float("inf")
+    try:
+        for _ in range(payload["repeat"]):
+            start = time.perf_counter()
+            output = func(*args)
+            best = min(best, time.perf_counter() - start)
+    except BaseException as e:
+        print(json.dumps({"n": n, "error": f"{type(e).__name__}: {e}"}), flush=True)
+        break
+    digest = hashlib.sha256(repr(output).encode()).hexdigest()
+    print(json.dumps({"n": n, "seconds": best, "digest": digest}), flush=True)
+    if best > payload["size_budget"]:
+        break
+"""
+
+# 候选复杂度模型：名称 -> 关于 n 的增长函数
+COMPLEXITY_MODELS: Dict[str, Callable[[float], float]] = {
+    "O(1)": lambda n: 1.0,
+    "O(log n)": lambda n: math.log(n),
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * math.log(n),
+    "O(n^1.5)": lambda n: n ** 1.5,
+    "O(n^2)": lambda n: n ** 2,
+    "O(n^3)": lambda n: n ** 3,
+}
+
+
+def fit_complexity(timings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    根据 (规模, 耗时) 拟合经验复杂度。
+    - exponent: 对数坐标下的线性回归斜率
+    - complexity: 相对误差最小的候选模型 t ≈ c·f(n)
+    """
+    points = [(t["n"], t["seconds"]) for t in timings if t.get("seconds", 0) > 0 and t["n"] > 1]
+    if len(points) < 3:
+        return {"complexity": "未知（有效数据点不足）", "exponent": None}
+
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(sec) for _, sec in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    exponent = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else 0.0
+
+    best_name, best_error = None, float("inf")
+    for name, model in COMPLEXITY_MODELS.items():
+        # 最小化相对误差 Σ(1 - c·f(n)/t)^2 的最优 c
+        ratios = [model(n) / sec for n, sec in points]
+        c = sum(ratios) / sum(r * r for r in ratios)
+        error = sum((1 - c * r) ** 2 for r in ratios)
+        if error < best_error:
+            best_name, best_error = name, error
+
+    return {"complexity": best_name, "exponent": exponent}
+
+
+def find_entry_function(code: str) -> Optional[str]:
+    """
+    找出代码的入口函数：没有被其他顶层函数调用的最后一个顶层函数
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    functions = [node for node in tree.body if isinstance(node, ast.FunctionDef)]
+    if not functions:
+        return None
+    names = {f.name for f in functions}
+    called = set()
+    for f in functions:
+        for node in ast.walk(f):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in names and node.func.id != f.name:
+                called.add(node.func.id)
+    roots = [f.name for f in functions if f.name not in called]
+    return roots[-1] if roots else functions[-1].name
+
+
+class CodeBenchmarker:
+    """
+    代码性能测量器：在受限的子进程中，用规模递增的输入运行生成的代码并计时，
+    然后拟合经验复杂度。测量结果用于驱动反思，而不是让模型凭感觉判断复杂度。
+    """
+
+    def __init__(
+        self,
+        input_generator: Callable[[int], tuple] = lambda n: (n,),
+        sizes: Sequence[int] = (1000, 4000, 16000, 64000, 256000),
+        func_name: Optional[str] = None,
+        repeat: int = 3,
+        size_budget: float = 1.0,
+        timeout: float = 30.0,
+        memory_limit_mb: int = 1024,
+    ):
+        """
+        参数：
+        - input_generator: 根据规模 n 生成函数参数元组，默认直接传入 n
+        - sizes: 递增的输入规模
+        - func_name: 被测函数名，默认自动识别入口函数
+        - repeat: 每个规模重复次数，取最快一次
+        - size_budget: 单次调用超过该秒数后不再测更大的规模
+        - timeout: 子进程总超时（秒）
+        - memory_limit_mb: 子进程内存上限
+        """
+        self.input_generator = input_generator
+        self.sizes = list(sizes)
+        self.func_name = func_name
+        self.repeat = repeat
+        self.size_budget = size_budget
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+
+    def _resource_limits(self) -> Dict[str, int]:
+        """子进程的 CPU 时间与内存上限，由子进程启动后自行设置（仅 POSIX 系统生效）"""
+        return {
+            "RLIMIT_CPU": int(self.timeout) + 1,
+            "RLIMIT_AS": self.memory_limit_mb * 1024 * 1024,
+        }
+
+    def measure(self, code: str) -> Dict[str, Any]:
+        """
+        测量一段代码，返回：
+        - ok: 是否至少成功运行了一个规模
+        - func_name / timings / complexity / exponent / error
+        """
+        code = extract_code(code)
+        func_name = self.func_name or find_entry_function(code)
+        result: Dict[str, Any] = {"ok": False, "func_name": func_name, "timings": [], "error": None}
+        if not func_name:
+            result["error"] = "代码中没有找到可测量的函数"
+            return result
+
+        payload = json.dumps({
+            "code": code,
+            "func_name": func_name,
+            "cases": [(n, list(self.input_generator(n))) for n in self.sizes],
+            "repeat": self.repeat,
+            "size_budget": self.size_budget,
+            "limits": self._resource_limits(),
+        })
+
+        with tempfile.TemporaryDirectory() as sandbox_dir:
+            proc = subprocess.Popen(
+                [sys.executable, "-I", "-c", BENCHMARK_WORKER_SCRIPT],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=sandbox_dir,
+                env={"PATH": os.environ.get("PATH", "")},
+            )
+            try:
+                stdout, stderr = proc.communicate(payload, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                stdout, stderr = proc.communicate()
+                result["error"] = f"运行超时（{self.timeout} 秒），仅保留已完成的规模"
+
+        for line in stdout.splitlines():
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" in item:
+                result["error"] = item["error"] if "n" not in item else f"n={item['n']} 时出错: {item['error']}"
+            else:
+                result["timings"].append(item)
+
+        if not result["timings"] and not result["error"]:
+            result["error"] = (stderr or "子进程异常退出").strip()[-500:]
+
+        result["ok"] = bool(result["timings"])
+        result.update(fit_complexity(result["timings"]))
+        return result
+
+    @staticmethod
+    def format_measurement(measurement: Dict[str, Any]) -> str:
+        """将测量结果格式化为可放入提示词的文本"""
+        if not measurement["ok"]:
+            return f"代码无法运行：{measurement['error']}"
+        lines = [f"被测函数：{measurement['func_name']}"]
+        lines += [f"- n={t['n']}: {t['seconds'] * 1000:.3f} ms" for t in measurement["timings"]]
+        exponent = measurement.get("exponent")
+        exponent_text = f"（对数斜率 {exponent:.2f}）" if exponent is not None else ""
+        lines.append(f"拟合的经验复杂度：{measurement['complexity']}{exponent_text}")
+        if measurement["error"]:
+            lines.append(f"注意：{measurement['error']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def outputs_match(reference: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+        """
+        用输出摘要校验正确性：在两者都完成的规模上，候选版本的输出必须与参考版本一致。
+        参考版本本身无法运行时无从比较，视为通过
+        """
+        if not reference or not reference["ok"]:
+            return True
+        ref_digests = {t["n"]: t["digest"] for t in reference["timings"]}
+        common = [t for t in candidate["timings"] if t["n"] in ref_digests]
+        return all(t["digest"] == ref_digests[t["n"]] for t in common)
+
+    @staticmethod
+    def speedup(old: Dict[str, Any], new: Dict[str, Any]) -> float:
+        """
+        新版本相对旧版本的加速比，在两者都完成的最大规模上比较。
+        新版本无法运行时返回 0；旧版本无法运行而新版本可以时返回无穷大
+        """
+        if not new["ok"]:
+            return 0.0
+        if not old["ok"]:
+            return float("inf")
+        old_times = {t["n"]: t["seconds"] for t in old["timings"]}
+        new_times = {t["n"]: t["seconds"] for t in new["timings"]}
+        # 新版本能在预算内跑到更大的规模，本身就说明更快
+        if max(new_times) > max(old_times):
+            return float("inf")
+        common = sorted(set(old_times) & set(new_times))
+        if not common:
+            return 0.0
+        n = common[-1]
+        return old_times[n] / max(new_times[n], 1e-9)
+
+
+SEARCH_REPLACE_PATTERN = re.compile(
+    r"<{5,}\s*SEARCH[^\n]*\n(.*?)\n?={5,}[^\n]*\n(.*?)\n?>{5,}\s*REPLACE",
+    re.DOTALL
+)
+
+
+def parse_search_replace_blocks(text: str) -> List[tuple[str, str]]:
+    """
+    解析模型返回的 SEARCH/REPLACE 编辑块，返回 (原代码片段, 新代码片段) 列表
+    """
+    return [(search, replace) for search, replace in SEARCH_REPLACE_PATTERN.findall(text or "")]
+
+
+def _reindent(lines: List[str], delta: str, remove: str) -> List[str]:
+    """将代码行的缩进从 remove 前缀换成 delta 前缀"""
+    result = []
+    for line in lines:
+        if line.startswith(remove):
+            line = line[len(remove):]
+        result.append(delta + line if line.strip() else line)
+    return result
+
+
+def _common_indent(lines: List[str]) -> str:
+    indents = [line[:len(line) - len(line.lstrip())] for line in lines if line.strip()]
+    return os.path.commonprefix(indents) if indents else ""
+
+
+def apply_search_replace(code: str, blocks: List[tuple[str, str]], fuzzy_threshold: float = 0.9) -> Optional[str]:
+    """
+    依次应用编辑块，逐级放宽匹配条件：
+    1. 精确匹配
+    2. 忽略行尾空白
+    3. 忽略整体缩进差异（替换内容按实际缩进重新缩进）
+    4. 相似度不低于 fuzzy_threshold 的模糊匹配
+    任何一个编辑块无法定位时返回 None，由调用方回退到整体重写
+    """
+    if not blocks:
+        return None
+
+    for search, replace in blocks:
+        if not search.strip():
+            return None
+
+        # 1. 精确匹配
+        if search in code:
+            code = code.replace(search, replace, 1)
+            continue
+
+        code_lines = code.split("\n")
+        search_lines = search.strip("\n").split("\n")
+        replace_lines = replace.strip("\n").split("\n") if replace.strip() else []
+        window = len(search_lines)
+        search_indent = _common_indent(search_lines)
+        search_key = [line[len(search_indent):].rstrip() if line.startswith(search_indent) else line.strip() for line in search_lines]
+
+        match_start, match_indent = None, ""
+        fuzzy_start, fuzzy_indent, best_ratio = None, "", 0.0
+        for start in range(len(code_lines) - window + 1):
+            candidate = code_lines[start:start + window]
+            # 2. 忽略行尾空白
+            if [line.rstrip() for line in candidate] == [line.rstrip() for line in search_lines]:
+                match_start, match_indent = start, search_indent
+                break
+            # 3. 忽略整体缩进
+            candidate_indent = _common_indent(candidate)
+            candidate_key = [line[len(candidate_indent):].rstrip() for line in candidate]
+            if candidate_key == search_key:
+                match_start, match_indent = start, candidate_indent
+                break
+            # 4. 模糊匹配，记录最相似的位置
+            ratio = difflib.SequenceMatcher(None, "\n".join(candidate_key), "\n".join(search_key)).ratio()
+            if ratio > best_ratio:
+                fuzzy_start, fuzzy_indent, best_ratio = start, candidate_indent, ratio
+
+        if match_start is None:
+            if fuzzy_start is None or best_ratio < fuzzy_threshold:
+                return None
+            match_start, match_indent = fuzzy_start, fuzzy_indent
+
+        new_lines = _reindent(replace_lines, match_indent, search_indent)
+        code = "\n".join(code_lines[:match_start] + new_lines + code_lines[match_start + window:])
+
+    return code
+
+
+class ReflectionKnowledgeStore:
+    """
+    跨任务的反思经验库：持久化保存 (任务签名, 评审反馈, 最终代码)。
+
+    - 新任务开始前检索相似任务，把它们的反馈作为经验注入初始提示词
+    - 与某个历史任务几乎相同时，直接复用其最终代码，跳过全部迭代
+    - 记录每个任务用掉的迭代轮数，用于观察平均轮数是否随时间下降
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        lesson_threshold: float = 0.5,
+        reuse_threshold: float = 0.95,
+        max_lessons: int = 3,
+        max_feedback_chars: int = 300
+    ):
+        """
+        参数：
+        - path: JSONL 文件路径，None 表示只保存在内存中
+        - lesson_threshold: 作为经验注入所需的最小相似度
+        - reuse_threshold: 直接复用最终代码所需的最小相似度
+        - max_lessons: 注入提示词的最多历史任务数
+        - max_feedback_chars: 每条反馈保存的最大长度
+        """
+        self.path = path
+        self.lesson_threshold = lesson_threshold
+        self.reuse_threshold = reuse_threshold
+        self.max_lessons = max_lessons
+        self.max_feedback_chars = max_feedback_chars
+        self.entries: List[Dict[str, Any]] = []
+        self._vectors: List[BigramVector] = []
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+            print(f"📚 已加载 {len(self.entries)} 条历史反思经验。")
+
+    @staticmethod
+    def signature(task: str) -> str:
+        """任务签名：统一大小写，去掉标点与空白"""
+        return re.sub(r"[\W_]+", "", task.lower())
+
+    def _index(self, entry: Dict[str, Any]):
+        self.entries.append(entry)
+        self._vectors.append(bigram_vector(entry["signature"]))
+
+    def retrieve(self, task: str, k: Optional[int] = None) -> List[tuple[float, Dict[str, Any]]]:
+        """返回与任务最相似的 k 条经验及其相似度，按相似度从高到低排列"""
+        vector = bigram_vector(self.signature(task))
+        with self._lock:
+            scored = [(bigram_cosine(vector, v), e) for v, e in zip(self._vectors, self.entries)]
+        scored = [item for item in scored if item[0] >= self.lesson_threshold]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:k or self.max_lessons]
+
+    def find_reusable(self, task: str) -> Optional[Dict[str, Any]]:
+        """查找几乎相同的历史任务，可以直接复用其最终代码"""
+        matches = self.retrieve(task, k=1)
+        if matches and matches[0][0] >= self.reuse_threshold:
+            return matches[0][1]
+        return None
+
+    def format_lessons(self, matches: List[tuple[float, Dict[str, Any]]]) -> str:
+        """将检索到的经验格式化为提示词片段"""
+        lines = []
+        for score, entry in matches:
+            lines.append(f"- 相似任务（相似度 {score:.2f}）：{entry['task']}")
+            for feedback in entry["lessons"]:
+                lines.append(f"  · 评审意见：{feedback}")
+        return "\n".join(lines)
+
+    def add(self, task: str, feedbacks: List[str], final_code: str, iterations: int):
+        """保存一个已完成任务的经验，并追加写入文件"""
+        lessons = []
+        for feedback in feedbacks:
+            if not feedback or "无需改进" in feedback:
+                continue
+            feedback = " ".join(feedback.split())
+            lessons.append(feedback[:self.max_feedback_chars])
+
+        entry = {
+            "task": task,
+            "signature": self.signature(task),
+            "lessons": lessons,
+            "final_code": final_code,
+            "iterations": iterations,
+        }
+        with self._lock:
+            self._index(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def average_iterations(self, last: Optional[int] = None) -> float:
+        """最近 last 个任务（默认全部）的平均迭代轮数"""
+        entries = self.entries[-last:] if last else self.entries
+        return sum(e["iterations"] for e in entries) / len(entries) if entries else 0.0
 
 
 
@@ -62,6 +608,11 @@ INITIAL_PROMPT_TEMPLATE = """
 请直接输出代码，不要包含任何额外的解释。
 """
 
+LESSONS_PROMPT_TEMPLATE = """
+以下是处理相似任务时评审专家给出的意见，请在编写代码时直接规避这些问题：
+{lessons}
+"""
+
 REFLECT_PROMPT_TEMPLATE = """
 你是一个极其严格的代码评审专家和资深算法工程师，对代码的性能有极致的要求。
 你的任务是审查一下Python代码，并专注于找出其在<strong>算法效率</strong>上的主要瓶颈。
@@ -74,7 +625,10 @@ REFLECT_PROMPT_TEMPLATE = """
 {code}
 ```
 
-请分析该代码的时间复杂度，并思考是否存在一种<strong>算法上更优</strong>的解决方案来显著提升性能，如果存在，请清晰指出当前算法的不足，并提出具体的、可行的改进算法（例如，使用筛法替代试验法）。如果代码在算法层面已经达到最优，才能回答“无需改进”。
+# 实测性能：
+{measurement}
+
+请结合实测数据分析该代码的时间复杂度，并思考是否存在一种<strong>算法上更优</strong>的解决方案来显著提升性能，如果存在，请清晰指出当前算法的不足，并提出具体的、可行的改进算法（例如，使用筛法替代试验法）。如果代码在算法层面已经达到最优，才能回答“无需改进”。
 
 请直接输出你的反馈，不要包含任何额外的解释。
 """
@@ -98,52 +652,249 @@ REFINE_PROMPT_TEMPLATE = """
 请直接输出优化后的代码，不要包含任何额外的解释。
 """
 
+PATCH_REFINE_PROMPT_TEMPLATE = """
+你是一位资深的Python程序员，你正在根据一位代码评审专家的反馈来优化你的代码。
+为了节省输出，请不要重写整个函数，只输出需要修改的部分。
+
+# 原始任务：
+{task}
+
+# 你上一轮尝试的代码：
+```python
+{last_code_attempt}
+```
+
+# 评审员的反馈：
+{feedback}
+
+请使用一个或多个 SEARCH/REPLACE 编辑块描述修改，格式如下：
+<<<<<<< SEARCH
+（从上面代码中原样复制的、需要被替换的连续若干行）
+=======
+（替换后的新代码）
+>>>>>>> REPLACE
+
+SEARCH 部分必须与原代码完全一致，并且只包含必要的行。
+请只输出编辑块，不要包含任何额外的解释。
+"""
+
 
 class ReflectionAgent:
-    def __init__(self, llm_client: HelloAgentsLLM, max_iterations=3):
+    def __init__(
+        self,
+        llm_client: HelloAgentsLLM,
+        max_iterations=3,
+        benchmarker: Optional[CodeBenchmarker] = None,
+        min_speedup: float = 1.1,
+        num_candidates: int = 1,
+        candidate_temperature: float = 0.8,
+        refine_mode: Literal["full", "patch"] = "full",
+        memory: Optional[Memory] = None,
+        knowledge_store: Optional[ReflectionKnowledgeStore] = None
+    ):
+        """
+        参数：
+        - benchmarker: 提供时，每个代码版本都会被实测计时，反思基于实测数据，
+          并在实测加速比低于 min_speedup 时停止迭代
+        - min_speedup: 继续迭代所需的最小加速比
+        - num_candidates: 每轮并行生成的候选版本数，大于 1 时需要 benchmarker，
+          只保留结果正确且最快的候选
+        - candidate_temperature: 生成多个候选时的采样温度，保证候选之间有差异
+        - refine_mode: "full" 每轮重写整个函数；"patch" 只生成 SEARCH/REPLACE 编辑块，
+          补丁无法应用时自动回退到整体重写
+        - memory: 自定义的记忆模块（例如设置了窗口，或从文件加载的），默认新建
+        - knowledge_store: 跨任务的反思经验库，用于注入历史经验和复用相似任务的代码
+        """
+        if num_candidates > 1 and benchmarker is None:
+            raise ValueError("生成多个候选版本时必须提供 benchmarker 用于校验与测速。")
         self.llm_client = llm_client
-        self.memory = Memory()
+        self.memory = memory or Memory()
+        self.knowledge_store = knowledge_store
         self.max_iterations = max_iterations
+        self.benchmarker = benchmarker
+        self.min_speedup = min_speedup
+        self.num_candidates = num_candidates
+        self.candidate_temperature = candidate_temperature
+        self.refine_mode = refine_mode
+        self.refine_output_tokens: List[int] = [] # 每轮优化生成内容的估算 token 数
 
     def run(self, task: str):
         print(f"\n--- 开始处理任务 ---\n任务：{task}")
+        first_record = len(self.memory.records)
+        self.refine_output_tokens = []
+
+        # --- 0. 查询经验库：几乎相同的任务直接复用最终代码 ---
+        lessons = []
+        if self.knowledge_store is not None:
+            reusable = self.knowledge_store.find_reusable(task)
+            if reusable is not None:
+                print(f"\n♻️ 经验库中存在几乎相同的任务，直接复用其最终代码：{reusable['task']}")
+                self.memory.add_record("execution", reusable["final_code"])
+                return reusable["final_code"]
+            lessons = self.knowledge_store.retrieve(task)
 
         # --- 1. 初始执行 ---
         print("\n--- 正在进行初始尝试 ---")
         initial_prompt = INITIAL_PROMPT_TEMPLATE.format(task=task)
+        if lessons:
+            print(f"📚 注入 {len(lessons)} 条相似任务的经验")
+            initial_prompt += LESSONS_PROMPT_TEMPLATE.format(lessons=self.knowledge_store.format_lessons(lessons))
         initial_code = self._get_llm_response(initial_prompt)
         self.memory.add_record("execution", initial_code)
 
+        # 实测模式下记录目前最快的版本
+        best_code = initial_code
+        best_measurement = self._measure(initial_code)
+
         # --- 2. 迭代循环：反思与优化 ---
+        iterations = 0
         for i in range(self.max_iterations):
+            iterations = i + 1
             print(f"\n--- 第 {i+1}/{self.max_iterations} 轮优化")
 
             # a. 反思
             print("\n-> 正在进行反思...")
-            last_code = self.memory.get_last_execution()
-            reflect_prompt = REFLECT_PROMPT_TEMPLATE.format(task=task, code=last_code)
+            # 实测模式下始终在目前最快的版本上继续
+            last_code = best_code if self.benchmarker is not None else self.memory.get_last_execution()
+            reflect_prompt = REFLECT_PROMPT_TEMPLATE.format(
+                task=task,
+                code=last_code,
+                measurement=CodeBenchmarker.format_measurement(best_measurement) if best_measurement else "未进行实测"
+            )
             feedback = self._get_llm_response(reflect_prompt)
             self.memory.add_record("reflection", feedback)
 
-            # b. 检查是否需要停止
-            if "无需改进" in feedback:
+            # b. 检查是否需要停止（实测模式下由加速比决定，而不是模型的判断）
+            if self.benchmarker is None and "无需改进" in feedback:
                 print("\n✅ 反思认为代码已无需改进，任务完成。")
                 break
 
             # c. 优化
             print("\n-> 正在进行优化...")
-            refine_prompt = REFINE_PROMPT_TEMPLATE.format(
-                task=task,
-                last_code_attempt=last_code,
-                feedback=feedback
-            )
-
-            refine_code = self._get_llm_response(refine_prompt)
-            self.memory.add_record("execution", refine_code)
+            if self.num_candidates > 1:
+                refine_code, measurement = self._refine_best_of_n(task, last_code, feedback, best_measurement)
+                if refine_code is None:
+                    print(f"\n✅ 没有正确且可运行的候选版本，停止迭代。")
+                    break
+                self.memory.add_record("execution", refine_code)
+                self.memory.add_record("measurement", CodeBenchmarker.format_measurement(measurement))
+            else:
+                refine_code = self._refine(task, last_code, feedback)
+                self.memory.add_record("execution", refine_code)
+                measurement = self._measure(refine_code)
+
+            # d. 比较实测结果，加速不明显时停止
+            if self.benchmarker is not None:
+                speedup = self._evaluate(best_measurement, measurement)
+                print(f"\n📈 实测加速比: {speedup:.2f}x")
+                if speedup > 1.0:
+                    best_code, best_measurement = refine_code, measurement
+                if speedup < self.min_speedup:
+                    print(f"\n✅ 实测加速比低于 {self.min_speedup}x，停止迭代。")
+                    break
         
-        final_code = self.memory.get_last_execution()
+        final_code = best_code if self.benchmarker is not None else self.memory.get_last_execution()
         print(f"\n--- 任务完成 ---\n最终生成的代码：\n{final_code}")
+        if self.refine_output_tokens:
+            print(f"📊 每轮优化生成的 token 数（估算）：{self.refine_output_tokens}")
+
+        # --- 3. 把本次任务的反馈与最终代码存入经验库 ---
+        if self.knowledge_store is not None:
+            feedbacks = [r["content"] for r in self.memory.records[first_record:] if r["type"] == "reflection"]
+            self.knowledge_store.add(task, feedbacks, final_code, iterations)
+            print(f"📚 经验库平均迭代轮数：{self.knowledge_store.average_iterations():.2f}")
         return final_code
+
+    def _refine_prompts(self, task: str, last_code: str, feedback: str) -> tuple[str, str]:
+        """返回 (补丁提示词, 整体重写提示词)"""
+        last_code = extract_code(last_code)
+        patch_prompt = PATCH_REFINE_PROMPT_TEMPLATE.format(task=task, last_code_attempt=last_code, feedback=feedback)
+        full_prompt = REFINE_PROMPT_TEMPLATE.format(task=task, last_code_attempt=last_code, feedback=feedback)
+        return patch_prompt, full_prompt
+
+    def _apply_patch(self, last_code: str, patch_text: str) -> Optional[str]:
+        """将补丁应用到上一版代码，失败时返回 None"""
+        return apply_search_replace(extract_code(last_code), parse_search_replace_blocks(patch_text))
+
+    def _refine(self, task: str, last_code: str, feedback: str) -> str:
+        """生成一个优化版本；补丁模式下优先只生成修改部分"""
+        patch_prompt, full_prompt = self._refine_prompts(task, last_code, feedback)
+        if self.refine_mode == "patch":
+            patch_text = self._get_llm_response(patch_prompt) or ""
+            new_code = self._apply_patch(last_code, patch_text)
+            if new_code is not None:
+                self.refine_output_tokens.append(estimate_tokens(patch_text))
+                print(f"\n🩹 补丁已应用，生成约 {estimate_tokens(patch_text)} tokens")
+                return new_code
+            print("\n⚠️ 补丁无法应用，回退到整体重写。")
+            fallback_tokens = estimate_tokens(patch_text)
+        else:
+            fallback_tokens = 0
+
+        refine_code = self._get_llm_response(full_prompt) or ""
+        self.refine_output_tokens.append(fallback_tokens + estimate_tokens(refine_code))
+        return refine_code
+
+    def _measure(self, code: str) -> Optional[Dict[str, Any]]:
+        """实测代码性能，并把结果写入记忆"""
+        if self.benchmarker is None:
+            return None
+        print("\n-> 正在实测代码性能...")
+        measurement = self.benchmarker.measure(code)
+        report = CodeBenchmarker.format_measurement(measurement)
+        print(report)
+        self.memory.add_record("measurement", report)
+        return measurement
+
+    @staticmethod
+    def _evaluate(reference: Dict[str, Any], measurement: Dict[str, Any]) -> float:
+        """计算相对参考版本的加速比，输出与参考版本不一致时视为 0"""
+        if not CodeBenchmarker.outputs_match(reference, measurement):
+            print("⚠️ 新版本的输出与当前版本不一致，判定为不正确。")
+            return 0.0
+        return CodeBenchmarker.speedup(reference, measurement)
+
+    def _refine_best_of_n(
+        self, task: str, last_code: str, feedback: str, reference: Dict[str, Any]
+    ) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        一次生成多个候选版本，逐一校验并测速，返回结果正确且最快的一个。
+        所有候选都不可用时返回 (None, None)
+        """
+        patch_prompt, full_prompt = self._refine_prompts(task, last_code, feedback)
+        candidates: List[str] = []
+        generated_tokens = 0
+        if self.refine_mode == "patch":
+            patches = self.llm_client.think_n([{"role": "user", "content": patch_prompt}], self.num_candidates, self.candidate_temperature)
+            generated_tokens += sum(estimate_tokens(p) for p in patches)
+            candidates = [c for c in (self._apply_patch(last_code, p) for p in patches) if c is not None]
+            if not candidates:
+                print("\n⚠️ 所有补丁都无法应用，回退到整体重写。")
+        if not candidates:
+            candidates = self.llm_client.think_n([{"role": "user", "content": full_prompt}], self.num_candidates, self.candidate_temperature)
+            generated_tokens += sum(estimate_tokens(c) for c in candidates)
+        self.refine_output_tokens.append(generated_tokens)
+
+        # 候选依次单独测量，与参考版本的计时条件一致；并发测量会互相争抢 CPU，使加速比偏低
+        print(f"\n-> 正在实测 {len(candidates)} 个候选版本...")
+        measurements = [self.benchmarker.measure(code) for code in candidates]
+
+        best = None
+        for index, (code, measurement) in enumerate(zip(candidates, measurements), 1):
+            if not measurement["ok"]:
+                print(f"  候选 {index}: 无法运行（{measurement['error']}）")
+                continue
+            if not CodeBenchmarker.outputs_match(reference, measurement):
+                print(f"  候选 {index}: 输出与当前版本不一致，已淘汰")
+                continue
+            speedup = CodeBenchmarker.speedup(reference, measurement)
+            print(f"  候选 {index}: 经验复杂度 {measurement['complexity']}，加速比 {speedup:.2f}x")
+            if best is None or speedup > best[2]:
+                best = (code, measurement, speedup)
+
+        if best is None:
+            return None, None
+        return best[0], best[1]
     
 
     def _get_llm_response(self, prompt: str):
@@ -158,5 +909,5 @@ class ReflectionAgent:
 
 if __name__=='__main__':
     llm_client = HelloAgentsLLM()
-    agent = ReflectionAgent(llm_client=llm_client)
+    agent = ReflectionAgent(llm_client=llm_client, benchmarker=CodeBenchmarker())
     agent.run("编写一个Python函数，找出1到n之间所有的素数 (prime numbers)。")
@@ -1,17 +1,30 @@
 import os
+import re
+import json
+import time
 import asyncio
+import uuid
 import random
+import argparse
+import contextlib
+import contextvars
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Literal, Any
-from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Literal, Any
+from collections import Counter, defaultdict
 
 from agentscope.message import Msg
 from agentscope.agent import AgentBase, ReActAgent
-from agentscope.pipeline import MsgHub, sequential_pipeline, fanout_pipeline
+from agentscope.pipeline import MsgHub, fanout_pipeline
 from agentscope.formatter import DashScopeMultiAgentFormatter
 from agentscope.model import DashScopeChatModel
 
+from llm_client import estimate_tokens
+from rate_limiter import RateLimiter
+from speech_analytics import SpeechAnalytics
+from structured_output import StructuredOutputEngine
+
 load_dotenv()
 
 
@@ -202,13 +215,11 @@ class DiscussionModelCN(BaseModel):
     )
 
 
-def get_vote_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
-    """获取中文版投票模型"""
-
+def _build_vote_model_cn(names: tuple[str, ...]) -> type[BaseModel]:
     class VoteModelCN(BaseModel):
         """ 中文版投票输出格式"""
 
-        vote: Literal[tuple(_.name for _ in agents)] = Field(description="你要投票淘汰的玩家姓名")
+        vote: Literal[names] = Field(description="你要投票淘汰的玩家姓名")
         reason: str = Field(description="投票理由：简要说明为什么选择此人")
         suspicion_level: int = Field(
             description="对被投票者的怀疑程度（1-10）",
@@ -224,13 +235,11 @@ class WitchActionModelCN(BaseModel):
     target_name: Optional[str] = Field(description="目标玩家姓名(救人或毒杀的对象)", default=None)
     action_reason: Optional[str] = Field(description="行动理由", default=None)
 
-def get_seer_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
-    """获取中文版预言家模型"""
-    
+def _build_seer_model_cn(names: tuple[str, ...]) -> type[BaseModel]:
     class SeerModelCN(BaseModel):
         """中文版预言家查验格式"""
         
-        target: Literal[tuple(_.name for _ in agents)] = Field(
+        target: Literal[names] = Field(
             description="要查验的玩家姓名",
         )
         check_reason: str = Field(
@@ -244,16 +253,14 @@ def get_seer_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
     return SeerModelCN
 
 
-def get_hunter_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
-    """获取中文版猎人模型"""
-    
+def _build_hunter_model_cn(names: tuple[str, ...]) -> type[BaseModel]:
     class HunterModelCN(BaseModel):
         """中文版猎人开枪格式"""
         
         shoot: bool = Field(
             description="是否使用开枪技能",
         )
-        target: Optional[Literal[tuple(_.name for _ in agents)]] = Field(
+        target: Optional[Literal[names]] = Field(
             description="开枪目标玩家姓名",
             default=None
         )
@@ -265,6 +272,52 @@ def get_hunter_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
     return HunterModelCN
 
 
+class DecisionSchemaCache:
+    """
+    按存活玩家集合缓存投票 / 查验 / 猎人开枪模型
+
+    模型只取决于候选姓名，键为 (决策类型, frozenset(姓名))；同一集合无论以何种顺序传入都复用同一个类，
+    Literal 中的姓名顺序取首次构建时的顺序（存活玩家总是按座位顺序传入）。
+    模型在某个存活集合第一次被用到时才构建（一局只会用到十来个），之后的投票不再重新生成校验器。
+    """
+
+    BUILDERS: Dict[str, Callable[[tuple], type[BaseModel]]] = {
+        "vote": _build_vote_model_cn,
+        "seer": _build_seer_model_cn,
+        "hunter": _build_hunter_model_cn,
+    }
+
+    def __init__(self):
+        self._models: Dict[tuple, type[BaseModel]] = {}
+
+    def get(self, kind: str, names: Iterable[str]) -> type[BaseModel]:
+        names = tuple(names)
+        key = (kind, frozenset(names))
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = self.BUILDERS[kind](names)
+        return model
+
+
+# 进程内共享：同一进程中的多局对局（模拟、锦标赛）使用同一姓名池，后续对局直接命中
+DECISION_SCHEMAS = DecisionSchemaCache()
+
+
+def get_vote_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
+    """获取中文版投票模型"""
+    return DECISION_SCHEMAS.get("vote", (_.name for _ in agents))
+
+
+def get_seer_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
+    """获取中文版预言家模型"""
+    return DECISION_SCHEMAS.get("seer", (_.name for _ in agents))
+
+
+def get_hunter_model_cn(agents: list[AgentBase]) -> type[BaseModel]:
+    """获取中文版猎人模型"""
+    return DECISION_SCHEMAS.get("hunter", (_.name for _ in agents))
+
+
 class WerewolfKillModelCN(BaseModel):
     """中文版狼人击杀模型"""
     
@@ -321,7 +374,7 @@ def format_player_list(players: List[AgentBase], show_roles: bool = False) -> st
         return "无玩家"
     
     if show_roles:
-        return "、".join([f"{p.name}({getattr(p, 'role', "未知")})" for p in players])
+        return "、".join([f"{p.name}({getattr(p, 'role', '未知')})" for p in players])
     else:
         return "、".join([p.name for p in players])
     
@@ -348,43 +401,161 @@ def check_winning_cn(alive_player: List[AgentBase], roles: Dict[str, str]) -> Op
     
     return None
 
+# 无状态的单条发言分析共用一个自动机
+_SPEECH_ANALYZER = SpeechAnalytics()
+
 def analyze_speech_pattern(speech: str) -> Dict[str, Any]:
-    """分析发言模式（中文优化）"""
-    analysis = {
-        "word_count": len(speech),
-        "confidence_keywords": 0,
-        "doubt_keywords": 0,
-        "emotion_score": 0
-    }
+    """分析发言模式（中文优化），全部关键词在一次 Aho–Corasick 扫描中统计"""
+    analysis = _SPEECH_ANALYZER.analyze(speech)
+    analysis.pop("stances")
+    return analysis
 
-    # 中文关键词分析
-    confidence_words = ["确定", "一定", "肯定", "绝对", "必须", "显然"]
-    doubt_words = ["可能", "也许", "或许", "怀疑", "不确定", "感觉"]
+# --- 阶段级性能剖析：耗时、LLM 调用、token 与结构化输出失败 ---
+# 当前任务上打开的剖析区间（由外到内）；asyncio 任务创建时复制上下文，并发阶段各自维护自己的调用栈
+_ACTIVE_SPANS: contextvars.ContextVar[tuple] = contextvars.ContextVar("werewolf_active_spans", default=())
 
-    for word in confidence_words:
-        analysis["confidence_keywords"] += speech.count(word)
-    
-    for word in doubt_words:
-        analysis["doubt_keywords"] += speech.count(word)
 
-    # 简单情感分析
-    positive_words = ["好", "棒", "赞", "支持", "同意"]
-    negative_words = ["坏", "差", "反对", "不行", "错误"]
+class ProfileSpan:
+    """一个计时区间；调用数、token 与失败数包含其内部嵌套区间"""
+
+    __slots__ = ("name", "path", "lane", "start", "end", "calls", "input_tokens", "output_tokens", "failures")
+
+    def __init__(self, name: str, path: str, lane: int, start: float):
+        self.name = name
+        self.path = path
+        self.lane = lane
+        self.start = start
+        self.end = start
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.failures = 0
+
+
+def record_model_call(input_tokens: int, output_tokens: int):
+    """把一次 LLM 调用计入当前打开的全部区间"""
+    for span in _ACTIVE_SPANS.get():
+        span.calls += 1
+        span.input_tokens += input_tokens
+        span.output_tokens += output_tokens
+
+
+def record_structured_failure():
+    """把一次结构化输出失败计入当前打开的全部区间"""
+    for span in _ACTIVE_SPANS.get():
+        span.failures += 1
+
+
+class GameProfiler:
+    """
+    对局剖析器
+
+    - span 打开一个嵌套区间，路径形如 night/werewolf/discussion
+    - 模型调用与结构化输出失败通过 record_model_call / record_structured_failure 计入当前区间
+    - report 按路径汇总，export_chrome_trace 导出可在 chrome://tracing 或 Perfetto 中查看的时间线
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[ProfileSpan] = []
+        self.instants: List[Dict[str, Any]] = []
+        self._lanes: Dict[int, int] = {}
+
+    def _lane(self) -> int:
+        """每个 asyncio 任务一条时间线，保证同一条线上的区间严格嵌套"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._lanes.setdefault(id(task), len(self._lanes))
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        parents = _ACTIVE_SPANS.get()
+        path = f"{parents[-1].path}/{name}" if parents else name
+        span = ProfileSpan(name, path, self._lane(), time.perf_counter())
+        self.spans.append(span)
+        token = _ACTIVE_SPANS.set(parents + (span,))
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            _ACTIVE_SPANS.reset(token)
+
+    def instant(self, name: str, **args: Any):
+        """记录一个瞬时事件，例如主持人公告"""
+        self.instants.append({"name": name, "ts": time.perf_counter(), "lane": self._lane(), "args": args})
+
+    def report(self) -> List[Dict[str, Any]]:
+        """按区间路径汇总：次数、总耗时、调用数、token、失败数，按耗时降序"""
+        rows: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            row = rows.setdefault(span.path, {
+                "span": span.path, "count": 0, "seconds": 0.0, "calls": 0,
+                "input_tokens": 0, "output_tokens": 0, "failures": 0,
+            })
+            row["count"] += 1
+            row["seconds"] += span.end - span.start
+            row["calls"] += span.calls
+            row["input_tokens"] += span.input_tokens
+            row["output_tokens"] += span.output_tokens
+            row["failures"] += span.failures
+        return sorted(rows.values(), key=lambda row: row["seconds"], reverse=True)
+
+    def print_report(self):
+        rows = self.report()
+        # 顶层区间（setup / night / day / hunter）依次执行，之和即对局总耗时
+        total = sum(row["seconds"] for row in rows if "/" not in row["span"]) or 1.0
+        print(f"\n⏱️ 阶段剖析（共 {total:.2f}s）")
+        print(f"  {'阶段':<36}{'次数':>6}{'耗时(s)':>10}{'占比':>8}{'调用':>6}{'输入tokens':>12}{'输出tokens':>12}{'失败':>6}")
+        for row in rows:
+            print(f"  {row['span']:<38}{row['count']:>6}{row['seconds']:>10.2f}{row['seconds'] / total:>8.1%}"
+                  f"{row['calls']:>6}{row['input_tokens']:>12}{row['output_tokens']:>12}{row['failures']:>6}")
+
+    def export_chrome_trace(self, path: str):
+        """导出 Chrome Trace Event 格式（JSON），时间单位为微秒"""
+        def micros(t: float) -> float:
+            return (t - self.origin) * 1e6
+
+        events = [
+            {
+                "name": span.name, "cat": span.path.split("/")[0],
+                "ph": "X", "pid": 1, "tid": span.lane,
+                "ts": micros(span.start), "dur": (span.end - span.start) * 1e6,
+                "args": {
+                    "path": span.path, "calls": span.calls, "input_tokens": span.input_tokens,
+                    "output_tokens": span.output_tokens, "failures": span.failures,
+                },
+            }
+            for span in self.spans
+        ]
+        events.extend(
+            {"name": e["name"], "ph": "i", "s": "t", "pid": 1, "tid": e["lane"], "ts": micros(e["ts"]), "args": e["args"]}
+            for e in self.instants
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+# 当前任务的公告缓冲区；并发的夜晚子阶段各自缓冲公告，结束后按固定顺序统一发布
+_ANNOUNCE_BUFFER: contextvars.ContextVar[Optional[List[tuple]]] = contextvars.ContextVar(
+    "werewolf_announce_buffer", default=None
+)
 
-    for word in positive_words:
-        analysis["emotion_score"] += speech.count(word)
-    
-    for word in negative_words:
-        analysis["emotion_score"] -= speech.count[word]
-    
-    return analysis
 
 class GameModerator(AgentBase):
-    """中文版游戏主持人"""
+    """
+    中文版游戏主持人
 
-    def __init__(self) -> None:
+    在 buffered 上下文中发布的公告先进入缓冲区（消息照常返回给调用方），
+    由 flush 写入游戏日志并输出，并发阶段的公告不会在日志与控制台中交错。
+    """
+
+    def __init__(self, verbose: bool = True, profiler: Optional[GameProfiler] = None) -> None:
         super().__init__()
         self.name = "游戏主持人"
+        self.verbose = verbose
+        self.profiler = profiler
         self.game_log: List[str] = []
 
     async def announce(self, content: str) -> Msg:
@@ -394,9 +565,34 @@ class GameModerator(AgentBase):
             content=f"📢 {content}",
             role="system"
         )
-        self.game_log.append(content)
-        await self.print(msg)
+        if self.profiler is not None:
+            self.profiler.instant("announce", content=content)
+        buffer = _ANNOUNCE_BUFFER.get()
+        if buffer is not None:
+            buffer.append((content, msg))
+        else:
+            await self._publish(content, msg)
         return msg
+
+    async def _publish(self, content: str, msg: Msg):
+        self.game_log.append(content)
+        if self.verbose:
+            await self.print(msg)
+
+    @contextlib.contextmanager
+    def buffered(self, buffer: List[tuple]):
+        """当前任务内的公告写入 buffer，而不是立即发布"""
+        token = _ANNOUNCE_BUFFER.set(buffer)
+        try:
+            yield buffer
+        finally:
+            _ANNOUNCE_BUFFER.reset(token)
+
+    async def flush(self, buffer: List[tuple]):
+        """按缓冲顺序发布公告并清空缓冲区"""
+        for content, msg in buffer:
+            await self._publish(content, msg)
+        buffer.clear()
     
     async def night_announcement(self, round_num: int) -> Msg:
         """夜晚阶段公告"""
@@ -435,18 +631,16 @@ def format_player_list_str(player: List[str]) -> str:
 
 
 def calculate_suspicion_score(player_name: str, game_history: List[Dict]) -> float:
-    """计算玩家可信度分数"""
-    score = 0.0
-    
+    """
+    计算玩家可信度分数
+
+    需要反复查询时应使用 SpeechAnalytics.observe_event 增量维护，这里只为一次性计算保留
+    """
+    analytics = SpeechAnalytics()
     for event in game_history:
-        if event.get("type") == "vote" and event.get("target") == player_name:
-            score += 0.3
-        elif event.get("type") == "accusation" and event.get("target") == player_name:
-            score += 0.2
-        elif event.get("type") == "defense" and event.get("target") == player_name:
-            score -= 0.1
-    
-    return min(max(score, 0.0), 1.0)
+        if event.get("target") == player_name:
+            analytics.observe_event(event)
+    return analytics.suspicion(player_name)
 
 async def handle_interrupt(*args: Any, **kwargs: Any) -> Msg:
     """处理游戏中断"""
@@ -458,42 +652,439 @@ async def handle_interrupt(*args: Any, **kwargs: Any) -> Msg:
 
 
 
+# --- 游戏状态：按玩家索引的状态表 + 追加式事件日志 ---
+class PlayerRecord:
+    """状态表中的一行：玩家的角色、阵营与存活状态"""
+
+    __slots__ = ("name", "role", "character", "faction", "seat", "alive")
+
+    def __init__(self, name: str, role: str, character: str, seat: int, alive: bool = True):
+        self.name = name
+        self.role = role
+        self.character = character
+        self.faction = GameRoles.ROLES.get(role, {}).get("team", "好人阵营")
+        self.seat = seat
+        self.alive = alive
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "role": self.role, "character": self.character, "seat": self.seat, "alive": self.alive}
+
+
+class GameState:
+    """
+    以玩家为键的单一状态表
+
+    - records: 玩家 -> PlayerRecord，按座位顺序插入
+    - 按角色维护存活玩家的有序集合（dict 保序且删除为 O(1)），按阵营维护存活人数
+    - 淘汰玩家、查询某角色的存活玩家、判断胜负都不需要重建列表
+    - events: 追加式事件日志；设置 event_path 后每条事件同时追加写入 JSONL 文件
+    """
+
+    def __init__(self, event_path: Optional[str] = None):
+        self.records: Dict[str, PlayerRecord] = {}
+        self._alive_by_role: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self._alive: Dict[str, None] = {}
+        self.faction_alive: Counter = Counter()
+
+        # 对局进度：下一个要执行的轮次与阶段（"night" / "day"）
+        self.round = 1
+        self.next_phase = "night"
+        self.witch_has_antidote = True
+        self.witch_has_poison = True
+
+        self.events: List[Dict[str, Any]] = []
+        self.event_path = event_path
+
+    def add_player(self, name: str, role: str, character: str, alive: bool = True):
+        record = PlayerRecord(name, role, character, seat=len(self.records), alive=alive)
+        self.records[name] = record
+        if alive:
+            self._alive[name] = None
+            self._alive_by_role[role][name] = None
+            self.faction_alive[record.faction] += 1
+
+    def kill(self, name: str, cause: str) -> bool:
+        """淘汰一名玩家，O(1)；玩家不存在或已出局时返回 False"""
+        record = self.records.get(name)
+        if record is None or not record.alive:
+            return False
+        record.alive = False
+        del self._alive[name]
+        del self._alive_by_role[record.role][name]
+        self.faction_alive[record.faction] -= 1
+        self.log_event("death", player=name, role=record.role, cause=cause)
+        return True
+
+    def is_alive(self, name: str) -> bool:
+        record = self.records.get(name)
+        return record is not None and record.alive
+
+    def alive_names(self) -> List[str]:
+        return list(self._alive)
+
+    def alive_with_role(self, role: str) -> List[str]:
+        return list(self._alive_by_role.get(role, ()))
+
+    def alive_count(self) -> int:
+        return len(self._alive)
+
+    def check_winner(self) -> Optional[str]:
+        """与 check_winning_cn 规则一致，但只读取阵营计数"""
+        werewolf_count = self.faction_alive["狼人阵营"]
+        villager_count = len(self._alive) - werewolf_count
+        if werewolf_count == 0:
+            return "好人阵营胜利！所有狼人已被淘汰！"
+        elif werewolf_count >= villager_count:
+            return "狼人阵营胜利！狼人数量已达到或超过好人！"
+        return None
+
+    def log_event(self, event_type: str, **data: Any) -> Dict[str, Any]:
+        """追加一条事件"""
+        event = {"seq": len(self.events), "round": self.round, "type": event_type, **data}
+        self.events.append(event)
+        if self.event_path:
+            with open(self.event_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        return event
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "players": [r.to_dict() for r in self.records.values()],
+            "round": self.round,
+            "next_phase": self.next_phase,
+            "witch_has_antidote": self.witch_has_antidote,
+            "witch_has_poison": self.witch_has_poison,
+            "event_count": len(self.events),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], events: List[Dict[str, Any]], event_path: Optional[str] = None) -> "GameState":
+        state = cls(event_path=event_path)
+        for p in sorted(data["players"], key=lambda p: p["seat"]):
+            state.add_player(p["name"], p["role"], p["character"], alive=p["alive"])
+        state.round = data["round"]
+        state.next_phase = data["next_phase"]
+        state.witch_has_antidote = data["witch_has_antidote"]
+        state.witch_has_poison = data["witch_has_poison"]
+        state.events = events[:data["event_count"]]
+        return state
+
+
+# --- 阶段调度：按依赖关系并发执行同一时段内的行动 ---
+class PhaseScheduler:
+    """
+    极简的阶段依赖调度器
+
+    每个阶段声明它依赖的阶段，依赖的返回值按声明顺序作为位置参数传入；
+    没有依赖关系的阶段并发执行，整体耗时为关键路径而非各阶段之和。
+    任一阶段出错时取消其余未完成的阶段并抛出该异常。
+    """
+
+    def __init__(self):
+        self._phases: Dict[str, tuple] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: tuple = ()) -> "PhaseScheduler":
+        """
+        注册一个阶段
+
+        Args:
+            name: 阶段名称
+            func: 异步函数，参数为各依赖阶段的返回值
+            deps: 依赖的阶段名称，必须已注册（保证无环）
+        """
+        for dep in deps:
+            if dep not in self._phases:
+                raise ValueError(f"阶段 {name} 依赖的 {dep} 尚未注册")
+        self._phases[name] = (func, tuple(deps))
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """执行全部阶段，返回 阶段名称 -> 返回值"""
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_phase(func: Callable[..., Any], deps: tuple):
+            args = [await tasks[dep] for dep in deps]
+            return await func(*args)
+
+        for name, (func, deps) in self._phases.items():
+            tasks[name] = asyncio.ensure_future(run_phase(func, deps))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+
+# --- 记忆压缩：旧轮次的广播消息折叠为摘要 ---
+def _msg_text(msg: Msg) -> str:
+    """取消息中的文本内容"""
+    get_text = getattr(msg, "get_text_content", None)
+    text = get_text() if get_text is not None else msg.content
+    return text if isinstance(text, str) else str(text or "")
+
+
+class MemoryCompactor:
+    """
+    玩家记忆压缩
+
+    MsgHub 自动广播会把每句发言写入每名玩家的记忆，提示词长度随 玩家数 × 轮数 增长。
+    每轮开始时对存活玩家的记忆做一次压缩：
+    - 开局前的身份消息固定保留
+    - 最近 keep_rounds 轮的消息原样保留
+    - 更早的消息替换为一条往轮摘要：由事件日志重建的每轮死亡与投票、
+      该玩家可见的私有信息（查验结果、狼队击杀、女巫用药），以及从被折叠发言中提取的身份声明
+    摘要每次整体重建，每轮只占一行，单次调用的提示词长度基本不随轮数增长
+    """
+
+    SUMMARY_NAME = "往轮摘要"
+    CLAIM_PATTERN = re.compile(r"我(?:是|就是|才是)(预言家|女巫|猎人|守护者|村民)")
+
+    def __init__(self, game: "ThreeKingdomsWerewolfGame", keep_rounds: int = 1):
+        """
+        Args:
+            game: 所属对局，用于读取状态表与事件日志
+            keep_rounds: 原样保留的最近轮数
+        """
+        self.game = game
+        self.keep_rounds = keep_rounds
+        # 玩家 -> 身份消息之后第一条消息的位置
+        self._pinned: Dict[str, int] = {}
+        # 玩家 -> {轮次: 该轮第一条消息的位置}
+        self._round_starts: Dict[str, Dict[int, int]] = defaultdict(dict)
+        # 听众 -> {发言者: 最近一次身份声明}；只记录该听众实际听到的发言
+        self.claims: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+    def _extract_claims(self, observer: str, msgs: List[Msg]):
+        names = list(self.game.state.records)
+        for msg in msgs:
+            if msg.name not in self.game.state.records or msg.name == observer:
+                continue
+            text = _msg_text(msg)
+            match = self.CLAIM_PATTERN.search(text)
+            if not match:
+                continue
+            claim = f"自称{match.group(1)}"
+            checks = [
+                f"{name}是{result}" for name in names if name != msg.name
+                for result in re.findall(re.escape(name) + r"(?:是|为)(狼人|好人)", text)[:1]
+            ]
+            if checks:
+                claim += f"（称{'、'.join(checks)}）"
+            self.claims[observer][msg.name] = claim
+
+    def build_summary(self, observer: str, last_round: int) -> str:
+        """由事件日志生成 observer 可见的第 1 至 last_round 轮摘要"""
+        role = self.game.roles.get(observer)
+        rounds: Dict[int, List[str]] = defaultdict(list)
+        for event in self.game.state.events:
+            rnd, kind = event["round"], event["type"]
+            if rnd > last_round:
+                break
+            if kind == "death":
+                rounds[rnd].append(f"{event['player']}{event['cause']}")
+            elif kind == "day_vote":
+                votes = "、".join(f"{voter}→{target}" for voter, target in event["votes"].items() if target)
+                rounds[rnd].append(f"投票（{votes}）")
+            elif kind == "hunter_shot":
+                rounds[rnd].append(f"猎人{event['hunter']}开枪带走{event['target']}")
+            elif kind == "seer_check" and event["seer"] == observer:
+                rounds[rnd].append(f"你查验{event['target']}是{'狼人' if event['result'] else '好人'}")
+            elif kind == "werewolf_kill" and role == "狼人":
+                rounds[rnd].append(f"狼队击杀{event['target']}")
+            elif kind in ("witch_save", "witch_poison") and role == "女巫":
+                rounds[rnd].append(f"你{'救了' if kind == 'witch_save' else '毒杀了'}{event['target']}")
+
+        lines = [f"第{rnd}轮：" + "；".join(items) for rnd, items in sorted(rounds.items())]
+        if role == "狼人":
+            teammates = [n for n, r in self.game.roles.items() if r == "狼人" and n != observer]
+            if teammates:
+                lines.insert(0, f"你的狼队友：{format_player_list_str(teammates)}")
+        claims = self.claims.get(observer)
+        if claims:
+            lines.append("身份声明：" + "；".join(f"{name}{claim}" for name, claim in claims.items()))
+        lines.append(f"当前存活：{format_player_list_str(self.game.state.alive_names())}")
+        return f"第1-{last_round}轮摘要（更早的发言已折叠）：\n" + "\n".join(lines)
+
+    async def compact(self, round_num: int):
+        """在第 round_num 轮开始时调用：记录各玩家本轮的起始位置，并折叠过旧的轮次"""
+        last_folded = round_num - self.keep_rounds - 1
+        for agent in self.game.alive_players:
+            memory = getattr(agent, "memory", None)
+            if memory is None:
+                continue
+            size = await memory.size()
+            pinned = self._pinned.setdefault(agent.name, size)
+            starts = self._round_starts[agent.name]
+            starts[round_num] = size
+
+            cutoff = starts.get(last_folded + 1)
+            if last_folded < 1 or cutoff is None or cutoff <= pinned:
+                continue
+            msgs = await memory.get_memory()
+            folded = [m for m in msgs[pinned:cutoff] if m.name != self.SUMMARY_NAME]
+            self._extract_claims(agent.name, folded)
+            summary = Msg(name=self.SUMMARY_NAME, content=self.build_summary(agent.name, last_folded), role="system")
+            compacted = msgs[:pinned] + [summary] + msgs[cutoff:]
+            await memory.clear()
+            await memory.add(compacted)
+
+            shift = len(compacted) - len(msgs)
+            self._round_starts[agent.name] = {
+                rnd: start + shift for rnd, start in starts.items() if rnd > last_folded
+            }
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"pinned": self._pinned, "round_starts": self._round_starts, "claims": self.claims}
+
+    def load_state_dict(self, state_dict: Dict[str, Any]):
+        self._pinned = dict(state_dict.get("pinned", {}))
+        for name, starts in state_dict.get("round_starts", {}).items():
+            self._round_starts[name] = {int(rnd): start for rnd, start in starts.items()}
+        for name, claims in state_dict.get("claims", {}).items():
+            self.claims[name] = dict(claims)
+
+
+def create_chat_model(model_name: Optional[str] = None) -> DashScopeChatModel:
+    """创建 DashScope 对话模型，默认使用环境变量 LLM_MODEL_ID"""
+    return DashScopeChatModel(
+        model_name=model_name or os.getenv("LLM_MODEL_ID"),
+        api_key=os.getenv("LLM_API_KEY"),
+        enable_thinking=True
+    )
+
+
+def create_llm_player(name: str, sys_prompt: str, model: Any, verbose: bool = True) -> ReActAgent:
+    """创建 LLM 驱动的玩家；verbose 为 False 时不在控制台打印发言"""
+    agent = ReActAgent(
+        name=name,
+        sys_prompt=sys_prompt,
+        model=model,
+        formatter=DashScopeMultiAgentFormatter(),
+    )
+    if not verbose:
+        agent.set_console_output_enabled(False)
+    return agent
+
+
 class ThreeKingdomsWerewolfGame():
     """
     游戏主控制类
     负责维护全局状态（如玩家存活列表、当前游戏阶段）、推进游戏流程（调用夜晚阶段、白天阶段）以及裁定胜负
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        player_factory: Optional[Callable[["ThreeKingdomsWerewolfGame", str, str, str], AgentBase]] = None,
+        verbose: bool = True,
+        checkpoint_dir: Optional[str] = None,
+        memory_keep_rounds: Optional[int] = 1,
+        game_id: Optional[str] = None
+    ):
+        """
+        Args:
+            player_factory: 玩家工厂 (game, name, role, character) -> AgentBase，默认创建 LLM 驱动的 ReActAgent；
+                无头模拟时传入脚本玩家工厂
+            verbose: 是否打印主持人公告
+            checkpoint_dir: 检查点目录，设置后每个阶段结束时保存快照，事件日志实时追加到 events.jsonl
+            memory_keep_rounds: 玩家记忆中原样保留的最近轮数，更早的轮次折叠为摘要；None 表示不压缩
+            game_id: 对局标识，用于命名本局的消息中心；同一进程并发多局时互不串线
+        """
+        self.game_id = game_id or uuid.uuid4().hex[:8]
+        self.player_factory = player_factory
+        self.verbose = verbose
         self.player: Dict[str, ReActAgent] = {}
         self.roles: Dict[str, str] = {}
-        self.moderator = GameModerator()
-        self.alive_players: List[ReActAgent] = []
-        self.werewolves: List[ReActAgent] = []
-        self.villagers: List[ReActAgent] = []
-        self.seer: List[ReActAgent] = []
-        self.witch: List[ReActAgent] = []
-        self.hunter: List[ReActAgent] = []
-
-        # 女巫道具状态
-        self.witch_has_antidote = True
-        self.witch_has_poison = True
-    
+        # 阶段剖析：每个阶段的耗时、LLM 调用、token 与结构化输出失败
+        self.profiler = GameProfiler()
+        self.moderator = GameModerator(verbose=verbose, profiler=self.profiler)
+
+        # 全部玩家状态（角色、阵营、存活、女巫道具、对局进度）集中在一张状态表中
+        self.checkpoint_dir = checkpoint_dir
+        event_path = None
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            event_path = os.path.join(checkpoint_dir, self.EVENTS_NAME)
+        self.state = GameState(event_path=event_path)
+        self.compactor = MemoryCompactor(self, memory_keep_rounds) if memory_keep_rounds is not None else None
+        # 白天公开发言与投票的流式分析：每名玩家的信心、犹疑、情感与怀疑度
+        self.speech_analytics = SpeechAnalytics()
+        # 结构化决策的本地修复与定向追问
+        self.structured = StructuredOutputEngine()
+
+        # 对局统计：各阶段累计耗时（秒）与最终结果；夜晚各行动并发执行，night 为夜晚整体（关键路径）耗时
+        self.phase_timings: Dict[str, float] = defaultdict(float)
+        self.result: Dict[str, Any] = {}
+
+    SNAPSHOT_NAME = "snapshot.json"
+    EVENTS_NAME = "events.jsonl"
+
+    # ---- 由状态表派生的玩家视图（按座位顺序，只包含存活玩家） ----
+
+    def _agents(self, names: List[str]) -> List[AgentBase]:
+        return [self.player[n] for n in names]
+
+    @property
+    def alive_players(self) -> List[AgentBase]:
+        return self._agents(self.state.alive_names())
+
+    @property
+    def werewolves(self) -> List[AgentBase]:
+        return self._agents(self.state.alive_with_role("狼人"))
+
+    @property
+    def seer(self) -> List[AgentBase]:
+        return self._agents(self.state.alive_with_role("预言家"))
+
+    @property
+    def witch(self) -> List[AgentBase]:
+        return self._agents(self.state.alive_with_role("女巫"))
+
+    @property
+    def hunter(self) -> List[AgentBase]:
+        return self._agents(self.state.alive_with_role("猎人"))
+
+    @property
+    def villagers(self) -> List[AgentBase]:
+        special = {"狼人", "预言家", "女巫", "猎人"}
+        return self._agents([n for n in self.state.alive_names() if self.roles[n] not in special])
+
+    @property
+    def witch_has_antidote(self) -> bool:
+        return self.state.witch_has_antidote
+
+    @witch_has_antidote.setter
+    def witch_has_antidote(self, value: bool):
+        self.state.witch_has_antidote = value
+
+    @property
+    def witch_has_poison(self) -> bool:
+        return self.state.witch_has_poison
+
+    @witch_has_poison.setter
+    def witch_has_poison(self, value: bool):
+        self.state.witch_has_poison = value
+
+    def _build_agent(self, name: str, role: str, character: str) -> AgentBase:
+        """按角色创建玩家智能体（不发送身份公告）"""
+        if self.player_factory is not None:
+            agent = self.player_factory(self, name, role, character)
+        else:
+            # 经计量句柄调用模型，调用次数与 token 计入剖析区间
+            model = SharedModelClient(create_chat_model(), RateLimiter()).bind()
+            agent = create_llm_player(name, ChinesePrompt.get_role_prompt(role, character), model)
+        self.roles[name] = role
+        self.player[name] = agent
+        self.speech_analytics.add_player(name)
+        return agent
+
     async def create_player(self, role: str, character: str) -> ReActAgent:
         """创建具有三国背景的玩家"""
         name = get_chinese_name(character)
-        self.roles[name] = role
-
-        agent = ReActAgent(
-            name=name,
-            sys_prompt=ChinesePrompt.get_role_prompt(role, character),
-            model=DashScopeChatModel(
-                model_name=os.getenv("LLM_MODEL_ID"),
-                api_key=os.getenv("LLM_API_KEY"),
-                enable_thinking=True
-            ),
-            formatter=DashScopeMultiAgentFormatter(),
-        )
+        agent = self._build_agent(name, role, character)
+        self.state.add_player(name, role, character)
 
         # 角色身份确认
         await agent.observe(
@@ -502,8 +1093,6 @@ class ThreeKingdomsWerewolfGame():
                 f"你的角色是{character}。{GameRoles.get_role_ability(role)}"
             )
         )
-
-        self.player[name]= agent
         return agent
     
     async def setup_game(self, player_count: int = 6):
@@ -519,20 +1108,8 @@ class ThreeKingdomsWerewolfGame():
 
         # 创建玩家
         for i, (role, character) in enumerate(zip(roles, characters)):
-            agent = await self.create_player(role, character)
-            self.alive_players.append(agent)
-
-            # 分配到对应阵营
-            if role == "狼人":
-                self.werewolves.append(agent)
-            elif role == "预言家":
-                self.seer.append(agent)
-            elif role == "女巫":
-                self.witch.append(agent)
-            elif role == "猎人":
-                self.hunter.append(agent)
-            else:
-                self.villagers.append(agent)
+            await self.create_player(role, character)
+        self.state.log_event("setup", roles=dict(self.roles))
         
         # 游戏开始公告
         await self.moderator.announce(
@@ -544,7 +1121,8 @@ class ThreeKingdomsWerewolfGame():
  
     async def werewolf_phase(self, round_num: int):
         """狼人阶段 - 展示消息驱动的协作模式"""
-        if not self.werewolves:
+        werewolves = self.werewolves
+        if not werewolves:
             return None
         
         await self.moderator.announce(f"🐺 狼人请睁眼，选择今晚要击杀的目标...")
@@ -552,40 +1130,45 @@ class ThreeKingdomsWerewolfGame():
         # 通过消息中心建立狼人专属通信频道
         # 狼人讨论
         async with MsgHub(
-            self.werewolves,
+            werewolves,
+            name=f"{self.game_id}-werewolves-{round_num}",
             enable_auto_broadcast=True,
             announcement=await self.moderator.announce(
                 f"狼人们，请讨论今晚的击杀目标，存活玩家：{format_player_list(self.alive_players)}"
             ),
         ) as werewolves_hub:
             # 讨论阶段：狼人通过消息交换策略
-            for _ in range(MAX_DISCUSSION_ROUND):
-                for wolf in self.werewolves:
-                    await wolf(structured_model=DiscussionModelCN)
+            with self.profiler.span("discussion"):
+                for _ in range(MAX_DISCUSSION_ROUND):
+                    for wolf in werewolves:
+                        await wolf(structured_model=DiscussionModelCN)
             
             # 投票阶段：收集并统计狼人的击杀决策
-            werewolves_hub.set_auto_broadcast(False)
-            kill_votes = await fanout_pipeline(
-                self.werewolves,
-                msg=await self.moderator.announce("请选择击杀目标"),
-                structured_model=WerewolfKillModelCN,
-                enable_gather=False
-            )
-
-            # 统计投票
-            votes = {}
-            for i, vote_msg in enumerate(kill_votes):
-                # 检查 vote_msg 是否为 None 或 metadata 是否存在
-                if vote_msg is not None and hasattr(vote_msg, "metadata") and vote_msg.metadata is not None:
-                    votes[self.werewolves[i].name] = vote_msg.metadata.get("target")
-                else:
-                    # 如果返回无效，随机选择一个目标
-                    print(f"⚠️ {self.werewolves[i].name} 的击杀投票无效,随机选择目标")
-                    import random
-                    valid_targets = [p.name for p in self.alive_players if p.name not in [w.name for w in self.werewolves]]
-                    votes[self.werewolves[i].name] = random.choice(valid_targets) if valid_targets else None
+            with self.profiler.span("vote"):
+                werewolves_hub.set_auto_broadcast(False)
+                kill_votes = await fanout_pipeline(
+                    werewolves,
+                    msg=await self.moderator.announce("请选择击杀目标"),
+                    structured_model=WerewolfKillModelCN,
+                    enable_gather=False
+                )
+
+                # 统计投票
+                votes = {}
+                kill_choices = {"target": self.state.alive_names()}
+                for i, vote_msg in enumerate(kill_votes):
+                    decision = await self._structured_decision(werewolves[i], vote_msg, WerewolfKillModelCN, kill_choices)
+                    if decision is not None:
+                        votes[werewolves[i].name] = decision["target"]
+                    else:
+                        # 如果返回无效，随机选择一个目标
+                        print(f"⚠️ {werewolves[i].name} 的击杀投票无效,随机选择目标")
+                        record_structured_failure()
+                        valid_targets = [n for n in self.state.alive_names() if self.roles[n] != "狼人"]
+                        votes[werewolves[i].name] = random.choice(valid_targets) if valid_targets else None
             
             killed_player, _ = majority_vote_cn(votes)
+            self.state.log_event("werewolf_kill", votes=votes, target=killed_player)
             return killed_player
     
     async def seer_phase(self):
@@ -595,21 +1178,24 @@ class ThreeKingdomsWerewolfGame():
         seer_agent = self.seer[0]
         await self.moderator.announce("🔮 预言家请睁眼，选择要查验的玩家...")
 
-        check_result = await seer_agent(
-            structured_model=get_seer_model_cn(self.alive_players)
-        )
+        seer_model = get_seer_model_cn(self.alive_players)
+        check_result = await seer_agent(structured_model=seer_model)
 
         # 检查返回结果是否有效
-        if check_result is None or not hasattr(check_result, "metadata") or check_result.metadata is None:
+        decision = await self._structured_decision(seer_agent, check_result, seer_model)
+        if decision is None:
             print(f"⚠️ 预言家查验失败,跳过此阶段")
+            record_structured_failure()
             return
         
-        target_name = check_result.metadata.get("target")
+        target_name = decision.get("target")
         if not target_name:
             print(f"⚠️ 预言家未选择查验目标,跳过此阶段")
+            record_structured_failure()
             return
         
         target_role = self.roles.get(target_name, "村民")
+        self.state.log_event("seer_check", seer=seer_agent.name, target=target_name, result=target_role == "狼人")
 
         # 告知预言家结果
         result_msg = f"查验结果：{target_name}是{'狼人' if target_role == '狼人' else '好人'}"
@@ -618,7 +1204,8 @@ class ThreeKingdomsWerewolfGame():
     async def witch_phase(self, killed_player: str):
         """女巫阶段"""
         if not self.witch:
-            return
+            # 女巫已出局：狼人的击杀照常生效
+            return killed_player, None
         
         witch_agent = self.witch[0]
         await self.moderator.announce("🧙‍♀️ 女巫请睁眼...")
@@ -634,19 +1221,25 @@ class ThreeKingdomsWerewolfGame():
         poisoned_player = None
 
         # 检查返回结果是否有效
-        if witch_action is None or not hasattr(witch_action, 'metadata') or witch_action.metadata is None:
+        decision = await self._structured_decision(
+            witch_agent, witch_action, WitchActionModelCN, {"target_name": self.state.alive_names()}
+        )
+        if decision is None:
             print(f"⚠️ 女巫行动失败,视为不使用技能")
+            record_structured_failure()
         else:
-            if witch_action.metadata.get("user_antidote") and self.witch_has_antidote:
+            if decision.get("use_antidot") and self.witch_has_antidote:
                 if killed_player:
                     saved_player = killed_player
                     self.witch_has_antidote = False
+                    self.state.log_event("witch_save", target=killed_player)
                     await witch_agent.observe(await self.moderator.announce(f"你使用解药救了{killed_player}"))
             
-            if witch_action.metadata.get("use_poison") and self.witch_has_poison:
-                poisoned_player = witch_action.metadata.get('target_name')
+            if decision.get("use_poison") and self.witch_has_poison:
+                poisoned_player = decision.get('target_name')
                 if poisoned_player:
                     self.witch_has_poison = False
+                    self.state.log_event("witch_poison", target=poisoned_player)
                     await witch_agent.observe(await self.moderator.announce(f"你使用毒药毒杀了{poisoned_player}"))
 
         # 确定最终死亡玩家
@@ -663,128 +1256,315 @@ class ThreeKingdomsWerewolfGame():
         if hunter_agent.name == shot_by_hunter:
             await self.moderator.announce("🏹 猎人发动技能，可以带走一名玩家...")
 
-            hunter_action = await hunter_agent(
-                structured_model=get_hunter_model_cn(self.alive_players)
-            )
+            hunter_model = get_hunter_model_cn(self.alive_players)
+            hunter_action = await hunter_agent(structured_model=hunter_model)
 
             # 检查返回结果是否有效
-            if hunter_action is None or not hasattr(hunter_action, 'metadata') or hunter_action.metadata is None:
+            decision = await self._structured_decision(hunter_agent, hunter_action, hunter_model)
+            if decision is None:
                 print(f"⚠️ 猎人技能使用失败,视为放弃开枪")
+                record_structured_failure()
                 return None
             
-            if hunter_action.metadata.get("shoot"):
-                target = hunter_action.metadata.get("target")
+            if decision.get("shoot"):
+                target = decision.get("target")
                 if target:
+                    self.state.log_event("hunter_shot", hunter=hunter_agent.name, target=target)
                     await self.moderator.announce(f"猎人{hunter_agent.name}开枪带走了{target}")
                     return target
                 else:
                     print(f"⚠️ 猎人选择开枪但未指定目标,视为放弃")
+                    record_structured_failure()
                     return None
         
         return None
 
-    def update_alive_player(self, dead_player: List[str]):
-        """更新存活玩家列表"""
+    async def night_phase(self, round_num: int):
+        """
+        夜晚行动：只保留真实的依赖关系
+
+        预言家查验与狼人讨论互不依赖，并发执行；女巫需要知道击杀目标，等待狼人阶段完成。
+        夜晚的死亡在全部行动结束后才结算，各阶段看到的存活玩家一致。
+        各阶段的主持人公告分别缓冲，夜晚结束后按 狼人 -> 预言家 -> 女巫 的顺序写入日志，
+        日志与检查点的内容不随并发调度的先后变化。
+        """
+        buffers: Dict[str, List[tuple]] = {"werewolf": [], "seer": [], "witch": []}
+
+        async def phase(name: str, awaitable):
+            with self.moderator.buffered(buffers[name]):
+                return await self._timed(name, awaitable)
+
+        scheduler = PhaseScheduler()
+        scheduler.add("werewolf", lambda: phase("werewolf", self.werewolf_phase(round_num)))
+        scheduler.add("seer", lambda: phase("seer", self.seer_phase()))
+        scheduler.add("witch", lambda killed: phase("witch", self.witch_phase(killed)), deps=("werewolf",))
+        try:
+            results = await scheduler.run()
+        finally:
+            for buffer in buffers.values():
+                await self.moderator.flush(buffer)
+        return results["witch"]
+
+    def update_alive_player(self, dead_player: List[str], cause: str = "淘汰"):
+        """更新存活状态：每名玩家只修改状态表中的一行"""
         for dead_name in dead_player:
             if dead_name:
-                # 从存活玩家列表中移除
-                self.alive_players = [p for p in self.alive_players if p.name != dead_name]
-                # 从各阵营中移除
-                self.werewolves = [p for p in self.werewolves if p.name != dead_name]
-                self.villagers = [p for p in self.villagers if p.name != dead_name]
-                self.seer = [p for p in self.seer if p.name != dead_name]
-                self.witch = [p for p in self.witch if p.name != dead_name]
-                self.hunter = [p for p in self.hunter if 
-                p.name != dead_name]
+                self.state.kill(dead_name, cause)
     
     async def day_phase(self, round_num: int):
         """白天阶段"""
         await self.moderator.day_announcement(round_num)
+        alive_players = self.alive_players
 
         # 讨论阶段
         async with MsgHub(
-            self.alive_players,
+            alive_players,
+            name=f"{self.game_id}-day-{round_num}",
             enable_auto_broadcast=True,
             announcement=await self.moderator.announce(
-                f"现在开始自由讨论，存活玩家：{format_player_list(self.alive_players)}"
+                f"现在开始自由讨论，存活玩家：{format_player_list(alive_players)}"
             ),
         ) as all_hub:
-            # 每人发言一轮
-            await sequential_pipeline(self.alive_players)
+            # 每人发言一轮（与 sequential_pipeline 相同，前一人的发言作为下一人的输入），发言逐条送入分析器
+            with self.profiler.span("discussion"):
+                speech = None
+                for player in alive_players:
+                    speech = await player(speech)
+                    if speech is not None:
+                        self.speech_analytics.observe_speech(player.name, _msg_text(speech))
 
             # 投票阶段
-            all_hub.set_auto_broadcast(False)
-            vote_msgs = await fanout_pipeline(
-                self.alive_players,
-                await self.moderator.announce("请投票选择要淘汰的玩家"),
-                structured_model=get_vote_model_cn(self.alive_players),
-                enable_gather=False
-            )
-
-            # 统计投票
-            votes = {}
-            for i, vote_msg in enumerate(vote_msgs):
-                # 检查vote_msg是否为None或metadata是否存在
-                if vote_msg is not None and hasattr(vote_msg, 'metadata') and vote_msg.metadata is not None:
-                    votes[self.alive_players[i].name] = vote_msg.metadata.get('vote')
-                else:
-                    # 如果返回无效，默认弃票
-                    print(f"⚠️ {self.alive_players[i].name} 的投票无效,视为弃票")
-                    votes[self.alive_players[i].name] = None
+            with self.profiler.span("vote"):
+                all_hub.set_auto_broadcast(False)
+                vote_model = get_vote_model_cn(alive_players)
+                vote_msgs = await fanout_pipeline(
+                    alive_players,
+                    await self.moderator.announce("请投票选择要淘汰的玩家"),
+                    structured_model=vote_model,
+                    enable_gather=False
+                )
+
+                # 统计投票
+                votes = {}
+                for i, vote_msg in enumerate(vote_msgs):
+                    decision = await self._structured_decision(alive_players[i], vote_msg, vote_model)
+                    if decision is not None:
+                        votes[alive_players[i].name] = decision['vote']
+                    else:
+                        # 如果返回无效，默认弃票
+                        print(f"⚠️ {alive_players[i].name} 的投票无效,视为弃票")
+                        record_structured_failure()
+                        votes[alive_players[i].name] = None
 
             voted_out, vote_count = majority_vote_cn(votes)
+            self.speech_analytics.observe_event(
+                self.state.log_event("day_vote", votes=votes, voted_out=voted_out, count=vote_count)
+            )
             await self.moderator.vote_result_announcement(voted_out, vote_count)
 
             return voted_out
-        
-    async def run_game(self):
-        """运行游戏主循环"""
+
+    async def _structured_decision(
+        self,
+        agent: AgentBase,
+        reply: Optional[Msg],
+        schema: type[BaseModel],
+        choices: Optional[Dict[str, List[str]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        取出玩家的结构化决策
+
+        已有 metadata 时校验后使用（姓名写法有偏差时就地纠正）；没有时先从回复文本本地修复，
+        仍不合法则只就出错的字段追问一次并与已修复的部分合并。全部失败返回 None，由调用方走原有的兜底逻辑。
+        """
+        metadata = getattr(reply, "metadata", None) if reply is not None else None
+        stats = self.structured.stats
+        result = self.structured.parse(
+            metadata if metadata is not None else (_msg_text(reply) if reply is not None else ""), schema, choices
+        )
+        if result.ok:
+            stats["valid" if metadata is not None and not result.repaired else "repaired"] += 1
+            return result.value.model_dump()
+
+        stats["reasked"] += 1
+        prompt = self.structured.reask_prompt(result, schema, choices)
+        try:
+            retry = await agent(Msg(name=self.moderator.name, content=prompt, role="system"), structured_model=schema)
+        except Exception as e:
+            print(f"⚠️ {agent.name} 的追问失败: {e}")
+            retry = None
+        if retry is not None:
+            retry_metadata = getattr(retry, "metadata", None)
+            result = self.structured.merge(
+                result, retry_metadata if retry_metadata is not None else _msg_text(retry), schema, choices
+            )
+            if result.ok:
+                return result.value.model_dump()
+
+        stats["failed"] += 1
+        return None
+
+    async def _timed(self, phase: str, awaitable):
+        """执行一个阶段：累计其耗时，并在剖析器中打开同名区间"""
+        start = time.perf_counter()
         try:
-            await self.setup_game()
+            with self.profiler.span(phase):
+                return await awaitable
+        finally:
+            self.phase_timings[phase] += time.perf_counter() - start
+
+    def _finish(self, winner: Optional[str], rounds: int, started: float) -> Dict[str, Any]:
+        """记录对局结果"""
+        if winner is None:
+            winner_team = None
+        else:
+            winner_team = "好人阵营" if winner.startswith("好人") else "狼人阵营"
+        self.result = {
+            "player_count": len(self.roles),
+            "winner": winner_team,
+            "rounds": rounds,
+            "duration": time.perf_counter() - started,
+            "phase_timings": dict(self.phase_timings),
+            "profile": self.profiler.report(),
+            "structured_output": dict(self.structured.stats),
+            # 按怀疑度降序的发言分析指标，可与真实身份对照评估发言策略
+            "speech_analytics": self.speech_analytics.report(),
+        }
+        return self.result
+
+    # ---- 检查点 ----
+
+    def save_checkpoint(self):
+        """在阶段边界保存快照：状态表、各玩家记忆、主持人日志（原子替换）"""
+        if not self.checkpoint_dir:
+            return
+        snapshot = {
+            "state": self.state.to_dict(),
+            "agents": {name: agent.state_dict() for name, agent in self.player.items()},
+            "moderator_log": self.moderator.game_log,
+            "phase_timings": dict(self.phase_timings),
+            "compactor": self.compactor.state_dict() if self.compactor else None,
+            "speech_analytics": self.speech_analytics.state_dict(),
+        }
+        path = os.path.join(self.checkpoint_dir, self.SNAPSHOT_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, default=str)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def resume(
+        cls,
+        checkpoint_dir: str,
+        player_factory: Optional[Callable[["ThreeKingdomsWerewolfGame", str, str, str], AgentBase]] = None,
+        verbose: bool = True,
+        memory_keep_rounds: Optional[int] = 1
+    ) -> "ThreeKingdomsWerewolfGame":
+        """
+        从检查点恢复对局，之后调用 run_game 会从最后一个完成的阶段继续
+
+        快照之后追加的事件属于未完成的阶段，会从事件日志中截断
+        """
+        game = cls(
+            player_factory=player_factory, verbose=verbose,
+            checkpoint_dir=checkpoint_dir, memory_keep_rounds=memory_keep_rounds
+        )
+        with open(os.path.join(checkpoint_dir, cls.SNAPSHOT_NAME), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+        events: List[Dict[str, Any]] = []
+        event_path = os.path.join(checkpoint_dir, cls.EVENTS_NAME)
+        if os.path.exists(event_path):
+            with open(event_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+        game.state = GameState.from_dict(snapshot["state"], events, event_path=event_path)
+        with open(event_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in game.state.events)
+
+        for record in game.state.records.values():
+            agent = game._build_agent(record.name, record.role, record.character)
+            agent.load_state_dict(snapshot["agents"].get(record.name, {}))
+        game.moderator.game_log = snapshot["moderator_log"]
+        game.phase_timings.update(snapshot.get("phase_timings", {}))
+        game.speech_analytics.load_state_dict(snapshot.get("speech_analytics", {}))
+        if game.compactor and snapshot.get("compactor"):
+            game.compactor.load_state_dict(snapshot["compactor"])
+        print(f"♻️ 已从检查点恢复：第{game.state.round}轮{'夜晚' if game.state.next_phase == 'night' else '白天'}，"
+              f"已记录 {len(game.state.events)} 条事件")
+        return game
+
+    async def _end_game(self, winner: str, round_num: int, started: float) -> Dict[str, Any]:
+        await self.moderator.game_over_announcement(winner)
+        self.state.log_event("game_over", winner=winner)
+        self.state.next_phase = "finished"
+        self.save_checkpoint()
+        return self._finish(winner, round_num, started)
+
+    async def run_game(self, player_count: int = 6) -> Dict[str, Any]:
+        """
+        运行游戏主循环，返回对局结果（胜利阵营、轮数、各阶段耗时）
+
+        对局从状态表记录的进度开始：新对局先完成设置；由 resume 恢复的对局直接从保存的轮次与阶段继续
+        """
+        started = time.perf_counter()
+        round_num = self.state.round
+        try:
+            if not self.state.records:
+                await self._timed("setup", self.setup_game(player_count))
+                self.save_checkpoint()
+            elif self.state.next_phase == "finished":
+                return self._finish(self.state.check_winner(), self.state.round, started)
             
-            for round_num in range(1, MAX_GAME_ROUND + 1):
-                print(f"\n🌙 === 第{round_num}轮游戏开始 ===")
+            for round_num in range(self.state.round, MAX_GAME_ROUND + 1):
+                self.state.round = round_num
 
-                # 夜晚阶段
-                await self.moderator.night_announcement(round_num)
+                if self.state.next_phase == "night":
+                    print(f"\n🌙 === 第{round_num}轮游戏开始 ===")
+                    if self.compactor:
+                        await self.compactor.compact(round_num)
 
-                killed_player = await self.werewolf_phase(round_num)
+                    # 夜晚阶段
+                    await self.moderator.night_announcement(round_num)
 
-                # 预言家查验
-                await self.seer_phase()
+                    # 狼人击杀、预言家查验、女巫行动
+                    final_killed, poisoned_player = await self._timed("night", self.night_phase(round_num))
 
-                # 女巫行动
-                final_killed, poisoned_player = await self.witch_phase(killed_player)
+                    # 更新死亡玩家
+                    night_deaths = [p for p in [final_killed, poisoned_player] if p]
+                    self.update_alive_player(night_deaths, cause="夜晚死亡")
 
-                # 更新死亡玩家
-                night_deaths = [p for p in [final_killed, poisoned_player] if p]
-                self.update_alive_player(night_deaths)
+                    # 死亡公告
+                    await self.moderator.death_announcement(night_deaths)
 
-                # 死亡公告
-                await self.moderator.death_announcement(night_deaths)
+                    # 检查胜利条件
+                    winner = self.state.check_winner()
+                    if winner:
+                        return await self._end_game(winner, round_num, started)
 
-                # 检查胜利条件
-                winner = check_winning_cn(self.alive_players, self.roles)
-                if winner:
-                    await self.moderator.game_over_announcement(winner)
-                    return
+                    self.state.next_phase = "day"
+                    self.save_checkpoint()
 
                 # 白天阶段
-                voted_out = await self.day_phase(round_num)
+                voted_out = await self._timed("day", self.day_phase(round_num))
 
                 # 猎人技能
-                hunter_shot = await self.hunter_phase(voted_out)
+                hunter_shot = await self._timed("hunter", self.hunter_phase(voted_out))
 
                 # 更新死亡玩家
-                day_deaths = [p for p in [voted_out, hunter_shot] if p]
-                self.update_alive_player(day_deaths)
+                self.update_alive_player([voted_out], cause="投票出局")
+                self.update_alive_player([hunter_shot], cause="猎人开枪")
 
                 # 检查胜利条件
-                # 检查胜利条件
-                winner = check_winning_cn(self.alive_players, self.roles)
+                winner = self.state.check_winner()
                 if winner:
-                    await self.moderator.game_over_announcement(winner)
-                    return
+                    return await self._end_game(winner, round_num, started)
+
+                self.state.round = round_num + 1
+                self.state.next_phase = "night"
+                self.save_checkpoint()
                 
                 print(f"第{round_num}轮结束，存活玩家：{format_player_list(self.alive_players)}")
             
@@ -792,8 +1572,441 @@ class ThreeKingdomsWerewolfGame():
             print(f"❌ 游戏运行出错：{e}")
             import traceback
             traceback.print_exc()
+            self._finish(None, round_num, started)
+            self.result["error"] = str(e)
+            return self.result
+
+        # 达到最大轮数仍未分出胜负
+        return self._finish(None, round_num, started)
+
+
+# --- 无头模拟：脚本玩家 + 多进程蒙特卡洛 ---
+class ScriptedPlayer(AgentBase):
+    """
+    不调用 LLM 的脚本玩家，用于无头模拟
+
+    根据 structured_model 的字段判断当前是哪种决策，直接返回带 metadata 的 Msg：
+    - policy="random": 在合法选项中均匀随机
+    - policy="scripted": 简单启发式（狼人不投/不杀队友，预言家投查验出的狼人，女巫首夜必救）
+    """
+
+    CHECK_RESULT_PATTERN = re.compile(r"查验结果：(\S+?)是(狼人|好人)")
+
+    def __init__(self, name: str, role: str, game: "ThreeKingdomsWerewolfGame", policy: str = "scripted",
+                 rng: Optional[random.Random] = None) -> None:
+        super().__init__()
+        self.name = name
+        self.role = role
+        self.game = game
+        self.policy = policy
+        self.rng = rng or random.Random()
+        self.checked: Dict[str, str] = {}
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"checked": dict(self.checked)}
+
+    def load_state_dict(self, state_dict: Dict[str, Any], strict: bool = True) -> None:
+        self.checked = dict(state_dict.get("checked", {}))
+
+    async def observe(self, msg) -> None:
+        """只有预言家需要记住查验结果，其余消息直接忽略"""
+        if self.role != "预言家" or msg is None:
+            return
+        for m in msg if isinstance(msg, list) else [msg]:
+            match = self.CHECK_RESULT_PATTERN.search(str(m.content))
+            if match:
+                self.checked[match.group(1)] = match.group(2)
+
+    def _others(self) -> List[str]:
+        return [p.name for p in self.game.alive_players if p.name != self.name]
+
+    def _pick(self, candidates: List[str]) -> Optional[str]:
+        return self.rng.choice(candidates) if candidates else None
+
+    def _non_wolves(self) -> List[str]:
+        return [n for n in self._others() if not GameRoles.is_werewolf(self.game.roles.get(n, ""))]
+
+    def _decide_vote(self) -> Dict[str, Any]:
+        others = self._others()
+        target = None
+        if self.policy == "scripted":
+            if GameRoles.is_werewolf(self.role):
+                target = self._pick(self._non_wolves())
+            elif self.role == "预言家":
+                target = self._pick([n for n in others if self.checked.get(n) == "狼人"])
+                if target is None:
+                    target = self._pick([n for n in others if self.checked.get(n) != "好人"])
+        target = target or self._pick(others)
+        return {"vote": target, "reason": "脚本投票", "suspicion_level": self.rng.randint(1, 10)}
+
+    def _decide_kill(self) -> Dict[str, Any]:
+        return {"target": self._pick(self._non_wolves()), "kill_strategy": "脚本击杀", "team_coordination": None}
+
+    def _decide_check(self) -> Dict[str, Any]:
+        unchecked = [n for n in self._others() if n not in self.checked]
+        return {"target": self._pick(unchecked or self._others()), "check_reason": "脚本查验", "priority_level": 5}
+
+    def _decide_witch(self) -> Dict[str, Any]:
+        if self.policy == "scripted":
+            use_antidot = self.game.witch_has_antidote
+            use_poison = self.game.witch_has_poison and self.rng.random() < 0.2
+        else:
+            use_antidot = self.rng.random() < 0.5
+            use_poison = self.rng.random() < 0.5
+        target = self._pick(self._others()) if use_poison else None
+        return {"use_antidot": use_antidot, "use_poison": use_poison, "target_name": target, "action_reason": "脚本行动"}
+
+    def _decide_shot(self) -> Dict[str, Any]:
+        return {"shoot": True, "target": self._pick(self._others()), "shoot_reason": "脚本开枪"}
+
+    async def reply(self, msg=None, structured_model: Optional[type[BaseModel]] = None, **kwargs) -> Msg:
+        fields = structured_model.model_fields if structured_model is not None else {}
+        if "vote" in fields:
+            metadata = self._decide_vote()
+        elif "kill_strategy" in fields:
+            metadata = self._decide_kill()
+        elif "check_reason" in fields:
+            metadata = self._decide_check()
+        elif "use_antidot" in fields:
+            metadata = self._decide_witch()
+        elif "shoot" in fields:
+            metadata = self._decide_shot()
+        elif "reach_agreement" in fields:
+            metadata = {"reach_agreement": self.rng.random() < 0.5, "confidence_level": self.rng.randint(1, 10),
+                        "key_evidence": None}
+        else:
+            return Msg(name=self.name, content="我是好人，请大家相信我。", role="assistant")
+        return Msg(name=self.name, content=str(metadata), role="assistant", metadata=metadata)
+
+
+def scripted_player_factory(policy: str, rng: random.Random) -> Callable[..., AgentBase]:
+    """创建脚本玩家工厂"""
+    def factory(game: ThreeKingdomsWerewolfGame, name: str, role: str, character: str) -> AgentBase:
+        return ScriptedPlayer(name, role, game, policy=policy, rng=rng)
+    return factory
+
+
+def _simulate_batch(player_count: int, seeds: List[int], policy: str) -> List[Dict[str, Any]]:
+    """在子进程中串行运行一批无头对局（屏蔽所有打印输出，出错的对局计入汇总）"""
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        for seed in seeds:
+            random.seed(seed)
+            game = ThreeKingdomsWerewolfGame(
+                player_factory=scripted_player_factory(policy, random.Random(seed)),
+                verbose=False
+            )
+            results.append(asyncio.run(game.run_game(player_count)))
+    return results
+
+
+def summarize_simulations(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总一组对局结果：胜率、平均轮数、各阶段平均耗时"""
+    games = len(results)
+    winners = Counter(r["winner"] or "平局" for r in results)
+    phase_totals: Dict[str, float] = defaultdict(float)
+    for r in results:
+        for phase, seconds in r["phase_timings"].items():
+            phase_totals[phase] += seconds
+    return {
+        "games": games,
+        "win_rates": {team: count / games for team, count in winners.items()},
+        "errors": sum(1 for r in results if r.get("error")),
+        "avg_rounds": sum(r["rounds"] for r in results) / games,
+        "avg_duration_ms": sum(r["duration"] for r in results) / games * 1000,
+        "avg_phase_ms": {phase: total / games * 1000 for phase, total in phase_totals.items()},
+    }
+
+
+def run_monte_carlo(
+    player_counts: List[int],
+    games: int = 1000,
+    workers: Optional[int] = None,
+    policy: str = "scripted",
+    seed: int = 0,
+    batch_size: int = 50,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    在进程池中为每种人数配置运行 games 局无头对局，并打印汇总报告
+
+    Args:
+        player_counts: 要比较的人数配置，角色由 GameRoles.get_standard_setup 决定
+        games: 每种配置的对局数
+        workers: 进程数，默认为 CPU 核数
+        policy: 脚本玩家策略，"scripted" 或 "random"
+        seed: 随机种子，相同种子可复现结果
+        batch_size: 每个子任务包含的对局数，减少进程间通信开销
+    """
+    summaries: Dict[int, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for player_count in player_counts:
+            seeds = [seed * 1_000_003 + player_count * 100_003 + i for i in range(games)]
+            futures = [
+                pool.submit(_simulate_batch, player_count, seeds[i:i + batch_size], policy)
+                for i in range(0, games, batch_size)
+            ]
+            results = [r for f in futures for r in f.result()]
+            summaries[player_count] = summarize_simulations(results)
+
+    for player_count, summary in summaries.items():
+        setup = "、".join(f"{role}x{n}" for role, n in Counter(GameRoles.get_standard_setup(player_count)).items())
+        print(f"\n📊 {player_count} 人局（{setup}），共 {summary['games']} 局，策略 {policy}")
+        for team, rate in sorted(summary["win_rates"].items()):
+            print(f"  {team}: {rate:.1%}")
+        print(f"  平均轮数: {summary['avg_rounds']:.2f}，平均单局耗时: {summary['avg_duration_ms']:.2f} ms")
+        phases = "，".join(f"{phase} {ms:.3f} ms" for phase, ms in summary["avg_phase_ms"].items())
+        print(f"  各阶段平均耗时: {phases}")
+        if summary["errors"]:
+            print(f"  ⚠️ 出错对局: {summary['errors']}")
+    return summaries
+
+# --- 锦标赛：单进程内并发多局，共享模型客户端与全局限流 ---
+class ModelUsage:
+    """一组模型调用的用量统计"""
+
+    __slots__ = ("calls", "input_tokens", "output_tokens", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = 0.0
+
+    def record(self, input_tokens: int, output_tokens: int, latency: float):
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.latency += latency
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+def _estimate_prompt_tokens(messages: Any) -> int:
+    """粗略估算格式化后提示词的 token 数"""
+    return estimate_tokens(json.dumps(messages, ensure_ascii=False, default=str))
+
 
-async def main():
+class SharedModelClient:
+    """
+    多局共享的模型客户端：所有对局的请求经过同一个模型实例与同一个限流器
+
+    bind 返回一个轻量的计量句柄交给玩家使用，用量同时记入各自的统计对象（按对局、按参赛方）
+    """
+
+    def __init__(self, model: Any, limiter: RateLimiter, max_output_tokens: int = 1024):
+        """
+        Args:
+            model: agentscope 对话模型实例
+            limiter: 全局限流器，多个客户端可以共用同一个
+            max_output_tokens: 预扣额度时为输出预留的 token 数
+        """
+        self.model = model
+        self.limiter = limiter
+        self.max_output_tokens = max_output_tokens
+
+    def bind(self, *usages: ModelUsage) -> "MeteredModel":
+        return MeteredModel(self, usages)
+
+
+class MeteredModel:
+    """绑定到统计对象的模型句柄，调用方式与 agentscope 对话模型相同"""
+
+    def __init__(self, client: SharedModelClient, usages: tuple):
+        self.client = client
+        self.usages = usages
+
+    @property
+    def stream(self) -> bool:
+        return self.client.model.stream
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client.model, name)
+
+    async def __call__(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+        estimated = _estimate_prompt_tokens(messages) + self.client.max_output_tokens
+        await self.client.limiter.acquire(estimated)
+        started = time.perf_counter()
+        try:
+            response = await self.client.model(messages, *args, **kwargs)
+        except BaseException:
+            self.client.limiter.settle(estimated, 0)
+            raise
+        if self.client.model.stream:
+            return self._metered_stream(response, estimated, started)
+        self._settle(getattr(response, "usage", None), estimated, started)
+        return response
+
+    async def _metered_stream(self, response: Any, estimated: int, started: float):
+        usage = None
+        try:
+            async for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        finally:
+            self._settle(usage, estimated, started)
+
+    def _settle(self, usage: Any, estimated: int, started: float):
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        actual = input_tokens + output_tokens
+        self.client.limiter.settle(estimated, actual if usage is not None else estimated)
+        latency = time.perf_counter() - started
+        for stats in self.usages:
+            stats.record(input_tokens, output_tokens, latency)
+        record_model_call(input_tokens, output_tokens)
+
+
+class Contestant:
+    """参赛方：一个模型客户端 + 一套角色提示词"""
+
+    def __init__(
+        self,
+        name: str,
+        client: SharedModelClient,
+        prompt: Callable[[str, str], str] = ChinesePrompt.get_role_prompt
+    ):
+        self.name = name
+        self.client = client
+        self.prompt = prompt
+        self.usage = ModelUsage()
+
+
+class WerewolfTournament:
+    """
+    锦标赛：在一个 asyncio 事件循环里并发运行多局
+
+    - 每局按随机种子为每个座位分配一个参赛方，统计 参赛方 × 角色 的胜率
+    - 所有对局共享参赛方的模型客户端与全局限流器，吞吐由服务商配额而不是对局串行速度决定
+    - 每局拥有独立的玩家、状态表与以 game_id 命名的消息中心
+    """
+
+    def __init__(
+        self,
+        contestants: List[Contestant],
+        player_count: int = 6,
+        max_concurrency: int = 8,
+        seed: int = 0,
+        checkpoint_root: Optional[str] = None
+    ):
+        """
+        Args:
+            contestants: 参赛方列表
+            player_count: 每局人数
+            max_concurrency: 同时进行的最大对局数（请求速率由限流器控制，这里只限制内存占用）
+            seed: 座位分配的随机种子
+            checkpoint_root: 检查点根目录，每局保存在以 game_id 命名的子目录中
+        """
+        self.contestants = contestants
+        self.player_count = player_count
+        self.max_concurrency = max_concurrency
+        self.seed = seed
+        self.checkpoint_root = checkpoint_root
+        self.results: List[Dict[str, Any]] = []
+
+    def _player_factory(self, seats: Dict[str, str], usage: ModelUsage, rng: random.Random):
+        def factory(game: ThreeKingdomsWerewolfGame, name: str, role: str, character: str) -> AgentBase:
+            contestant = rng.choice(self.contestants)
+            seats[name] = contestant.name
+            model = contestant.client.bind(usage, contestant.usage)
+            return create_llm_player(name, contestant.prompt(role, character), model, verbose=False)
+        return factory
+
+    async def play(self, index: int) -> Dict[str, Any]:
+        """运行一局并返回带座位分配与用量的结果"""
+        game_id = f"g{index:04d}"
+        seats: Dict[str, str] = {}
+        usage = ModelUsage()
+        game = ThreeKingdomsWerewolfGame(
+            player_factory=self._player_factory(seats, usage, random.Random(self.seed * 1_000_003 + index)),
+            verbose=False,
+            checkpoint_dir=os.path.join(self.checkpoint_root, game_id) if self.checkpoint_root else None,
+            game_id=game_id,
+        )
+        result = await game.run_game(self.player_count)
+        return {
+            **result,
+            "game_id": game_id,
+            "seats": {name: {"contestant": seats[name], "role": game.roles[name]} for name in seats},
+            "usage": usage.to_dict(),
+        }
+
+    async def run(self, games: int) -> Dict[str, Any]:
+        """并发运行 games 局，返回汇总报告"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+
+        async def bounded(index: int):
+            async with semaphore:
+                result = await self.play(index)
+                print(f"🏁 {result['game_id']} 结束：{result['winner'] or '未分胜负'}，"
+                      f"{result['usage']['calls']} 次调用，{result['duration']:.1f}s")
+                return result
+
+        self.results = await asyncio.gather(*(bounded(i) for i in range(games)))
+        return self.summarize(time.perf_counter() - started)
+
+    def summarize(self, wall_time: float) -> Dict[str, Any]:
+        """按 参赛方 × 角色 汇总胜率，并统计每局的 token 与延迟"""
+        records: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+        for result in self.results:
+            if not result["winner"]:
+                continue
+            for seat in result["seats"].values():
+                faction = "狼人阵营" if GameRoles.is_werewolf(seat["role"]) else "好人阵营"
+                won = int(faction == result["winner"])
+                for key in [(seat["contestant"], seat["role"]), (seat["contestant"], "全部")]:
+                    records[key][0] += won
+                    records[key][1] += 1
+
+        games = len(self.results) or 1
+        total_calls = sum(r["usage"]["calls"] for r in self.results)
+        limiter_wait = sum({id(c.client.limiter): c.client.limiter.waited for c in self.contestants}.values())
+        return {
+            "games": len(self.results),
+            "errors": sum(1 for r in self.results if r.get("error")),
+            "wall_time": wall_time,
+            "win_rates": {
+                f"{contestant}/{role}": {"win_rate": won / played, "seats": played}
+                for (contestant, role), (won, played) in sorted(records.items())
+            },
+            "per_game": {
+                "tokens": sum(r["usage"]["input_tokens"] + r["usage"]["output_tokens"] for r in self.results) / games,
+                "calls": total_calls / games,
+                "duration": sum(r["duration"] for r in self.results) / games,
+                "model_latency": sum(r["usage"]["latency"] for r in self.results) / max(total_calls, 1),
+            },
+            "contestants": {c.name: c.usage.to_dict() for c in self.contestants},
+            "rate_limit_wait": limiter_wait,
+        }
+
+
+async def run_tournament(
+    models: List[str],
+    games: int,
+    player_count: int = 6,
+    rpm: Optional[int] = None,
+    tpm: Optional[int] = None,
+    max_concurrency: int = 8,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """以模型名称为参赛方运行锦标赛并打印报告"""
+    limiter = RateLimiter(rpm=rpm, tpm=tpm)
+    contestants = [Contestant(name, SharedModelClient(create_chat_model(name), limiter)) for name in models]
+    tournament = WerewolfTournament(contestants, player_count, max_concurrency, seed)
+    report = await tournament.run(games)
+
+    print(f"\n🏆 锦标赛结束：{report['games']} 局，总耗时 {report['wall_time']:.1f}s，限流等待 {report['rate_limit_wait']:.1f}s")
+    for key, stats in report["win_rates"].items():
+        print(f"  {key}: {stats['win_rate']:.1%}（{stats['seats']} 个座位）")
+    per_game = report["per_game"]
+    print(f"  每局平均：{per_game['calls']:.1f} 次调用，{per_game['tokens']:.0f} tokens，{per_game['duration']:.1f}s；"
+          f"单次调用平均延迟 {per_game['model_latency']:.2f}s")
+    if report["errors"]:
+        print(f"  ⚠️ 出错对局: {report['errors']}")
+    return report
+
+async def main(trace_path: Optional[str] = None):
     """主函数"""
     # 检查环境变量
     if "LLM_API_KEY" not in os.environ:
@@ -804,8 +2017,40 @@ async def main():
     
     # 创建并运行游戏
     game = ThreeKingdomsWerewolfGame()
-    await game.run_game()
+    result = await game.run_game()
+
+    print("\n🕵️ 发言分析（按怀疑度降序）：")
+    for name, scores in result.get("speech_analytics", {}).items():
+        print(f"  {name}（{game.roles.get(name, '未知')}）：怀疑度 {scores['suspicion']:.2f}，"
+              f"信心 {scores['confidence']:.2f}，发言 {scores['messages']} 条")
+
+    game.profiler.print_report()
+    if trace_path:
+        game.profiler.export_chrome_trace(trace_path)
+        print(f"📈 时间线已导出到 {trace_path}，可在 chrome://tracing 或 Perfetto 中打开")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="三国狼人杀")
+    parser.add_argument("--simulate", type=int, default=0, help="无头模拟的对局数（每种人数配置），0 表示运行 LLM 对局")
+    parser.add_argument("--players", type=int, nargs="+", default=[6, 8, 9], help="无头模拟的人数配置")
+    parser.add_argument("--workers", type=int, default=None, help="无头模拟的进程数")
+    parser.add_argument("--policy", choices=["scripted", "random"], default="scripted", help="脚本玩家策略")
+    parser.add_argument("--seed", type=int, default=0, help="无头模拟的随机种子")
+    parser.add_argument("--tournament", type=int, default=0, help="锦标赛对局数，在同一进程内并发运行 LLM 对局")
+    parser.add_argument("--models", nargs="+", default=None, help="锦标赛参赛模型，默认使用 LLM_MODEL_ID")
+    parser.add_argument("--rpm", type=int, default=None, help="锦标赛全局每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=None, help="锦标赛全局每分钟 token 数上限")
+    parser.add_argument("--concurrency", type=int, default=8, help="锦标赛同时进行的最大对局数")
+    parser.add_argument("--trace", default=None, help="LLM 对局结束后导出 Chrome Trace 时间线的路径")
+    args = parser.parse_args()
+
+    if args.simulate > 0:
+        run_monte_carlo(args.players, args.simulate, args.workers, args.policy, args.seed)
+    elif args.tournament > 0:
+        asyncio.run(run_tournament(
+            args.models or [os.getenv("LLM_MODEL_ID")], args.tournament, args.players[0],
+            args.rpm, args.tpm, args.concurrency, args.seed
+        ))
+    else:
+        asyncio.run(main(args.trace))
\ No newline at end of file
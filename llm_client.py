@@ -1,6 +1,14 @@
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from typing import List, Dict
+from typing import Any, List, Dict, Iterator, Optional
+
+# 离线 token 估算与 my-hello-agents 共用同一份实现
+# 插到最前面，并且 core / tools 都是带 __init__.py 的常规包，不会被其他同名包遮蔽
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "my-hello-agents"))
+from core.tokenizer import heuristic_count as estimate_tokens
+
 
 class HelloAgentsLLM:
     """
@@ -22,28 +30,82 @@ class HelloAgentsLLM:
         self.client = OpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout)
 
     
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0) ->str:
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0, verbose: bool = True,
+              response_format: Optional[Dict[str, Any]] = None) ->str:
         """
         调用大模型进行思考，并返回其响应。
+        verbose 为 False 时不打印流式输出，适合多个请求并发执行的场景。
+        response_format 用于开启 JSON 模式 / JSON Schema 约束，不传时不发送该参数。
         """
-        print(f"🧠 正在调用 {self.model} 模型...")
+        if verbose:
+            print(f"🧠 正在调用 {self.model} 模型...")
+        extra = {"response_format": response_format} if response_format else {}
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                stream=True
+                stream=True,
+                **extra
             )
             # 处理流式响应
-            print("✅ 大语言模型响应成功:")
+            if verbose:
+                print("✅ 大语言模型响应成功:")
             collected_content = []
             for chunk in response:
                 content = chunk.choices[0].delta.content or ""
-                print(content, end="", flush=True)
+                if verbose:
+                    print(content, end="", flush=True)
                 collected_content.append(content)
-            print() # 在流式输出结束后换行
+            if verbose:
+                print() # 在流式输出结束后换行
             return "".join(collected_content)
         
         except Exception as e:
             print(f"❌ 调用LLM API时发生错误: {e}")
             return None
+
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        """
+        调用大模型并逐块返回响应文本，调用方可以边接收边处理。
+        与 think 不同，调用失败时异常会直接抛出，由调用方决定如何处理。
+        """
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content or ""
+            if content:
+                yield content
+
+    def think_n(self, messages: List[Dict[str, str]], n: int, temperature: float = 0.8) -> List[str]:
+        """
+        一次生成 n 个候选回复（非流式）。
+        优先使用接口的 n 参数在一次请求中完成；服务不支持或返回数量不足时，用并发请求补足。
+        """
+        contents: List[str] = []
+        if n > 1:
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    n=n
+                )
+                contents = [c.message.content for c in response.choices if c.message.content][:n]
+            except Exception as e:
+                print(f"⚠️ 当前服务不支持 n 参数，改为并发请求: {e}")
+
+        missing = n - len(contents)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=missing) as pool:
+                extra = pool.map(lambda _: self.think(messages, temperature, verbose=False), range(missing))
+                contents.extend(c for c in extra if c)
+        print(f"✅ 已生成 {len(contents)} 个候选回复")
+        return contents
@@ -0,0 +1,76 @@
+"""
+会话存储基准测试：写入吞吐量与恢复延迟
+
+用法:
+    python my-hello-agents/benchmarks/session_benchmark.py --messages 20000 --turn-size 2
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.message import Message
+from core.session import create_session_store
+
+
+def build_turns(message_count: int, turn_size: int) -> list[list[Message]]:
+    """构造按轮分组的模拟对话"""
+    turns = []
+    for start in range(0, message_count, turn_size):
+        turn = []
+        for i in range(start, min(start + turn_size, message_count)):
+            role = "user" if i % 2 == 0 else "assistant"
+            turn.append(Message(f"第{i}条消息：" + "内容" * 40, role, metadata={"index": i}))
+        turns.append(turn)
+    return turns
+
+
+def bench_backend(backend: str, path: str, turns: list[list[Message]], message_count: int):
+    store = create_session_store(backend, path)
+    session_id = "bench"
+
+    start = time.perf_counter()
+    for turn in turns:
+        store.append(session_id, turn)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = store.load(session_id)
+    resume_ms = (time.perf_counter() - start) * 1000
+    assert len(loaded) == message_count, f"{backend} 恢复的消息数量不一致"
+
+    start = time.perf_counter()
+    store.compact(session_id)
+    compact_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    store.load(session_id)
+    resume_compacted_ms = (time.perf_counter() - start) * 1000
+    store.close()
+
+    print(f"[{backend}]")
+    print(f"  写入吞吐量: {message_count / write_seconds:,.0f} 条/秒 ({len(turns) / write_seconds:,.0f} 轮/秒)")
+    print(f"  恢复延迟: {resume_ms:.1f} ms")
+    print(f"  压缩耗时: {compact_ms:.1f} ms")
+    print(f"  压缩后恢复延迟: {resume_compacted_ms:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话存储基准测试")
+    parser.add_argument("--messages", type=int, default=20000, help="消息总数")
+    parser.add_argument("--turn-size", type=int, default=2, help="每轮消息数")
+    args = parser.parse_args()
+
+    turns = build_turns(args.messages, args.turn_size)
+    print(f"🚀 共 {args.messages} 条消息，{len(turns)} 轮\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_backend("jsonl", os.path.join(tmp_dir, "jsonl"), turns, args.messages)
+        bench_backend("sqlite", os.path.join(tmp_dir, "sessions.db"), turns, args.messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""核心模块 - Agent、LLM 客户端、记忆与会话存储"""
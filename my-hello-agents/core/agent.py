@@ -4,6 +4,8 @@ from typing import Any, Optional
 from .message import Message
 from .llm import HelloAgentsLLM
 from .config import Config
+from .session import SessionStore
+from .memory import LongTermMemory
 
 class Agent(ABC):
     """Agent 基类"""
@@ -13,7 +15,11 @@ class Agent(ABC):
             name: str,
             llm: HelloAgentsLLM,
             system_prompt: Optional[str] = None,
-            config: Optional[Config] = None
+            config: Optional[Config] = None,
+            session_store: Optional[SessionStore] = None,
+            session_id: Optional[str] = None,
+            long_term_memory: Optional[LongTermMemory] = None,
+            recall_k: int = 5
     ):
         self.name = name
         self.llm = llm
@@ -21,6 +27,20 @@ class Agent(ABC):
         self.config = config or Config()
         self._history: list[Message] = []
 
+        # 长期记忆：用户与助手消息连同其在历史中的位置先进入缓冲区，召回前批量嵌入写入索引
+        self.long_term_memory = long_term_memory
+        self.recall_k = recall_k
+        self._unindexed: list[tuple[int, Message]] = []
+        # 内存历史第一条消息在持久化会话中的位置：clear_history 保留会话时，新消息接在旧消息之后
+        self._seq_base = 0
+
+        # 会话持久化：新消息先进入待写缓冲区，每轮结束时批量写入存储
+        self.session_store = session_store
+        self.session_id = session_id or name
+        self._pending: list[Message] = []
+        if self.session_store is not None:
+            self.resume()
+
     @abstractmethod
     def run(self, input_text: str, **kwargs) -> str:
         """运行 Agent"""
@@ -29,10 +49,94 @@ class Agent(ABC):
     def add_message(self, message: Message):
         """添加消息到历史记录"""
         self._history.append(message)
+        if self.session_store is not None:
+            self._pending.append(message)
+        if self.long_term_memory is not None and message.role in ("user", "assistant"):
+            self._unindexed.append((self._seq_base + len(self._history) - 1, message))
+
+    def flush_memory(self):
+        """将尚未写入长期记忆的消息一次性嵌入并写入索引"""
+        if self.long_term_memory is None or not self._unindexed:
+            return
+        batch, self._unindexed = self._unindexed, []
+        self.long_term_memory.add_many(
+            [m.content for _, m in batch],
+            [{"role": m.role, "agent": self.name, "session": self.session_id, "seq": seq} for seq, m in batch]
+        )
+
+    def recall(self, query: str, k: Optional[int] = None) -> str:
+        """从长期记忆中召回与 query 相关的内容，格式化为提示词片段"""
+        if self.long_term_memory is None:
+            return ""
+        self.flush_memory()
+        return self.long_term_memory.format_context(query, k or self.recall_k)
+
+    def build_messages(self, input_text: str, recent_messages: int = 0) -> list[dict[str, str]]:
+        """
+        构造调用 LLM 的消息列表
+
+        挂载了长期记忆时，相关历史以 top-k 召回的形式并入系统消息，
+        只回放最近 recent_messages 条原始消息，而不是整个历史；
+        未挂载时回放完整历史。
+        """
+        messages: list[dict[str, str]] = []
+        if self.long_term_memory is not None:
+            system_parts = [self.system_prompt] if self.system_prompt else []
+            recalled = self.recall(input_text)
+            if recalled:
+                system_parts.append(recalled)
+            if system_parts:
+                messages.append({"role": "system", "content": "\n\n".join(system_parts)})
+            replay = self._history[-recent_messages:] if recent_messages > 0 else []
+        else:
+            if self.system_prompt:
+                messages.append({"role": "system", "content": self.system_prompt})
+            replay = self._history
+        messages.extend(m.to_dict() for m in replay)
+        messages.append({"role": "user", "content": input_text})
+        return messages
+
+    def commit_turn(self):
+        """将本轮新增的消息一次性追加到会话存储"""
+        if self.session_store is None or not self._pending:
+            return
+        self.session_store.append(self.session_id, self._pending)
+        self._pending = []
+
+    def resume(self):
+        """
+        从会话存储恢复历史记录
+
+        挂载了长期记忆时，恢复的历史中尚未写入长期记忆的消息（按会话与位置判断）会排入待索引缓冲区，
+        下一次召回时一并嵌入，恢复后的会话同样能召回早先的对话
+        """
+        if self.session_store is None:
+            return
+        self._history = self.session_store.load(self.session_id)
+        self._pending = []
+        self._seq_base = 0
+        if self.long_term_memory is not None:
+            indexed = self.long_term_memory.metadata_values("seq", agent=self.name, session=self.session_id)
+            self._unindexed = [
+                (seq, m) for seq, m in enumerate(self._history)
+                if m.role in ("user", "assistant") and seq not in indexed
+            ]
+
+    def clear_history(self, delete_session: bool = False):
+        """
+        清空内存中的历史记录
 
-    def clear_history(self):
-        """清空历史记录"""
+        Args:
+            delete_session: 为 True 时同时删除会话存储中持久化的历史；默认保留，下次 resume 仍可恢复
+        """
+        if delete_session and self.session_store is not None:
+            self.session_store.delete(self.session_id)
+            self._seq_base = 0
+        else:
+            self._seq_base += len(self._history) - len(self._pending)
         self._history.clear()
+        self._pending.clear()
+        self._unindexed.clear()
 
     def get_history(self) -> list[Message]:
         """获取历史记录"""
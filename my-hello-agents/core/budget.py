@@ -0,0 +1,132 @@
+"""上下文预算 - 在调用前让消息适配模型的上下文窗口"""
+from typing import Callable, Dict, List, Optional
+
+from .tokenizer import TokenCounter, get_context_window
+from .exception import ContextOverflowException
+
+# 未指定 max_tokens 时为模型回复预留的 token 数
+DEFAULT_RESERVED_OUTPUT_TOKENS = 1024
+
+
+class ContextBudgeter:
+    """
+    上下文窗口预算器
+
+    适配策略：
+    1. 系统消息与最后一条消息始终保留
+    2. 从最早的对话消息开始丢弃，直到提示词能放进窗口
+    3. 如果提供了 summarizer，被丢弃的消息会被压缩成一条摘要消息；摘要放不下时继续丢弃，
+       并对全部被丢弃的消息重新摘要，没有消息会不留痕迹地消失
+    4. 仍然放不下时在本地抛出 ContextOverflowException，不发起网络请求
+
+    上下文窗口未知（模型不在 MODEL_CONTEXT_WINDOWS 中且未显式指定）时不做任何裁剪
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        context_window: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+        summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+        reserved_output_tokens: int = DEFAULT_RESERVED_OUTPUT_TOKENS,
+    ):
+        """
+        Args:
+            model (Optional[str]): 模型名称，用于查询上下文窗口
+            context_window (Optional[int]): 显式指定上下文窗口，优先于模型默认值；两者都没有时不做预算
+            counter (Optional[TokenCounter]): token 计数器，默认按模型创建
+            summarizer (Optional[Callable]): 将被丢弃的消息压缩为摘要文本的函数
+            reserved_output_tokens (int): 未指定 max_tokens 时为回复预留的 token 数
+        """
+        self.model = model
+        self.context_window = context_window or get_context_window(model)
+        self.counter = counter or TokenCounter(model)
+        self.summarizer = summarizer
+        self.reserved_output_tokens = reserved_output_tokens
+
+    @property
+    def enabled(self) -> bool:
+        """是否已知上下文窗口"""
+        return self.context_window is not None
+
+    def prompt_budget(self, max_tokens: Optional[int] = None) -> Optional[int]:
+        """提示词可用的 token 数，窗口未知时为 None"""
+        if self.context_window is None:
+            return None
+        return self.context_window - (max_tokens or self.reserved_output_tokens)
+
+    def fit(self, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        返回能放进上下文窗口的消息列表（不修改原列表）
+
+        Raises:
+            ContextOverflowException: 必须保留的消息本身已超出预算
+        """
+        if not self.enabled:
+            return list(messages)
+        budget = self.prompt_budget(max_tokens)
+        if budget <= 0:
+            reserved = max_tokens or self.reserved_output_tokens
+            source = "max_tokens" if max_tokens else "默认预留的回复 token 数"
+            raise ContextOverflowException(
+                f"{source}={reserved} 已超过模型 {self.model} 的上下文窗口 {self.context_window}"
+            )
+
+        total = self.counter.count_messages(messages)
+        if total <= budget:
+            return list(messages)
+
+        # 必须保留：系统消息 + 最后一条消息；其余按时间顺序可丢弃
+        last_index = len(messages) - 1
+        pinned = {i for i, m in enumerate(messages) if m.get("role") == "system"}
+        pinned.add(last_index)
+        droppable = [i for i in range(len(messages)) if i not in pinned]
+
+        dropped: List[int] = []
+        summary_message: Optional[Dict[str, str]] = None
+        summary_tokens = 0
+        while True:
+            # 摘要也要占预算：为上一次生成的摘要预留空间后，继续丢弃最早的对话消息
+            for i in droppable[len(dropped):]:
+                if total + summary_tokens <= budget:
+                    break
+                total -= self.counter.count_message(messages[i])
+                dropped.append(i)
+            if not dropped or self.summarizer is None:
+                break
+            # 每次都对全部被丢弃的消息做摘要，后续追加丢弃的消息同样进入摘要
+            summary_message = self._summarize([messages[i] for i in dropped])
+            summary_tokens = self.counter.count_message(summary_message)
+            if total + summary_tokens <= budget or len(dropped) == len(droppable):
+                break
+
+        dropped_set = set(dropped)
+        kept = [m for i, m in enumerate(messages) if i not in dropped_set]
+        if summary_message is not None:
+            if total + summary_tokens <= budget:
+                insert_at = sum(1 for m in kept if m.get("role") == "system")
+                kept.insert(insert_at, summary_message)
+                total += summary_tokens
+            else:
+                print(f"⚠️ 摘要本身超出上下文预算，被裁剪的 {len(dropped)} 条历史消息未能保留摘要。")
+
+        if total > budget:
+            raise ContextOverflowException(
+                f"提示词约 {total} tokens，超出模型 {self.model} 的可用预算 {budget} tokens"
+                f"（上下文窗口 {self.context_window}），已在本地拒绝请求。"
+            )
+
+        if dropped:
+            print(f"✂️ 为适配上下文窗口，已裁剪 {len(dropped)} 条历史消息。")
+        return kept
+
+    def _summarize(self, dropped: List[Dict[str, str]]) -> Dict[str, str]:
+        summary = self.summarizer(dropped)
+        return {"role": "system", "content": f"以下是较早对话的摘要：\n{summary}"}
+
+    def clamp_max_tokens(self, messages: List[Dict[str, str]], max_tokens: Optional[int]) -> Optional[int]:
+        """将 max_tokens 限制在窗口剩余空间之内"""
+        if max_tokens is None or not self.enabled:
+            return max_tokens
+        remaining = self.context_window - self.counter.count_messages(messages)
+        return max(1, min(max_tokens, remaining))
@@ -0,0 +1,383 @@
+"""向量嵌入服务 - 微批处理、去重与磁盘向量缓存"""
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .exception import HelloAgentsException
+
+# 本地哈希编码器中的分词规则：英文单词/数字整体作为一个词，中日韩字符逐字作为一个词
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def content_hash(namespace: str, text: str) -> str:
+    """缓存键：同一文本在不同后端下的向量互不混用"""
+    return hashlib.sha256(f"{namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingBackend(ABC):
+    """
+    嵌入后端基类
+
+    约定：
+    - name 唯一标识后端与模型，作为缓存的命名空间
+    - embed_batch 一次编码一批文本，返回 (len(texts), dim) 的 float32 矩阵
+    """
+
+    name: str = "base"
+    dim: Optional[int] = None
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """编码一批文本"""
+        pass
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """调用兼容 OpenAI 接口的 /embeddings 端点"""
+
+    def __init__(self, client: Any, model: str, dim: Optional[int] = None):
+        """
+        Args:
+            client: OpenAI 客户端实例
+            model (str): 嵌入模型名称
+            dim (Optional[int]): 向量维度，未知时在第一次调用后确定
+        """
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}"
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        try:
+            response = self.client.embeddings.create(model=self.model, input=texts)
+        except Exception as e:
+            raise HelloAgentsException(f"嵌入接口调用失败: {str(e)}")
+        # 服务端不保证按输入顺序返回，按 index 还原
+        data = sorted(response.data, key=lambda item: item.index)
+        vectors = np.asarray([item.embedding for item in data], dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return vectors
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    本地 CPU 哈希编码器，离线可用
+
+    将词与字符 n-gram 通过 crc32 哈希到固定维度（带符号，减少碰撞偏差），
+    再做 L2 归一化。语义能力有限，但对字面相近的文本足够区分，适合离线测试与缓存预热。
+    """
+
+    def __init__(self, dim: int = 256, ngram_range: tuple[int, int] = (2, 3)):
+        """
+        Args:
+            dim (int): 向量维度
+            ngram_range (tuple[int, int]): 字符 n-gram 的长度范围
+        """
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"hashing:{dim}:{ngram_range[0]}-{ngram_range[1]}"
+
+    def _features(self, text: str) -> List[str]:
+        text = text.lower()
+        features = _TOKEN_PATTERN.findall(text)
+        compact = "".join(text.split())
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(compact[i:i + n] for i in range(len(compact) - n + 1))
+        return features
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 跨进程稳定（内置 hash 会随机化），磁盘缓存依赖这一点
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorCache:
+    """
+    基于内存映射的 float32 向量缓存
+
+    目录结构：
+    - meta.json: 维度信息
+    - vectors.f32: 行优先的 float32 矩阵，只追加
+    - keys.txt: 与矩阵行一一对应的内容哈希，每行一个
+
+    读取通过 np.memmap 完成，不把整个矩阵读进内存；
+    写入时先追加向量再追加键，崩溃后以两者中较短的一方为准。
+    """
+
+    META_NAME = "meta.json"
+    VECTORS_NAME = "vectors.f32"
+    KEYS_NAME = "keys.txt"
+
+    def __init__(self, cache_dir: str, dim: Optional[int] = None):
+        """
+        Args:
+            cache_dir (str): 缓存目录
+            dim (Optional[int]): 向量维度，未知时从 meta.json 读取或在第一次写入时确定
+        """
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._mapped: Optional[np.memmap] = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        meta_path = self._path(self.META_NAME)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            stored_dim = json.load(f)["dim"]
+        if self.dim is not None and self.dim != stored_dim:
+            raise HelloAgentsException(f"向量缓存维度不一致：缓存为 {stored_dim}，当前为 {self.dim}")
+        self.dim = stored_dim
+
+        keys_path = self._path(self.KEYS_NAME)
+        keys: List[str] = []
+        if os.path.exists(keys_path):
+            with open(keys_path, "r", encoding="utf-8") as f:
+                keys = [line.strip() for line in f if len(line.strip()) == 64]
+        vectors_path = self._path(self.VECTORS_NAME)
+        rows = os.path.getsize(vectors_path) // (self.dim * 4) if os.path.exists(vectors_path) else 0
+
+        # 崩溃后两个文件可能不等长，截断到共同长度，保证后续追加时行号与键对齐
+        rows = min(rows, len(keys))
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) != rows * self.dim * 4:
+            with open(vectors_path, "r+b") as f:
+                f.truncate(rows * self.dim * 4)
+        if len(keys) != rows:
+            keys = keys[:rows]
+            with open(keys_path, "w", encoding="utf-8") as f:
+                f.write("".join(key + "\n" for key in keys))
+        for row, key in enumerate(keys):
+            self._rows[key] = row
+
+    def _write_meta(self):
+        with open(self._path(self.META_NAME), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim}, f)
+
+    def _matrix(self) -> np.memmap:
+        """返回覆盖全部已写入行的内存映射，行数增长后重新映射"""
+        rows = len(self._rows)
+        if self._mapped is None or self._mapped.shape[0] < rows:
+            self._mapped = np.memmap(self._path(self.VECTORS_NAME), dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mapped
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """批量读取，只返回命中的键"""
+        with self._lock:
+            hits = [(key, self._rows[key]) for key in keys if key in self._rows]
+            if not hits:
+                return {}
+            matrix = self._matrix()
+            return {key: np.array(matrix[row]) for key, row in hits}
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        """批量追加，已存在的键会被跳过"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_meta()
+            elif not os.path.exists(self._path(self.META_NAME)):
+                self._write_meta()
+            if vectors.shape[1] != self.dim:
+                raise HelloAgentsException(f"向量维度 {vectors.shape[1]} 与缓存维度 {self.dim} 不一致")
+
+            new_rows = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not new_rows:
+                return
+            fresh_keys = list(dict.fromkeys(keys[i] for i in new_rows))
+            first_index = {key: i for i, key in reversed(list(enumerate(keys)))}
+            block = np.ascontiguousarray(vectors[[first_index[key] for key in fresh_keys]])
+
+            with open(self._path(self.VECTORS_NAME), "ab") as f:
+                f.write(block.tobytes())
+            with open(self._path(self.KEYS_NAME), "a", encoding="utf-8") as f:
+                f.write("".join(key + "\n" for key in fresh_keys))
+
+            start = len(self._rows)
+            for offset, key in enumerate(fresh_keys):
+                self._rows[key] = start + offset
+
+
+class EmbeddingService:
+    """
+    向量嵌入服务
+
+    - 输入去重：同一批内重复的文本只编码一次
+    - 缓存：按内容哈希命中缓存的文本不再请求后端；进程内缓存按 LRU 淘汰，
+      最多保留 memory_cache_size 条，更多的向量由磁盘缓存（内存映射）承担
+    - 微批处理：多个线程并发提交的文本由后台线程合并成批，
+      每批最多 batch_size 条，未满时最多等待 max_wait_ms 毫秒
+    - 正在编码的文本被再次请求时复用同一个 Future，不重复发送
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache_dir: Optional[str] = None,
+        batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        memory_cache_size: int = 4096,
+    ):
+        """
+        Args:
+            backend (EmbeddingBackend): 嵌入后端
+            cache_dir (Optional[str]): 磁盘缓存根目录，None 表示只使用进程内缓存
+            batch_size (int): 每次请求后端的最大文本数
+            max_wait_ms (float): 批次未满时等待更多请求的最长时间
+            memory_cache_size (int): 进程内向量缓存的最大条目数，0 表示不使用进程内缓存
+        """
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache: Optional[VectorCache] = None
+        if cache_dir:
+            namespace_dir = re.sub(r"[^\w.-]+", "_", backend.name)
+            self.cache = VectorCache(os.path.join(cache_dir, namespace_dir), backend.dim)
+        self.memory_cache_size = memory_cache_size
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+
+        self._cond = threading.Condition()
+        self._queue: List[tuple[str, str]] = []
+        self._inflight: Dict[str, Future] = {}
+        self._worker: Optional[threading.Thread] = None
+
+        self.stats: Dict[str, int] = {"requested": 0, "cache_hits": 0, "encoded": 0, "backend_calls": 0}
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.backend.dim
+
+    def embed(self, texts: Union[str, Sequence[str]]) -> np.ndarray:
+        """
+        编码文本，返回 (len(texts), dim) 的 float32 矩阵；传入单个字符串时返回一维向量
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        keys = [content_hash(self.backend.name, t) for t in texts]
+        unique = dict(zip(keys, texts))
+        self.stats["requested"] += len(texts)
+
+        vectors: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._memory_lock:
+            for key in unique:
+                cached = self._memory.get(key)
+                if cached is not None:
+                    self._memory.move_to_end(key)
+                    vectors[key] = cached
+                else:
+                    missing.append(key)
+        if missing and self.cache is not None:
+            vectors.update(self.cache.get_many(missing))
+            missing = [key for key in missing if key not in vectors]
+        self.stats["cache_hits"] += len(unique) - len(missing)
+
+        if missing:
+            futures = self._submit([(key, unique[key]) for key in missing])
+            for key, future in futures.items():
+                vectors[key] = future.result()
+
+        self._remember(vectors)
+        result = np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+        return result[0] if single else result
+
+    def _remember(self, vectors: Dict[str, np.ndarray]):
+        """写入进程内缓存，超出容量时淘汰最久未使用的向量"""
+        if self.memory_cache_size <= 0:
+            return
+        with self._memory_lock:
+            for key, vector in vectors.items():
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_cache_size:
+                self._memory.popitem(last=False)
+
+    def _submit(self, items: List[tuple[str, str]]) -> Dict[str, Future]:
+        """将待编码文本放入队列，返回每个键对应的 Future"""
+        futures: Dict[str, Future] = {}
+        with self._cond:
+            for key, text in items:
+                future = self._inflight.get(key)
+                if future is None:
+                    future = Future()
+                    self._inflight[key] = future
+                    self._queue.append((key, text))
+                futures[key] = future
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return futures
+
+    def _run_worker(self):
+        """后台批处理循环：凑满一批或等待超时后统一请求后端"""
+        while True:
+            with self._cond:
+                if not self._queue:
+                    # 空闲一段时间后退出，下次提交时再启动
+                    self._cond.wait(timeout=1.0)
+                    if not self._queue:
+                        self._worker = None
+                        return
+                if len(self._queue) < self.batch_size:
+                    self._cond.wait(timeout=self.max_wait)
+                batch = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[tuple[str, str]]):
+        keys = [key for key, _ in batch]
+        try:
+            matrix = self.backend.embed_batch([text for _, text in batch])
+            if self.cache is not None:
+                self.cache.put_many(keys, matrix)
+        except Exception as e:
+            with self._cond:
+                for key in keys:
+                    self._inflight.pop(key).set_exception(e)
+            return
+
+        self.stats["backend_calls"] += 1
+        self.stats["encoded"] += len(batch)
+        self._remember({key: matrix[row] for row, key in enumerate(keys)})
+        with self._cond:
+            for row, key in enumerate(keys):
+                self._inflight.pop(key).set_result(matrix[row])
+
+    def similarity(self, a: Union[str, np.ndarray], b: Union[str, np.ndarray]) -> float:
+        """两个文本（或向量）的余弦相似度"""
+        va = self.embed(a) if isinstance(a, str) else a
+        vb = self.embed(b) if isinstance(b, str) else b
+        denom = float(np.linalg.norm(va) * np.linalg.norm(vb))
+        return float(np.dot(va, vb)) / denom if denom else 0.0
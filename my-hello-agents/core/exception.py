@@ -8,6 +8,10 @@ class LLMException(HelloAgentsException):
     """与 LLM 相关的异常"""
     pass
 
+class ContextOverflowException(LLMException):
+    """提示词超出模型上下文窗口"""
+    pass
+
 class AgentException(HelloAgentsException):
     """与 Agent 相关的异常"""
     pass
@@ -1,10 +1,14 @@
 """HelloAgents 统一 LLM 接口 - 基于 OpenAI 原生 API"""
 
 import os
-from typing import Optional, Literal, Iterator
+from typing import Callable, Optional, Literal, Iterator, Sequence, Union
 from openai import OpenAI
+import numpy as np
 
 from .exception import HelloAgentsException
+from .budget import ContextBudgeter
+from .embedding import EmbeddingService, OpenAIEmbeddingBackend
+from .semantic_cache import SemanticCache
 
 # 支持的 LLM 提供商
 SUPPORTED_PROVIDERS = Literal[
@@ -43,6 +47,11 @@ class HelloAgentsLLM:
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         timeout: Optional[int] = None,
+        context_window: Optional[int] = None,
+        summarizer: Optional[Callable[[list[dict[str, str]]], str]] = None,
+        embedding_model: Optional[str] = None,
+        embedding_service: Optional[EmbeddingService] = None,
+        semantic_cache: Optional[SemanticCache] = None,
         **kwargs
     ):
         """
@@ -57,6 +66,11 @@ class HelloAgentsLLM:
             temperature (float): 生成文本的随机性，默认 0.7
             max_tokens (Optional[int]): 最大生成长度，默认不限
             timeout (Optional[int]): 请求超时时间，单位秒，默认不限
+            context_window (Optional[int]): 模型上下文窗口大小，默认按模型名称推断；未知模型不做本地预算
+            summarizer (Optional[Callable]): 超出窗口时用于压缩早期历史的摘要函数，默认直接裁剪
+            embedding_model (Optional[str]): 嵌入模型名称，默认从环境变量 LLM_EMBEDDING_MODEL_ID 加载
+            embedding_service (Optional[EmbeddingService]): 自定义嵌入服务（例如离线的哈希编码器），优先于 embedding_model
+            semantic_cache (Optional[SemanticCache]): invoke 前的语义缓存，默认不启用
             **kwargs: 其他额外参数
         """
         # 优先使用传入参数，如果未提供，则从环境变量加载
@@ -84,9 +98,17 @@ class HelloAgentsLLM:
         if not all([self.api_key, self.base_url]):
             raise HelloAgentsException(f" API 密钥和服务地址必须被提供或在 .env 文件中定义。")
         
+        # 上下文预算：调用前在本地计数并裁剪，超限直接报错而不是等服务端拒绝
+        self.budgeter = ContextBudgeter(self.model, context_window, summarizer=summarizer)
+
         # 创建 OpenAI 客户端
         self._client = self._create_client()
 
+        # 嵌入服务在第一次调用 embed 时才创建
+        self.embedding_model = embedding_model or os.getenv("LLM_EMBEDDING_MODEL_ID") or "text-embedding-3-small"
+        self.embedding_service = embedding_service
+        self.semantic_cache = semantic_cache
+
     def _auto_detect_provider(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         """
         自动检测LLM提供商
@@ -248,7 +270,34 @@ class HelloAgentsLLM:
             elif "localhost" in base_url_lower or "127.0.0.1" in base_url_lower: return "local-model"
             else: return "gpt-3.5-turbo"
 
-        
+    def count_tokens(self, messages: list[dict[str, str]]) -> int:
+        """离线计算消息列表的 token 数"""
+        return self.budgeter.counter.count_messages(messages)
+
+    def embed(self, texts: Union[str, Sequence[str]]) -> np.ndarray:
+        """
+        计算文本向量。请求会被微批处理与去重，结果按内容哈希缓存，
+        设置环境变量 EMBEDDING_CACHE_DIR 后缓存会持久化到磁盘
+
+        Returns:
+            np.ndarray: 单个字符串返回一维向量，列表返回 (len(texts), dim) 矩阵
+        """
+        if self.embedding_service is None:
+            self.embedding_service = EmbeddingService(
+                OpenAIEmbeddingBackend(self._client, self.embedding_model),
+                cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+            )
+        return self.embedding_service.embed(texts)
+
+    def _prepare_messages(
+        self, messages: list[dict[str, str]], max_tokens: Optional[int]
+    ) -> tuple[list[dict[str, str]], Optional[int]]:
+        """让消息适配上下文窗口，并将 max_tokens 限制在剩余空间内；窗口未知时原样返回"""
+        if not self.budgeter.enabled:
+            return messages, max_tokens
+        fitted = self.budgeter.fit(messages, max_tokens)
+        return fitted, self.budgeter.clamp_max_tokens(fitted, max_tokens)
+
     def think(self, messages: list[dict[str, str]], temperature: Optional[float] = None) -> Iterator[str]:
         """
         调用大模型进行思考，并返回流式响应。
@@ -261,13 +310,15 @@ class HelloAgentsLLM:
         Yields:
             str: 流式响应的文本片段
         """
+        messages, max_tokens = self._prepare_messages(messages, self.max_tokens)
+
         print(f"🧠 正在调用 {self.model} 模型...")
         try:
-            reponse = self._client.completions.create(
+            reponse = self._client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature if temperature is not None else self.temperature,
-                max_tokens=self.max_tokens,
+                max_tokens=max_tokens,
                 stream=True
             )
 
@@ -284,22 +335,50 @@ class HelloAgentsLLM:
             raise HelloAgentsException(f"LLM调用失败: {str(e)}")
         
 
-    def invoke(self, messages: list[dict[str, str]], **kwargs) -> str:
+    def invoke(
+        self,
+        messages: list[dict[str, str]],
+        cache_namespace: str = "default",
+        use_cache: bool = True,
+        **kwargs
+    ) -> str:
         """
         非流式调用 LLM，返回完整响应。
         适用于不需要流式输出的场景。
+
+        启用语义缓存时，先按最后一条用户消息与系统提示词指纹查找相似问题的回答，
+        命中则直接返回；cache_namespace 用于隔离不同业务的缓存，use_cache=False 跳过缓存。
+        temperature 与 max_tokens 计入缓存分区，不同取值互不命中；
+        传入其他参数（tools、response_format 等）时回复的形式可能不同，不读写缓存
         """
+        temperature = kwargs.get('temperature', self.temperature)
+        requested_max_tokens = kwargs.get('max_tokens', self.max_tokens)
+        cacheable = use_cache and not set(kwargs) - {'temperature', 'max_tokens'}
+        cache = self.semantic_cache if cacheable else None
+        cache_model = f"{self.model}|temperature={temperature}|max_tokens={requested_max_tokens}"
+        if cache is not None:
+            cached = cache.lookup(messages, namespace=cache_namespace, model=cache_model)
+            if cached is not None:
+                return cached
+        original_messages = messages
+
+        messages, max_tokens = self._prepare_messages(messages, requested_max_tokens)
+
         try:
-            response = self._client.completions.create(
+            response = self._client.chat.completions.create(
                 model=self.model,
                 messages=messages,
-                temperature=kwargs.get('temperature', self.temperature),
-                max_tokens=kwargs.get('max_tokens', self.max_tokens),
+                temperature=temperature,
+                max_tokens=max_tokens,
                 **{k: v for k, v in kwargs.items() if k not in ['temperature', 'max_tokens']}
             )
-            return response.choice[0].message.content
+            content = response.choices[0].message.content
         except Exception as e:
             raise HelloAgentsException(f"LLM调用失败: {str(e)}")
+
+        if cache is not None:
+            cache.store(original_messages, content, namespace=cache_namespace, model=cache_model)
+        return content
     
     def stream_invoke(self, messages: list[dict[str, str]], **kwargs) -> Iterator[str]:
         """
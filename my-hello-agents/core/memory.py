@@ -0,0 +1,170 @@
+"""长期记忆 - 基于向量索引的语义召回"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .vector_index import IVFIndex, VectorIndex
+
+# 嵌入函数：输入一组文本，返回 (len(texts), dim) 矩阵，例如 HelloAgentsLLM.embed 或 EmbeddingService.embed
+EmbedFunction = Callable[[List[str]], np.ndarray]
+
+
+class LongTermMemory:
+    """
+    可挂载到任意 Agent 的长期记忆
+
+    - 记忆文本经嵌入后写入向量索引，支持增量插入与删除
+    - 默认使用 IVFIndex：数据量小时为精确暴力检索，超过阈值后自动切换为倒排近似检索
+    - snapshot 将索引（npz）与记忆文本（json）保存到目录，load 时直接恢复而无需重新嵌入；
+      索引文件缺失时按记忆文本重新嵌入并重建索引
+    - format_context 将 top-k 召回结果格式化为可放进提示词的文本
+    """
+
+    INDEX_NAME = "index.npz"
+    RECORDS_NAME = "records.json"
+
+    def __init__(
+        self,
+        embed: EmbedFunction,
+        index: Optional[VectorIndex] = None,
+        path: Optional[str] = None,
+        min_score: float = 0.1,
+        ivf_threshold: int = 2048,
+    ):
+        """
+        Args:
+            embed (EmbedFunction): 嵌入函数
+            index (Optional[VectorIndex]): 自定义向量索引，默认在第一次写入时按向量维度创建 IVFIndex
+            path (Optional[str]): 快照目录，存在时自动加载
+            min_score (float): 召回的最低相似度，合适的取值与嵌入后端有关
+            ivf_threshold (int): 默认索引开始训练倒排中心的数据量
+        """
+        self.embed = embed
+        self.index = index
+        self.path = path
+        self.min_score = min_score
+        self.ivf_threshold = ivf_threshold
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(os.path.join(path, self.RECORDS_NAME)):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _ensure_index(self, dim: int):
+        if self.index is None:
+            self.index = IVFIndex(dim, train_threshold=self.ivf_threshold)
+
+    def add(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """写入一条记忆，返回记忆 id"""
+        return self.add_many([text], [metadata])[0]
+
+    def add_many(self, texts: Sequence[str], metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None) -> List[int]:
+        """批量写入记忆，只调用一次嵌入函数"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(texts)
+        vectors = np.atleast_2d(self.embed(texts))
+
+        with self._lock:
+            self._ensure_index(vectors.shape[1])
+            ids = list(range(self._next_id, self._next_id + len(texts)))
+            self._next_id += len(texts)
+            now = datetime.now().isoformat()
+            for item_id, text, metadata in zip(ids, texts, metadatas):
+                self._records[item_id] = {"text": text, "metadata": metadata or {}, "timestamp": now}
+            self.index.add(ids, vectors)
+        return ids
+
+    def remove(self, ids: Sequence[int]):
+        """删除记忆"""
+        with self._lock:
+            for item_id in ids:
+                self._records.pop(int(item_id), None)
+            if self.index is not None:
+                self.index.remove(ids)
+
+    def metadata_values(self, key: str, **filters: Any) -> set:
+        """返回满足 filters 的记忆中 metadata[key] 的全部取值，用于判断哪些内容已经写入过"""
+        with self._lock:
+            return {
+                record["metadata"].get(key) for record in self._records.values()
+                if all(record["metadata"].get(k) == v for k, v in filters.items())
+            }
+
+    def search(self, query: str, k: int = 5, min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """召回与查询最相关的 k 条记忆"""
+        if not self._records or self.index is None or k <= 0:
+            return []
+        threshold = self.min_score if min_score is None else min_score
+        vector = np.atleast_2d(self.embed([query]))[0]
+        with self._lock:
+            hits = self.index.search(vector, k)
+            return [
+                {"id": item_id, "score": score, **self._records[item_id]}
+                for item_id, score in hits
+                if score >= threshold and item_id in self._records
+            ]
+
+    def format_context(self, query: str, k: int = 5) -> str:
+        """将召回结果格式化为提示词片段，没有相关记忆时返回空字符串"""
+        hits = self.search(query, k)
+        if not hits:
+            return ""
+        # 按写入时间排序，保留对话的先后关系
+        hits.sort(key=lambda hit: hit["id"])
+        lines = []
+        for hit in hits:
+            role = hit["metadata"].get("role")
+            prefix = f"[{role}] " if role else ""
+            lines.append(f"- {prefix}{hit['text']}")
+        return "以下是与当前问题相关的历史记忆：\n" + "\n".join(lines)
+
+    def snapshot(self, path: Optional[str] = None):
+        """将索引与记忆文本保存到目录"""
+        path = path or self.path
+        if not path:
+            raise ValueError("未指定长期记忆的快照目录")
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            if self.index is not None:
+                self.index.save(os.path.join(path, self.INDEX_NAME))
+            records_path = os.path.join(path, self.RECORDS_NAME)
+            tmp_path = records_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"next_id": self._next_id, "records": {str(k): v for k, v in self._records.items()}},
+                    f, ensure_ascii=False, default=str
+                )
+            os.replace(tmp_path, records_path)
+
+    def load(self, path: str):
+        """从快照目录恢复"""
+        with open(os.path.join(path, self.RECORDS_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index_path = os.path.join(path, self.INDEX_NAME)
+        with self._lock:
+            self._next_id = data["next_id"]
+            self._records = {int(k): v for k, v in data["records"].items()}
+            if os.path.exists(index_path):
+                self.index = VectorIndex.load(index_path)
+        if not os.path.exists(index_path) and self._records:
+            self._rebuild_index()
+        print(f"🗂️ 已从 {path} 恢复 {len(self._records)} 条长期记忆。")
+
+    def _rebuild_index(self):
+        """索引文件缺失（例如快照写到一半中断）时，按记忆文本重新嵌入并重建索引"""
+        print(f"⚠️ 长期记忆的索引文件缺失，正在重新嵌入 {len(self._records)} 条记忆...")
+        ids = sorted(self._records)
+        vectors = np.atleast_2d(self.embed([self._records[i]["text"] for i in ids]))
+        with self._lock:
+            self.index = None
+            self._ensure_index(vectors.shape[1])
+            self.index.add(ids, vectors)
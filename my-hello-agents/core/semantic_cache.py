@@ -0,0 +1,228 @@
+"""语义缓存 - 按语义相似度复用 LLM 回答"""
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from .vector_index import FlatIndex
+from .memory import EmbedFunction
+
+# 抽查函数：(当前问题, 缓存中的问题, 缓存的回答) -> 缓存回答是否仍然适用
+AuditFunction = Callable[[str, str, str], bool]
+
+
+def system_fingerprint(messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+    """系统提示词与模型的指纹，不同指纹的缓存互不共享"""
+    system_text = "\x00".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    return hashlib.sha256(f"{model or ''}\x01{system_text}".encode("utf-8")).hexdigest()[:16]
+
+
+def final_user_message(messages: List[Dict[str, str]]) -> Optional[str]:
+    """取最后一条用户消息作为缓存的查询文本"""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return None
+
+
+class SemanticCache:
+    """
+    LLM 语义缓存
+
+    - 查询文本为最后一条用户消息，分区键为 命名空间 + 系统提示词指纹，
+      不同分区各自维护一个向量索引，互不命中
+    - 分区内取最近邻，相似度不低于 threshold 即视为命中
+    - 条目超过 ttl_seconds 后在查询时惰性淘汰；总数超过 max_entries 时按最近最少使用淘汰
+    - 命中时按 audit_rate 抽查：提供 audit_fn 时立即判定，判定为误命中的条目会被删除；
+      同时保留最近命中记录，供离线人工审计后通过 report_false_hit 回报
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFunction,
+        threshold: float = 0.92,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 10000,
+        audit_rate: float = 0.0,
+        audit_fn: Optional[AuditFunction] = None,
+        recent_hits_size: int = 200,
+    ):
+        """
+        Args:
+            embed (EmbedFunction): 嵌入函数，例如 HelloAgentsLLM.embed
+            threshold (float): 命中所需的最低余弦相似度
+            ttl_seconds (Optional[float]): 条目有效期，None 表示不过期
+            max_entries (int): 缓存条目上限
+            audit_rate (float): 命中后进行抽查的比例
+            audit_fn (Optional[AuditFunction]): 抽查函数
+            recent_hits_size (int): 保留的最近命中记录数量
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.audit_rate = audit_rate
+        self.audit_fn = audit_fn
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, FlatIndex] = {}
+        # id -> 条目；顺序即 LRU 顺序，最近使用的在末尾
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self.recent_hits: Deque[Dict[str, Any]] = deque(maxlen=recent_hits_size)
+
+        self.metrics: Dict[str, int] = {
+            "lookups": 0, "hits": 0, "misses": 0, "stores": 0,
+            "expired": 0, "evicted": 0, "audited": 0, "false_hits": 0,
+        }
+
+    @staticmethod
+    def _partition(namespace: str, fingerprint: str) -> str:
+        return f"{namespace}:{fingerprint}"
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            index = self._indexes.get(entry["partition"])
+            if index is not None:
+                index.remove([entry_id])
+                if len(index) == 0:
+                    del self._indexes[entry["partition"]]
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds
+
+    def lookup(
+        self,
+        messages: List[Dict[str, str]],
+        namespace: str = "default",
+        model: Optional[str] = None,
+    ) -> Optional[str]:
+        """查找可复用的回答，未命中返回 None"""
+        query = final_user_message(messages)
+        if query is None:
+            return None
+        partition = self._partition(namespace, system_fingerprint(messages, model))
+        with self._lock:
+            self.metrics["lookups"] += 1
+            if partition not in self._indexes:
+                self.metrics["misses"] += 1
+                return None
+
+        vector = np.atleast_2d(self.embed([query]))[0]
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get(partition)
+            hits = index.search(vector, 1) if index is not None else []
+            if not hits or hits[0][1] < self.threshold:
+                self.metrics["misses"] += 1
+                return None
+            entry_id, score = hits[0]
+            entry = self._entries[entry_id]
+            if self._expired(entry, now):
+                self._remove(entry_id)
+                self.metrics["expired"] += 1
+                self.metrics["misses"] += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            entry["hits"] += 1
+            self.metrics["hits"] += 1
+            self.recent_hits.append({
+                "id": entry_id, "namespace": namespace, "query": query,
+                "cached_query": entry["query"], "score": score, "time": now,
+            })
+            cached_query, response = entry["query"], entry["response"]
+
+        if self.audit_fn is not None and random.random() < self.audit_rate:
+            with self._lock:
+                self.metrics["audited"] += 1
+            if not self.audit_fn(query, cached_query, response):
+                self.report_false_hit(entry_id)
+                return None
+        return response
+
+    def store(
+        self,
+        messages: List[Dict[str, str]],
+        response: str,
+        namespace: str = "default",
+        model: Optional[str] = None,
+    ):
+        """缓存一次调用的回答"""
+        query = final_user_message(messages)
+        if query is None or not response:
+            return
+        partition = self._partition(namespace, system_fingerprint(messages, model))
+        vector = np.atleast_2d(self.embed([query]))
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            index = self._indexes.get(partition)
+            if index is None:
+                index = self._indexes[partition] = FlatIndex(vector.shape[1])
+            index.add([entry_id], vector)
+            self._entries[entry_id] = {
+                "partition": partition, "query": query, "response": response,
+                "created": time.time(), "hits": 0,
+            }
+            self.metrics["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.metrics["evicted"] += 1
+
+    def report_false_hit(self, entry_id: int):
+        """回报一次误命中：计入指标并删除对应条目"""
+        with self._lock:
+            self.metrics["false_hits"] += 1
+            self._remove(entry_id)
+
+    def purge_expired(self) -> int:
+        """主动清理所有过期条目，返回清理数量"""
+        if self.ttl_seconds is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            expired = [i for i, entry in self._entries.items() if self._expired(entry, now)]
+            for entry_id in expired:
+                self._remove(entry_id)
+            self.metrics["expired"] += len(expired)
+        return len(expired)
+
+    def clear(self, namespace: Optional[str] = None):
+        """清空缓存，指定 namespace 时只清空该命名空间"""
+        with self._lock:
+            targets = [
+                i for i, entry in self._entries.items()
+                if namespace is None or entry["partition"].startswith(f"{namespace}:")
+            ]
+            for entry_id in targets:
+                self._remove(entry_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.metrics["lookups"]
+        return self.metrics["hits"] / lookups if lookups else 0.0
+
+    @property
+    def false_hit_rate(self) -> float:
+        """抽查中误命中的比例（包含离线回报的误命中）"""
+        audited = max(self.metrics["audited"], self.metrics["false_hits"])
+        return self.metrics["false_hits"] / audited if audited else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "hit_rate": self.hit_rate,
+            "false_hit_rate": self.false_hit_rate,
+        }
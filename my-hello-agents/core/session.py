@@ -0,0 +1,405 @@
+"""会话存储 - Agent 历史记录的持久化与快速恢复"""
+import os
+import re
+import json
+import mmap
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from .message import Message
+from .exception import HelloAgentsException
+
+
+def message_to_record(message: Message) -> Dict[str, Any]:
+    """将 Message 转换为可 JSON 序列化的记录"""
+    return {
+        "role": message.role,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+        "metadata": message.metadata or {},
+    }
+
+
+_MESSAGE_FIELDS = {"content", "role", "timestamp", "metadata"}
+
+
+def record_to_message(record: Dict[str, Any]) -> Message:
+    """
+    将存储记录还原为 Message
+
+    记录由本模块写入，内容可信，因此使用 model_construct 跳过逐条校验，
+    恢复数万条消息时这是主要的耗时来源。
+    """
+    timestamp = record.get("timestamp")
+    return Message.model_construct(
+        _fields_set=_MESSAGE_FIELDS,
+        content=record["content"],
+        role=record["role"],
+        timestamp=datetime.fromisoformat(timestamp) if timestamp else datetime.now(),
+        metadata=record.get("metadata") or {},
+    )
+
+
+class SessionStore(ABC):
+    """
+    会话存储基类
+
+    约定：
+    - append 以"轮"为单位批量追加消息，只追加不修改
+    - load 返回按写入顺序排列的完整历史
+    - compact 将增量日志合并为快照，加快下一次恢复
+    """
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Message]):
+        """批量追加一轮产生的消息"""
+        pass
+
+    @abstractmethod
+    def load(self, session_id: str) -> List[Message]:
+        """加载会话的全部消息"""
+        pass
+
+    @abstractmethod
+    def compact(self, session_id: str):
+        """压缩会话存储"""
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """删除会话"""
+        pass
+
+    @abstractmethod
+    def list_sessions(self) -> List[str]:
+        """列出所有会话 ID"""
+        pass
+
+    def close(self):
+        """释放存储占用的资源"""
+        pass
+
+
+class JSONLSessionStore(SessionStore):
+    """
+    基于 JSONL 分段文件的会话存储
+
+    目录结构（每个会话一个目录）：
+    - snapshot.json: 压缩后的快照 {"covered_segment": N, "records": [...]}，
+      covered_segment 为快照已包含的最大段编号
+    - segment-000001.jsonl ...: 快照之后追加的消息，每行一条记录
+
+    设计要点：
+    - 每轮只做一次 write 调用，写入整批消息
+    - 段文件超过 segment_max_bytes 后滚动到新段
+    - 段数量达到 compact_after_segments 时自动压缩为快照
+    - 加载时使用 mmap 映射文件，整段拼成一个 JSON 数组后一次性解析
+
+    崩溃恢复：
+    - 追加前若最后一段以写了一半的行结尾，先截断到最后一个换行符，新的一轮不会接在残行之后
+    - 压缩先原子替换快照、再删除旧段；两步之间崩溃时，编号不超过 covered_segment 的段在加载时跳过，
+      下一次追加时清理，不会重复恢复消息
+    """
+
+    SNAPSHOT_NAME = "snapshot.json"
+    SEGMENT_PREFIX = "segment-"
+    SEGMENT_SUFFIX = ".jsonl"
+    _COVERED_PATTERN = re.compile(rb'^\{"covered_segment":\s*(\d+)')
+
+    def __init__(
+        self,
+        root_dir: str,
+        segment_max_bytes: int = 4 * 1024 * 1024,
+        compact_after_segments: int = 8,
+        fsync: bool = False,
+    ):
+        """
+        Args:
+            root_dir (str): 会话文件的根目录
+            segment_max_bytes (int): 单个段文件的最大字节数
+            compact_after_segments (int): 段数量达到该值时自动压缩，0 表示不自动压缩
+            fsync (bool): 每轮写入后是否调用 fsync，保证断电不丢数据
+        """
+        self.root_dir = root_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_after_segments = compact_after_segments
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _session_dir(self, session_id: str) -> str:
+        if not session_id or os.sep in session_id or session_id in (".", ".."):
+            raise HelloAgentsException(f"非法的会话 ID: {session_id!r}")
+        return os.path.join(self.root_dir, session_id)
+
+    def _segment_paths(self, session_dir: str) -> List[str]:
+        """按编号顺序返回所有段文件路径"""
+        if not os.path.isdir(session_dir):
+            return []
+        names = sorted(
+            name for name in os.listdir(session_dir)
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+        )
+        return [os.path.join(session_dir, name) for name in names]
+
+    def _segment_path(self, session_dir: str, index: int) -> str:
+        return os.path.join(session_dir, f"{self.SEGMENT_PREFIX}{index:06d}{self.SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def _segment_index(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(JSONLSessionStore.SEGMENT_PREFIX):-len(JSONLSessionStore.SEGMENT_SUFFIX)])
+
+    def _covered_segment(self, session_dir: str) -> int:
+        """
+        快照已包含的最大段编号，没有快照时为 0
+
+        每次都从磁盘读取快照开头：其他实例或进程可能已经压缩过该会话
+        """
+        snapshot_path = os.path.join(session_dir, self.SNAPSHOT_NAME)
+        if not os.path.exists(snapshot_path):
+            return 0
+        with open(snapshot_path, "rb") as f:
+            match = self._COVERED_PATTERN.match(f.read(64))
+        return int(match.group(1)) if match else 0
+
+    @staticmethod
+    def _truncate_torn_tail(path: str):
+        """段文件若以不完整的行结尾（写入时进程崩溃），截断到最后一个换行符"""
+        with open(path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            keep = f.read().rfind(b"\n") + 1
+            f.truncate(keep)
+        print(f"⚠️ 会话文件 {path} 末尾存在未写完的记录，已截断。")
+
+    def append(self, session_id: str, messages: List[Message]):
+        """以一次写入追加一整轮消息"""
+        if not messages:
+            return
+        session_dir = self._session_dir(session_id)
+        payload = "".join(
+            json.dumps(message_to_record(m), ensure_ascii=False, default=str) + "\n"
+            for m in messages
+        ).encode("utf-8")
+
+        with self._lock:
+            os.makedirs(session_dir, exist_ok=True)
+            covered = self._covered_segment(session_dir)
+            segments = self._segment_paths(session_dir)
+            # 上一次压缩在删除旧段之前中断：这些段已包含在快照中，直接清理
+            while segments and self._segment_index(segments[0]) <= covered:
+                os.remove(segments.pop(0))
+            if segments:
+                self._truncate_torn_tail(segments[-1])
+            if segments and os.path.getsize(segments[-1]) + len(payload) <= self.segment_max_bytes:
+                path = segments[-1]
+            else:
+                next_index = self._segment_index(segments[-1]) + 1 if segments else covered + 1
+                path = self._segment_path(session_dir, next_index)
+                segments.append(path)
+
+            with open(path, "ab") as f:
+                f.write(payload)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            need_compact = self.compact_after_segments and len(segments) >= self.compact_after_segments
+
+        if need_compact:
+            self.compact(session_id)
+
+    @staticmethod
+    def _read_mapped(path: str) -> bytes:
+        """通过 mmap 读取整个文件，空文件返回空字节串"""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[:]
+
+    def _load_records(self, session_dir: str) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (全部记录, 快照已包含的最大段编号)"""
+        records: List[Dict[str, Any]] = []
+
+        covered = 0
+        snapshot_path = os.path.join(session_dir, self.SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            data = self._read_mapped(snapshot_path)
+            if data:
+                snapshot = json.loads(data)
+                covered = snapshot["covered_segment"]
+                records.extend(snapshot["records"])
+
+        for path in self._segment_paths(session_dir):
+            if self._segment_index(path) <= covered:
+                continue
+            data = self._read_mapped(path).rstrip(b"\n")
+            if not data:
+                continue
+            # 每行都是不含换行符的 JSON 对象，拼成数组后一次解析
+            try:
+                records.extend(json.loads(b"[" + data.replace(b"\n", b",") + b"]"))
+            except json.JSONDecodeError:
+                # 最后一行可能因进程崩溃而写了一半，逐行解析并丢弃损坏的行
+                for line in data.split(b"\n"):
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(f"⚠️ 会话文件 {path} 中存在损坏的记录，已跳过。")
+        return records, covered
+
+    def load(self, session_id: str) -> List[Message]:
+        """加载快照与所有段文件，恢复完整历史"""
+        session_dir = self._session_dir(session_id)
+        with self._lock:
+            records, _ = self._load_records(session_dir)
+        return [record_to_message(r) for r in records]
+
+    def compact(self, session_id: str):
+        """将快照与所有段文件合并为新的快照，并删除已合并的段"""
+        session_dir = self._session_dir(session_id)
+        with self._lock:
+            segments = self._segment_paths(session_dir)
+            if not segments:
+                return
+            records, covered = self._load_records(session_dir)
+            covered = max(covered, self._segment_index(segments[-1]))
+
+            snapshot_path = os.path.join(session_dir, self.SNAPSHOT_NAME)
+            tmp_path = snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                # covered_segment 必须是第一个键，追加时只读取快照开头即可得到
+                json.dump({"covered_segment": covered, "records": records}, f, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            # 原子替换，保证任意时刻快照都是完整的；之后即使删除旧段前崩溃，加载时也会跳过已包含的段
+            os.replace(tmp_path, snapshot_path)
+
+            for path in segments:
+                os.remove(path)
+
+    def delete(self, session_id: str):
+        """删除会话目录下的全部文件"""
+        session_dir = self._session_dir(session_id)
+        with self._lock:
+            if not os.path.isdir(session_dir):
+                return
+            for name in os.listdir(session_dir):
+                os.remove(os.path.join(session_dir, name))
+            os.rmdir(session_dir)
+
+    def list_sessions(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root_dir)
+            if os.path.isdir(os.path.join(self.root_dir, name))
+        )
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    基于 SQLite WAL 模式的会话存储
+
+    每轮消息在一个事务内通过 executemany 批量插入；
+    WAL 模式下读写互不阻塞，适合多个进程共享同一个会话库。
+    """
+
+    def __init__(self, db_path: str, synchronous: str = "NORMAL"):
+        """
+        Args:
+            db_path (str): 数据库文件路径
+            synchronous (str): SQLite 的 synchronous 级别，NORMAL 在 WAL 下兼顾性能与安全
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID
+            """
+        )
+
+    def append(self, session_id: str, messages: List[Message]):
+        if not messages:
+            return
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                row = cur.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()
+                start = row[0] + 1
+                cur.executemany(
+                    "INSERT INTO messages (session_id, seq, payload) VALUES (?, ?, ?)",
+                    [
+                        (session_id, start + i, json.dumps(message_to_record(m), ensure_ascii=False, default=str))
+                        for i, m in enumerate(messages)
+                    ]
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def load(self, session_id: str) -> List[Message]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+        if not rows:
+            return []
+        # 与 JSONL 存储一致，拼成一个数组后一次性解析
+        records = json.loads("[" + ",".join(r[0] for r in rows) + "]")
+        return [record_to_message(r) for r in records]
+
+    def compact(self, session_id: str):
+        """WAL 模式下将日志检查点写回主库并截断 WAL 文件"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def list_sessions(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT session_id FROM messages ORDER BY session_id").fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(backend: str, path: str, **kwargs) -> SessionStore:
+    """
+    根据名称创建会话存储
+
+    Args:
+        backend (str): "jsonl" 或 "sqlite"
+        path (str): JSONL 存储的目录，或 SQLite 数据库文件路径
+    """
+    if backend == "jsonl":
+        return JSONLSessionStore(path, **kwargs)
+    elif backend == "sqlite":
+        return SQLiteSessionStore(path, **kwargs)
+    raise HelloAgentsException(f"不支持的会话存储类型: {backend}")
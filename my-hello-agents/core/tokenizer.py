@@ -0,0 +1,153 @@
+"""Token 计数 - 离线估算提示词长度"""
+import re
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# 各模型家族的上下文窗口大小（按前缀匹配，越具体的前缀越靠前）
+MODEL_CONTEXT_WINDOWS: List[tuple[str, int]] = [
+    ("gpt-4o", 128000),
+    ("gpt-4.1", 1047576),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("deepseek", 65536),
+    ("qwen-long", 1000000),
+    ("qwen", 131072),
+    ("Qwen/", 32768),
+    ("moonshot-v1-8k", 8192),
+    ("moonshot-v1-32k", 32768),
+    ("moonshot-v1-128k", 131072),
+    ("glm-4", 128000),
+    ("llama3", 131072),
+    ("meta-llama/Llama-2", 4096),
+]
+
+# 可以用 tiktoken 精确计数的模型前缀及对应编码
+TIKTOKEN_ENCODINGS: List[tuple[str, str]] = [
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5-turbo", "cl100k_base"),
+]
+
+# OpenAI chat 格式中每条消息的固定开销，以及回复引导的开销
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# 中日韩字符大致一个字符对应一个 token，其余文本约 4 个字符对应一个 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af\uff00-\uffef]")
+
+
+def get_context_window(model: Optional[str]) -> Optional[int]:
+    """根据模型名称获取上下文窗口大小，不在表中的模型返回 None（不猜测窗口大小）"""
+    if model:
+        for prefix, window in MODEL_CONTEXT_WINDOWS:
+            if model.startswith(prefix):
+                return window
+    return None
+
+
+def heuristic_count(text: str) -> int:
+    """快速估算 token 数：中日韩字符按 1 个计，其余按 4 个字符 1 个计"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def tiktoken_encoding_name(model: Optional[str]) -> Optional[str]:
+    """返回可以精确计数的模型对应的 tiktoken 编码名称，未知模型返回 None"""
+    if not model:
+        return None
+    return next((enc for prefix, enc in TIKTOKEN_ENCODINGS if model.startswith(prefix)), None)
+
+
+@lru_cache(maxsize=None)
+def _load_tiktoken_encoding(encoding_name: str):
+    """
+    加载 tiktoken 编码，每个进程每种编码只尝试一次。
+    tiktoken 首次使用某种编码时需要下载 BPE 文件：未安装、离线或下载失败时返回 None
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"⚠️ 无法加载 tiktoken 编码 {encoding_name}，将使用估算计数: {e}")
+        return None
+
+
+class TokenCounter:
+    """
+    Token 计数器
+
+    - 对已知模型家族（OpenAI 系列）使用 tiktoken 精确 BPE 计数；编码在第一次计数时才加载，
+      加载失败（如离线无法下载编码文件）时退回字符估算
+    - 其他模型使用快速的字符估算
+    - 按消息内容缓存计数结果，历史消息在多轮调用中只计算一次
+    """
+
+    def __init__(self, model: Optional[str] = None, cache_size: int = 4096):
+        """
+        Args:
+            model (Optional[str]): 模型名称，用于选择分词方式
+            cache_size (int): 计数缓存的最大条目数
+        """
+        self.model = model
+        self.cache_size = cache_size
+        self.encoding_name = tiktoken_encoding_name(model)
+        self._encoding = None
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def exact(self) -> bool:
+        """是否使用 tiktoken 精确计数（会触发编码加载）"""
+        if self.encoding_name is not None and self._encoding is None:
+            self._encoding = _load_tiktoken_encoding(self.encoding_name)
+            if self._encoding is None:
+                # 加载失败后不再尝试
+                self.encoding_name = None
+        return self._encoding is not None
+
+    def count_text(self, text: str) -> int:
+        """计算一段文本的 token 数"""
+        if not text:
+            return 0
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+                return cached
+
+        count = len(self._encoding.encode(text, disallowed_special=())) if self.exact else heuristic_count(text)
+
+        with self._lock:
+            self.cache_misses += 1
+            self._cache[text] = count
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return count
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        """计算单条消息的 token 数（含格式开销）"""
+        return (
+            TOKENS_PER_MESSAGE
+            + self.count_text(message.get("content") or "")
+            + self.count_text(message.get("role") or "")
+            + (self.count_text(message["name"]) if message.get("name") else 0)
+        )
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """计算整个消息列表的 token 数（含回复引导开销）"""
+        return sum(self.count_message(m) for m in messages) + TOKENS_PER_REPLY
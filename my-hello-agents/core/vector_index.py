@@ -0,0 +1,317 @@
+"""向量索引 - 精确暴力检索与倒排（IVF）近似检索"""
+import os
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .exception import HelloAgentsException
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行做 L2 归一化，之后内积即余弦相似度"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的 k 个下标（降序），用 argpartition 避免全量排序"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class VectorIndex(ABC):
+    """
+    向量索引基类
+
+    约定：
+    - 向量在写入时归一化，检索得分为余弦相似度
+    - id 由调用方分配，为非负整数
+    - 支持增量插入与删除，save/load 以 npz 文件持久化
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @abstractmethod
+    def add(self, ids: Sequence[int], vectors: np.ndarray):
+        """批量插入（已存在的 id 会被覆盖）"""
+        pass
+
+    @abstractmethod
+    def remove(self, ids: Sequence[int]):
+        """批量删除，不存在的 id 会被忽略"""
+        pass
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """返回 [(id, score), ...]，按得分降序"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def state(self) -> Dict[str, np.ndarray]:
+        """导出可保存到 npz 的数组"""
+        pass
+
+    def save(self, path: str):
+        """原子地保存为 npz 文件"""
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, kind=np.array(type(self).__name__), dim=np.array(self.dim), **self.state())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "VectorIndex":
+        """根据文件中记录的类型还原索引"""
+        with np.load(path, allow_pickle=False) as data:
+            kind = str(data["kind"])
+            if kind == "FlatIndex":
+                return FlatIndex.from_state(data)
+            elif kind == "IVFIndex":
+                return IVFIndex.from_state(data)
+        raise HelloAgentsException(f"未知的向量索引类型: {kind}")
+
+
+class FlatIndex(VectorIndex):
+    """
+    暴力检索索引：一次矩阵乘法算出全部得分，结果精确
+
+    向量存放在按容量翻倍扩展的连续矩阵中；删除时把最后一行搬到空位，
+    矩阵始终保持紧凑，检索时不需要跳过空洞。
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 256):
+        super().__init__(dim)
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._positions
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def _reserve(self, size: int):
+        capacity = len(self._ids)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._vectors, self._ids = vectors, ids
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray, normalized: bool = False):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32)) if normalized else normalize_rows(vectors)
+        if vectors.shape[1] != self.dim:
+            raise HelloAgentsException(f"向量维度 {vectors.shape[1]} 与索引维度 {self.dim} 不一致")
+        self._reserve(self._size + len(ids))
+        for item_id, vector in zip(ids, vectors):
+            item_id = int(item_id)
+            position = self._positions.get(item_id)
+            if position is None:
+                position = self._size
+                self._size += 1
+                self._positions[item_id] = position
+                self._ids[position] = item_id
+            self._vectors[position] = vector
+
+    def remove(self, ids: Sequence[int]):
+        for item_id in ids:
+            position = self._positions.pop(int(item_id), None)
+            if position is None:
+                continue
+            last = self._size - 1
+            if position != last:
+                moved_id = int(self._ids[last])
+                self._vectors[position] = self._vectors[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._size -= 1
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if self._size == 0 or k <= 0:
+            return []
+        scores = self.vectors @ normalize_rows(query)[0]
+        best = top_k(scores, k)
+        return [(int(self._ids[i]), float(scores[i])) for i in best]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"ids": self.ids.copy(), "vectors": self.vectors.copy()}
+
+    @classmethod
+    def from_state(cls, data) -> "FlatIndex":
+        index = cls(int(data["dim"]), initial_capacity=max(256, len(data["ids"])))
+        index.add(data["ids"], data["vectors"], normalized=True)
+        return index
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """在归一化向量上做球面 k-means，返回归一化的聚类中心"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # 空簇重新随机取一个点，避免中心退化
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """
+    倒排文件（IVF）近似索引
+
+    - 数据量小于 train_threshold 时只有一个倒排表，等价于暴力检索
+    - 达到阈值后用 k-means 训练 nlist 个中心，每个向量归入最近中心的倒排表
+    - 检索只扫描与查询最接近的 nprobe 个倒排表
+    - 数据量相对上次训练增长 retrain_factor 倍后自动重新训练，保持各表均衡
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_threshold: int = 2048,
+        retrain_factor: float = 4.0,
+    ):
+        """
+        Args:
+            dim (int): 向量维度
+            nlist (Optional[int]): 倒排表数量，默认取 sqrt(数据量)
+            nprobe (int): 检索时扫描的倒排表数量，越大越精确
+            train_threshold (int): 开始训练聚类中心的数据量
+            retrain_factor (float): 数据量增长到上次训练时的多少倍后重新训练
+        """
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_factor = retrain_factor
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[FlatIndex] = [FlatIndex(dim)]
+        self._owner: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._owner)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray, normalized: bool = False):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32)) if normalized else normalize_rows(vectors)
+        ids = [int(i) for i in ids]
+        # 覆盖写入时先从原来的倒排表中移除
+        self.remove([i for i in ids if i in self._owner])
+
+        if self.trained:
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        else:
+            assignment = np.zeros(len(ids), dtype=np.int64)
+        for list_no in np.unique(assignment):
+            mask = assignment == list_no
+            member_ids = [item_id for item_id, m in zip(ids, mask) if m]
+            self._lists[list_no].add(member_ids, vectors[mask], normalized=True)
+            for item_id in member_ids:
+                self._owner[item_id] = int(list_no)
+
+        size = len(self._owner)
+        if (not self.trained and size >= self.train_threshold) or (
+            self.trained and size >= self._trained_size * self.retrain_factor
+        ):
+            self.train()
+
+    def remove(self, ids: Sequence[int]):
+        for item_id in ids:
+            list_no = self._owner.pop(int(item_id), None)
+            if list_no is not None:
+                self._lists[list_no].remove([item_id])
+
+    def train(self):
+        """用当前全部向量训练聚类中心并重新分配倒排表"""
+        ids = np.concatenate([lst.ids for lst in self._lists])
+        vectors = np.concatenate([lst.vectors for lst in self._lists])
+        nlist = self.nlist or max(1, int(np.sqrt(len(ids))))
+        nlist = min(nlist, len(ids))
+        if nlist <= 1:
+            return
+        print(f"🧭 正在为 {len(ids)} 条向量训练 {nlist} 个倒排中心...")
+        self.centroids = kmeans(vectors, nlist)
+        self._trained_size = len(ids)
+        self._lists = [FlatIndex(self.dim) for _ in range(nlist)]
+        self._owner = {}
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_no in range(nlist):
+            mask = assignment == list_no
+            if mask.any():
+                self._lists[list_no].add(ids[mask], vectors[mask], normalized=True)
+                for item_id in ids[mask]:
+                    self._owner[int(item_id)] = list_no
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._owner or k <= 0:
+            return []
+        query = normalize_rows(query)[0]
+        if self.trained:
+            probes = top_k(self.centroids @ query, min(self.nprobe, len(self._lists)))
+        else:
+            probes = [0]
+        results: List[Tuple[int, float]] = []
+        for list_no in probes:
+            results.extend(self._lists[list_no].search(query, k))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        ids = np.concatenate([lst.ids for lst in self._lists])
+        vectors = np.concatenate([lst.vectors for lst in self._lists])
+        config = {
+            "nlist": self.nlist, "nprobe": self.nprobe, "train_threshold": self.train_threshold,
+            "retrain_factor": self.retrain_factor, "trained_size": self._trained_size,
+        }
+        state = {"ids": ids, "vectors": vectors, "config": np.array(json.dumps(config))}
+        if self.trained:
+            state["centroids"] = self.centroids
+        return state
+
+    @classmethod
+    def from_state(cls, data) -> "IVFIndex":
+        config = json.loads(str(data["config"]))
+        index = cls(
+            int(data["dim"]), nlist=config["nlist"], nprobe=config["nprobe"],
+            train_threshold=config["train_threshold"], retrain_factor=config["retrain_factor"],
+        )
+        if "centroids" in data.files:
+            # 直接恢复训练结果，不重新聚类
+            index.centroids = data["centroids"]
+            index._trained_size = config["trained_size"]
+            index._lists = [FlatIndex(index.dim) for _ in range(len(index.centroids))]
+        index.add(data["ids"], data["vectors"], normalized=True)
+        return index
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与 benchmarks 相同：把 my-hello-agents 目录加入导入路径，以 core.xxx / tools.xxx 导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,60 @@
+import numpy as np
+
+from core.embedding import EmbeddingService, HashingEmbeddingBackend, VectorCache
+
+
+class CountingBackend(HashingEmbeddingBackend):
+    def __init__(self):
+        super().__init__(dim=32)
+        self.encoded = []
+
+    def embed_batch(self, texts):
+        self.encoded.extend(texts)
+        return super().embed_batch(texts)
+
+
+def test_vector_cache_reopen(tmp_path):
+    cache = VectorCache(str(tmp_path), dim=4)
+    vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+    cache.put_many(["a" * 64, "b" * 64], vectors)
+    cache.put_many(["a" * 64], vectors[1:])  # 已存在的键跳过
+
+    reopened = VectorCache(str(tmp_path))
+    assert reopened.dim == 4 and len(reopened) == 2
+    hits = reopened.get_many(["a" * 64, "c" * 64])
+    assert list(hits) == ["a" * 64]
+    np.testing.assert_array_equal(hits["a" * 64], vectors[0])
+
+
+def test_vector_cache_recovers_from_torn_write(tmp_path):
+    cache = VectorCache(str(tmp_path), dim=4)
+    cache.put_many(["a" * 64], np.ones((1, 4), dtype=np.float32))
+    # 模拟崩溃：向量写了一半，键没有写入
+    with open(tmp_path / VectorCache.VECTORS_NAME, "ab") as f:
+        f.write(b"\x00" * 6)
+
+    reopened = VectorCache(str(tmp_path))
+    assert len(reopened) == 1
+    reopened.put_many(["b" * 64], np.full((1, 4), 2, dtype=np.float32))
+    np.testing.assert_array_equal(VectorCache(str(tmp_path)).get_many(["b" * 64])["b" * 64], np.full(4, 2))
+
+
+def test_memory_cache_is_bounded(tmp_path):
+    backend = CountingBackend()
+    service = EmbeddingService(backend, max_wait_ms=0, memory_cache_size=2)
+    service.embed(["一", "二", "三"])
+    assert len(service._memory) == 2
+
+    # 最早的文本已被淘汰，需要重新编码；最近的文本命中进程内缓存
+    service.embed(["三"])
+    service.embed(["一"])
+    assert backend.encoded == ["一", "二", "三", "一"]
+
+
+def test_disk_cache_serves_evicted_vectors(tmp_path):
+    backend = CountingBackend()
+    service = EmbeddingService(backend, cache_dir=str(tmp_path), max_wait_ms=0, memory_cache_size=1)
+    first = service.embed(["甲", "乙"])
+    again = service.embed(["甲", "乙"])
+    np.testing.assert_allclose(first, again)
+    assert backend.encoded == ["甲", "乙"]
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from core.embedding import HashingEmbeddingBackend
+from core.llm import HelloAgentsLLM
+from core.semantic_cache import SemanticCache
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=f"回答{len(self.calls)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_llm(cache):
+    llm = HelloAgentsLLM(model="local-model", api_key="k", base_url="http://localhost:8000/v1",
+                         provider="custom", semantic_cache=cache)
+    completions = FakeCompletions()
+    llm._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm, completions
+
+
+def test_invoke_miss_then_hit():
+    backend = HashingEmbeddingBackend()
+    cache = SemanticCache(embed=lambda texts: backend.embed_batch(list(texts)), threshold=0.99)
+    llm, completions = make_llm(cache)
+    messages = [{"role": "system", "content": "你是助手"}, {"role": "user", "content": "北京的天气怎么样？"}]
+
+    assert llm.invoke(messages) == "回答1"
+    assert len(cache) == 1
+    assert completions.calls[0]["messages"] == messages
+
+    # 相同问题命中缓存，不再调用接口
+    assert llm.invoke(messages) == "回答1"
+    assert len(completions.calls) == 1
+    assert cache.metrics["hits"] == 1
+
+    # 跳过缓存时照常调用
+    assert llm.invoke(messages, use_cache=False) == "回答2"
+
+
+def test_invoke_cache_respects_call_settings():
+    backend = HashingEmbeddingBackend()
+    cache = SemanticCache(embed=lambda texts: backend.embed_batch(list(texts)), threshold=0.99)
+    llm, completions = make_llm(cache)
+    messages = [{"role": "user", "content": "写一首关于秋天的诗"}]
+
+    assert llm.invoke(messages) == "回答1"
+    # 不同的温度或最大长度不命中默认设置下的缓存
+    assert llm.invoke(messages, temperature=0.0) == "回答2"
+    assert llm.invoke(messages, max_tokens=16) == "回答3"
+    assert llm.invoke(messages, temperature=0.0) == "回答2"
+
+    # tools / response_format 等参数既不读也不写缓存
+    assert llm.invoke(messages, response_format={"type": "json_object"}) == "回答4"
+    assert completions.calls[-1]["response_format"] == {"type": "json_object"}
+    assert llm.invoke(messages, tools=[]) == "回答5"
+    assert len(cache) == 3
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+
+from tools.local_search import LocalSearchIndex, LocalSearchTool, decode_varints, encode_varints, iter_chunks
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_varint_roundtrip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 21, 2 ** 40], dtype=np.int64)
+    np.testing.assert_array_equal(decode_varints(encode_varints(values)), values)
+
+
+def test_iter_chunks_overlap():
+    chunks = list(iter_chunks(["一二三四五六七八九十" * 3], chunk_size=10, overlap=4))
+    assert all(len(c) <= 10 for c in chunks)
+    assert chunks[1].startswith(chunks[0][-4:])
+
+
+def test_index_replace_delete_and_compact(tmp_path):
+    index = LocalSearchIndex(str(tmp_path), max_segments=2)
+    index.add_document("a.md", ["向量数据库的索引结构"])
+    index.add_document("b.md", ["倒排索引与 BM25 排序"])
+    index.flush()
+    assert index.search("BM25")[0]["doc_id"] == "b.md"
+
+    # 替换与删除：旧段中的块被屏蔽
+    index.add_document("b.md", ["关于缓存淘汰策略"])
+    index.flush()
+    index.delete_document("a.md")
+    assert index.search("BM25") == []
+    assert index.search("向量") == []
+    assert index.search("缓存")[0]["doc_id"] == "b.md"
+
+    index.compact()
+    assert len(index.manifest["segments"]) == 1 and index.chunk_count == 1
+    index.close()
+
+    reopened = LocalSearchIndex(str(tmp_path))
+    assert reopened.search("缓存")[0]["text"] == "关于缓存淘汰策略"
+    reopened.close()
+
+
+def test_tool_incremental_ingest(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    write(docs / "intro.md", "HelloAgents 是一个轻量的智能体框架。")
+    write(docs / "tools.md", "工具注册表负责管理所有工具。")
+    write(docs / "image.png", "不会被导入")
+
+    tool = LocalSearchTool(str(tmp_path / "index"), str(docs))
+    assert tool.index.doc_count == 2
+    assert "tools.md" in tool.run({"query": "工具注册表"})
+
+    os.remove(docs / "intro.md")
+    counts = tool.ingest(str(docs))
+    assert counts == {"added": 0, "updated": 0, "deleted": 1, "skipped": 1}
+    assert "没有找到" in tool.run({"query": "智能体框架"})
+    assert tool.run({}).startswith("错误")
@@ -0,0 +1,66 @@
+import os
+from types import SimpleNamespace
+
+from core.agent import Agent
+from core.embedding import HashingEmbeddingBackend
+from core.memory import LongTermMemory
+from core.message import Message
+from core.session import JSONLSessionStore
+
+
+class EchoAgent(Agent):
+    def run(self, input_text: str, **kwargs) -> str:
+        return input_text
+
+
+def make_memory(path=None):
+    backend = HashingEmbeddingBackend()
+    return LongTermMemory(embed=lambda texts: backend.embed_batch(list(texts)), path=path, min_score=0.0)
+
+
+def make_agent(store, memory):
+    llm = SimpleNamespace(provider="custom")
+    return EchoAgent("助手", llm, session_store=store, long_term_memory=memory)
+
+
+def test_load_rebuilds_missing_index(tmp_path):
+    memory = make_memory()
+    memory.add_many(["我喜欢吃川菜", "明天要去上海出差"])
+    memory.snapshot(str(tmp_path))
+    os.remove(tmp_path / LongTermMemory.INDEX_NAME)
+
+    restored = make_memory(str(tmp_path))
+    hits = restored.search("上海出差", k=1)
+    assert hits[0]["text"] == "明天要去上海出差"
+
+
+def test_resume_indexes_restored_history(tmp_path):
+    store = JSONLSessionStore(str(tmp_path / "sessions"))
+    agent = make_agent(store, make_memory())
+    agent.add_message(Message("我的猫叫团子", "user"))
+    agent.add_message(Message("记住了，你的猫叫团子", "assistant"))
+    agent.commit_turn()
+
+    # 新进程：长期记忆为空，恢复的历史应被写入长期记忆
+    memory = make_memory()
+    resumed = make_agent(store, memory)
+    assert "团子" in resumed.recall("我的猫叫什么")
+    assert len(memory) == 2
+
+    # 已写入长期记忆的消息再次恢复时不会重复写入
+    make_agent(store, memory).flush_memory()
+    assert len(memory) == 2
+
+
+def test_clear_history_keeps_session_unless_asked(tmp_path):
+    store = JSONLSessionStore(str(tmp_path / "sessions"))
+    agent = make_agent(store, None)
+    agent.add_message(Message("你好", "user"))
+    agent.commit_turn()
+
+    agent.clear_history()
+    assert agent.get_history() == []
+    assert len(store.load(agent.session_id)) == 1
+
+    agent.clear_history(delete_session=True)
+    assert store.load(agent.session_id) == []
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from core.message import Message
+from core.session import JSONLSessionStore, SQLiteSessionStore
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+def segment_files(store, session_id):
+    return store._segment_paths(store._session_dir(session_id))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JSONLSessionStore(str(tmp_path), compact_after_segments=0)
+
+
+def test_append_and_load_in_order(store):
+    store.append("s", [Message("one", "user"), Message("two", "assistant")])
+    store.append("s", [Message("three", "user")])
+    loaded = store.load("s")
+    assert contents(loaded) == ["one", "two", "three"]
+    assert [m.role for m in loaded] == ["user", "assistant", "user"]
+
+
+def test_torn_tail_does_not_swallow_next_turn(store):
+    store.append("s", [Message("one", "user")])
+    # 模拟写入 "two" 时进程崩溃：只写了半行
+    path = segment_files(store, "s")[-1]
+    with open(path, "ab") as f:
+        f.write(b'{"role": "user", "content": "tw')
+    assert contents(JSONLSessionStore(store.root_dir).load("s")) == ["one"]
+
+    resumed = JSONLSessionStore(store.root_dir, compact_after_segments=0)
+    resumed.append("s", [Message("three", "user")])
+    assert contents(resumed.load("s")) == ["one", "three"]
+    with open(path, "rb") as f:
+        assert all(json.loads(line) for line in f.read().splitlines())
+
+
+def test_compact_then_append(store):
+    for i in range(3):
+        store.append("s", [Message(f"m{i}", "user")])
+    store.compact("s")
+    assert segment_files(store, "s") == []
+    store.append("s", [Message("m3", "user")])
+    assert contents(JSONLSessionStore(store.root_dir).load("s")) == ["m0", "m1", "m2", "m3"]
+
+
+def test_crash_between_snapshot_and_segment_removal(store, monkeypatch):
+    store.append("s", [Message("a", "user")])
+    store.append("s", [Message("b", "user")])
+    # 快照已替换，但删除旧段之前崩溃
+    monkeypatch.setattr(os, "remove", lambda path: None)
+    store.compact("s")
+    monkeypatch.undo()
+    assert segment_files(store, "s")
+
+    resumed = JSONLSessionStore(store.root_dir, compact_after_segments=0)
+    assert contents(resumed.load("s")) == ["a", "b"]
+    resumed.append("s", [Message("c", "user")])
+    assert contents(JSONLSessionStore(store.root_dir).load("s")) == ["a", "b", "c"]
+
+
+def test_compact_by_another_instance(store):
+    store.append("s", [Message("m1", "user")])
+    store.append("s", [Message("m2", "user")])
+    # 另一个实例（或进程）压缩了会话，原实例继续追加
+    JSONLSessionStore(store.root_dir, compact_after_segments=0).compact("s")
+    store.append("s", [Message("m3", "user")])
+    assert contents(JSONLSessionStore(store.root_dir).load("s")) == ["m1", "m2", "m3"]
+
+
+def test_auto_compact_rolls_segments(tmp_path):
+    store = JSONLSessionStore(str(tmp_path), segment_max_bytes=1, compact_after_segments=3)
+    for i in range(7):
+        store.append("s", [Message(f"m{i}", "user")])
+    assert contents(JSONLSessionStore(str(tmp_path)).load("s")) == [f"m{i}" for i in range(7)]
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store.append("s", [Message("one", "user")])
+    store.append("s", [Message("two", "assistant")])
+    assert contents(store.load("s")) == ["one", "two"]
+    assert store.list_sessions() == ["s"]
+    store.delete("s")
+    assert store.load("s") == []
+    store.close()
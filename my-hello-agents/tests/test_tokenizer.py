@@ -0,0 +1,93 @@
+import sys
+import types
+
+import pytest
+
+from core.budget import ContextBudgeter
+from core.exception import ContextOverflowException
+from core.tokenizer import TokenCounter, _load_tiktoken_encoding, heuristic_count
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    """模拟离线环境：tiktoken 已安装，但下载编码文件失败"""
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        raise OSError("Failed to resolve 'openaipublic.blob.core.windows.net'")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    _load_tiktoken_encoding.cache_clear()
+    yield calls
+    _load_tiktoken_encoding.cache_clear()
+
+
+def test_counter_does_not_load_encoding_on_construction(offline_tiktoken):
+    TokenCounter("gpt-4o")
+    assert offline_tiktoken == []
+
+
+def test_offline_falls_back_to_heuristic(offline_tiktoken):
+    counter = TokenCounter("gpt-4o")
+    text = "hello world，你好世界"
+    assert counter.count_text(text) == heuristic_count(text)
+    assert not counter.exact
+    # 失败只尝试一次
+    TokenCounter("gpt-4o").count_text("again")
+    assert offline_tiktoken == ["o200k_base"]
+
+
+def test_overflow_reports_reserved_output_tokens():
+    budgeter = ContextBudgeter("local-model", context_window=500)
+    with pytest.raises(ContextOverflowException, match="1024"):
+        budgeter.fit([{"role": "user", "content": "hi"}])
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "你是助手"}]
+    for i in range(turns):
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i} " + "x" * 40})
+    return messages
+
+
+def budgeter_for(messages, keep, **kwargs):
+    """构造一个窗口恰好能放下 系统消息 + 最后 keep 条消息 的预算器"""
+    counter = TokenCounter("local-model")
+    window = counter.count_messages(messages[:1] + messages[-keep:])
+    return ContextBudgeter("local-model", context_window=window, counter=counter, reserved_output_tokens=0, **kwargs)
+
+
+def test_unknown_model_is_not_budgeted():
+    budgeter = ContextBudgeter("claude-sonnet-4")
+    assert budgeter.context_window is None
+    messages = conversation(2000)
+    assert budgeter.fit(messages) == messages
+    assert budgeter.clamp_max_tokens(messages, 4096) == 4096
+
+
+def test_fit_trims_oldest_history():
+    messages = conversation(6)
+    fitted = budgeter_for(messages, keep=2).fit(messages)
+    assert fitted == messages[:1] + messages[-2:]
+
+
+def test_fit_summarizes_every_dropped_message():
+    messages = conversation(6)
+    seen = []
+
+    def summarizer(dropped):
+        seen.append([m["content"][:2] for m in dropped])
+        return "yyyy"
+
+    fitted = budgeter_for(messages, keep=3, summarizer=summarizer).fit(messages)
+    # 第一次的摘要放不下，继续丢弃后对全部被丢弃的消息重新摘要
+    assert seen == [["m0", "m1", "m2"], ["m0", "m1", "m2", "m3", "m4"]]
+    assert [m["content"][:2] for m in fitted] == ["你是", "以下", "m5"]
+
+
+def test_fit_overflow_when_pinned_messages_do_not_fit():
+    messages = [{"role": "system", "content": "x" * 400}, {"role": "user", "content": "x" * 400}]
+    budgeter = ContextBudgeter("local-model", context_window=150, reserved_output_tokens=0)
+    with pytest.raises(ContextOverflowException, match="已在本地拒绝请求"):
+        budgeter.fit(messages)
@@ -0,0 +1 @@
+"""工具模块 - 工具基类、注册表与检索"""
@@ -1,6 +1,7 @@
 
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List
+from pydantic import BaseModel
 
 
 class ToolParameter(BaseModel):
@@ -0,0 +1,465 @@
+"""本地搜索工具 - 基于磁盘 BM25 倒排索引的离线文档检索"""
+import os
+import json
+import mmap
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .base import Tool, ToolParameter
+from .retrieval import tokenize
+
+# 默认会被读取的文本文件类型
+DEFAULT_EXTENSIONS = (".txt", ".md", ".rst", ".py", ".json", ".csv", ".html", ".yaml", ".yml")
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """将非负整数数组编码为变长字节（每字节 7 位有效数据，最高位表示后面还有字节）"""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= (np.uint64(1) << np.uint64(7 * k))
+    offsets = np.concatenate(([0], np.cumsum(nbytes)[:-1]))
+    out = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] - 1 > k).astype(np.uint64) << np.uint64(7)
+        out[offsets[mask] + k] = (chunk | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """encode_varints 的逆过程，整体向量化解码"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) == 0:
+        return np.zeros(0, dtype=np.int64)
+    terminal = raw < 0x80
+    ends = np.flatnonzero(terminal)
+    group = np.concatenate(([0], np.cumsum(terminal)[:-1]))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = (np.arange(len(raw)) - starts[group]) * 7
+    parts = (raw & 0x7F).astype(np.int64) << shift
+    return np.bincount(group, weights=parts, minlength=len(ends)).astype(np.int64)
+
+
+def iter_chunks(text_lines: Iterator[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    """
+    流式切块：按行累积到 chunk_size 个字符后输出一块，
+    相邻块保留 overlap 个字符的重叠，避免答案被切断在块边界
+    """
+    buffer = ""
+    for line in text_lines:
+        buffer += line
+        while len(buffer) >= chunk_size:
+            # 尽量在换行或句号处断开
+            cut = max(buffer.rfind("\n", 0, chunk_size), buffer.rfind("。", 0, chunk_size) + 1)
+            if cut < chunk_size // 2:
+                cut = chunk_size
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            buffer = buffer[cut - min(overlap, cut // 2):]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class _Segment:
+    """
+    一个不可变的索引段
+
+    文件：
+    - <name>.meta.json: 文档 ID 列表与词典 {词: [偏移, 字节数, 文档频率]}
+    - <name>.post: 倒排表，每个词一段变长编码的 [块号差值, 词频, ...]
+    - <name>.text: 所有文本块的 UTF-8 拼接
+    - <name>.chunks.npz: 每个块的文本偏移、字节长度、token 数与所属文档序号
+    倒排表与文本通过 mmap 访问，查询时只解码命中词的倒排表。
+    """
+
+    def __init__(self, index_dir: str, name: str):
+        self.name = name
+        base = os.path.join(index_dir, name)
+        with open(base + ".meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.doc_ids: List[str] = meta["docs"]
+        self.lexicon: Dict[str, List[int]] = meta["lexicon"]
+        with np.load(base + ".chunks.npz") as data:
+            self.text_offsets = data["text_offsets"]
+            self.text_lengths = data["text_lengths"]
+            self.token_lengths = data["token_lengths"]
+            self.doc_index = data["doc_index"]
+        self._post_file, self._postings = self._map(base + ".post")
+        self._text_file, self._texts = self._map(base + ".text")
+        self.alive = np.ones(len(self.doc_index), dtype=bool)
+
+    @staticmethod
+    def _map(path: str) -> Tuple[Any, Any]:
+        f = open(path, "rb")
+        if os.fstat(f.fileno()).st_size == 0:
+            return f, b""
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.doc_index)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """返回 (块号数组, 词频数组)，词不存在时返回 None"""
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        offset, nbytes, _ = entry
+        pairs = decode_varints(self._postings[offset:offset + nbytes]).reshape(-1, 2)
+        return np.cumsum(pairs[:, 0]), pairs[:, 1]
+
+    def chunk_text(self, chunk: int) -> str:
+        start = int(self.text_offsets[chunk])
+        return self._texts[start:start + int(self.text_lengths[chunk])].decode("utf-8")
+
+    def chunk_doc(self, chunk: int) -> str:
+        return self.doc_ids[int(self.doc_index[chunk])]
+
+    def close(self):
+        for mapped, f in ((self._postings, self._post_file), (self._texts, self._text_file)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+            f.close()
+
+    @staticmethod
+    def write(index_dir: str, name: str, chunks: List[Tuple[str, str]]):
+        """将 [(文档 ID, 文本块), ...] 写成一个新段"""
+        base = os.path.join(index_dir, name)
+        doc_ids: List[str] = []
+        doc_positions: Dict[str, int] = {}
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        text_offsets, text_lengths, token_lengths, doc_index = [], [], [], []
+
+        offset = 0
+        with open(base + ".text", "wb") as text_file:
+            for chunk_no, (doc_id, text) in enumerate(chunks):
+                if doc_id not in doc_positions:
+                    doc_positions[doc_id] = len(doc_ids)
+                    doc_ids.append(doc_id)
+                data = text.encode("utf-8")
+                text_file.write(data)
+                text_offsets.append(offset)
+                text_lengths.append(len(data))
+                offset += len(data)
+
+                terms = Counter(tokenize(text))
+                token_lengths.append(sum(terms.values()))
+                doc_index.append(doc_positions[doc_id])
+                for term, tf in terms.items():
+                    postings[term].append((chunk_no, tf))
+
+        lexicon: Dict[str, List[int]] = {}
+        position = 0
+        with open(base + ".post", "wb") as post_file:
+            for term in sorted(postings):
+                entries = np.asarray(postings[term], dtype=np.int64)
+                # 块号递增，存差值后大多只占一个字节
+                entries[1:, 0] = np.diff(entries[:, 0])
+                data = encode_varints(entries.reshape(-1))
+                post_file.write(data)
+                lexicon[term] = [position, len(data), len(entries)]
+                position += len(data)
+
+        np.savez(
+            base + ".chunks.npz",
+            text_offsets=np.asarray(text_offsets, dtype=np.int64),
+            text_lengths=np.asarray(text_lengths, dtype=np.int64),
+            token_lengths=np.asarray(token_lengths, dtype=np.int32),
+            doc_index=np.asarray(doc_index, dtype=np.int32),
+        )
+        # 元数据最后写入：它存在即代表段文件完整
+        with open(base + ".meta.json", "w", encoding="utf-8") as f:
+            json.dump({"docs": doc_ids, "lexicon": lexicon}, f, ensure_ascii=False)
+
+    @staticmethod
+    def remove_files(index_dir: str, name: str):
+        for suffix in (".meta.json", ".post", ".text", ".chunks.npz"):
+            path = os.path.join(index_dir, name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LocalSearchIndex:
+    """
+    分段式磁盘 BM25 索引
+
+    - 写入：新增文档先缓冲，flush 时写成一个不可变的新段
+    - 删除：清单中记录每个文档当前所在的段，旧段里的块在查询时被屏蔽
+    - 段数量超过 max_segments 时自动合并，物理删除失效的块
+    - manifest.json 通过原子替换更新，任何时刻索引都处于一致状态
+
+    文档频率按所有段累加（含已屏蔽的块），合并后恢复精确值。
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, index_dir: str, max_segments: int = 8, segment_chunks: int = 5000, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            index_dir (str): 索引目录
+            max_segments (int): 自动合并前允许的最大段数
+            segment_chunks (int): 写入时每个段最多包含的块数，限制建索引的内存占用
+            k1 (float): BM25 参数 k1
+            b (float): BM25 参数 b
+        """
+        self.index_dir = index_dir
+        self.max_segments = max_segments
+        self.segment_chunks = segment_chunks
+        self.k1 = k1
+        self.b = b
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.manifest: Dict[str, Any] = {"next_segment": 1, "segments": [], "docs": {}}
+        manifest_path = os.path.join(index_dir, self.MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._segments: Dict[str, _Segment] = {}
+        self._buffer: List[Tuple[str, str]] = []
+        self._reload()
+
+    # ---- 清单与段管理 ----
+
+    def _save_manifest(self):
+        path = os.path.join(self.index_dir, self.MANIFEST_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _reload(self):
+        """打开清单中的段，关闭已被移除的段，并刷新存活掩码与全局统计"""
+        names = self.manifest["segments"]
+        for name in list(self._segments):
+            if name not in names:
+                self._segments.pop(name).close()
+        for name in names:
+            if name not in self._segments:
+                self._segments[name] = _Segment(self.index_dir, name)
+
+        docs = self.manifest["docs"]
+        self._live_chunks = 0
+        self._live_tokens = 0
+        for name, segment in self._segments.items():
+            owned = np.array([docs.get(doc_id, {}).get("segment") == name for doc_id in segment.doc_ids], dtype=bool)
+            segment.alive = owned[segment.doc_index] if len(segment) else np.zeros(0, dtype=bool)
+            self._live_chunks += int(segment.alive.sum())
+            self._live_tokens += int(segment.token_lengths[segment.alive].sum())
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.manifest["docs"])
+
+    @property
+    def chunk_count(self) -> int:
+        return self._live_chunks
+
+    # ---- 写入 ----
+
+    def add_document(self, doc_id: str, chunks: List[str], info: Optional[Dict[str, Any]] = None):
+        """添加或替换一个文档（已切块），达到段大小时自动落盘"""
+        self._buffer.extend((doc_id, chunk) for chunk in chunks)
+        self.manifest["docs"][doc_id] = {"segment": None, **(info or {})}
+        if len(self._buffer) >= self.segment_chunks:
+            self.flush()
+
+    def delete_document(self, doc_id: str):
+        """删除文档：从清单移除，旧段中的块立即被屏蔽"""
+        if self.manifest["docs"].pop(doc_id, None) is None:
+            return
+        self._buffer = [item for item in self._buffer if item[0] != doc_id]
+        self._save_manifest()
+        self._reload()
+
+    def flush(self, auto_compact: bool = True):
+        """将缓冲的文档写成新段并更新清单"""
+        if self._buffer:
+            name = f"seg-{self.manifest['next_segment']:06d}"
+            _Segment.write(self.index_dir, name, self._buffer)
+            self.manifest["next_segment"] += 1
+            self.manifest["segments"].append(name)
+            for doc_id, _ in self._buffer:
+                if doc_id in self.manifest["docs"]:
+                    self.manifest["docs"][doc_id]["segment"] = name
+            self._buffer = []
+        # 从未落盘就被替换/删除的文档不会留在清单中（原地删除，调用方可能持有该字典）
+        docs = self.manifest["docs"]
+        for doc_id in [k for k, v in docs.items() if not v.get("segment")]:
+            del docs[doc_id]
+        self._save_manifest()
+        self._reload()
+        if auto_compact and len(self.manifest["segments"]) > self.max_segments:
+            self.compact()
+
+    def compact(self):
+        """把所有段合并为一个，丢弃已删除或被替换的块"""
+        self.flush(auto_compact=False)
+        live: List[Tuple[str, str]] = []
+        for segment in self._segments.values():
+            for chunk in np.flatnonzero(segment.alive):
+                live.append((segment.chunk_doc(chunk), segment.chunk_text(chunk)))
+
+        old_segments = list(self.manifest["segments"])
+        name = f"seg-{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        if live:
+            _Segment.write(self.index_dir, name, live)
+            self.manifest["segments"] = [name]
+            for doc_id in self.manifest["docs"]:
+                self.manifest["docs"][doc_id]["segment"] = name
+        else:
+            self.manifest["segments"] = []
+        self._save_manifest()
+        self._reload()
+        for old in old_segments:
+            _Segment.remove_files(self.index_dir, old)
+        print(f"🗜️ 本地索引已合并 {len(old_segments)} 个段，保留 {len(live)} 个文本块。")
+
+    # ---- 查询 ----
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """BM25 检索，返回 [{'doc_id', 'text', 'score'}, ...]"""
+        terms = set(tokenize(query))
+        if not terms or self._live_chunks == 0:
+            return []
+        avg_length = self._live_tokens / self._live_chunks or 1.0
+        df = {t: sum(s.lexicon[t][2] for s in self._segments.values() if t in s.lexicon) for t in terms}
+        total = sum(len(s) for s in self._segments.values())
+
+        candidates: List[Tuple[float, str, int]] = []
+        for name, segment in self._segments.items():
+            scores = None
+            for term in terms:
+                if not df[term]:
+                    continue
+                hit = segment.postings(term)
+                if hit is None:
+                    continue
+                chunk_ids, tfs = hit
+                idf = np.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+                norm = tfs + self.k1 * (1 - self.b + self.b * segment.token_lengths[chunk_ids] / avg_length)
+                if scores is None:
+                    scores = np.zeros(len(segment), dtype=np.float64)
+                scores[chunk_ids] += idf * tfs * (self.k1 + 1) / norm
+            if scores is None:
+                continue
+            scores[~segment.alive] = 0.0
+            top = np.flatnonzero(scores > 0)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k)[:k]]
+            candidates.extend((float(scores[c]), name, int(c)) for c in top)
+
+        candidates.sort(reverse=True)
+        return [
+            {
+                "doc_id": self._segments[name].chunk_doc(chunk),
+                "text": self._segments[name].chunk_text(chunk),
+                "score": score,
+            }
+            for score, name, chunk in candidates[:k]
+        ]
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
+
+
+class LocalSearchTool(Tool):
+    """
+    本地文档搜索工具
+
+    对指定目录中的文档建立磁盘 BM25 索引，查询完全离线、无调用费用。
+    ingest 支持增量：按修改时间与大小判断文件是否变化，只重建变化的文档，
+    已被删除的文件会从索引中移除。
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        docs_dir: Optional[str] = None,
+        chunk_size: int = 500,
+        chunk_overlap: int = 80,
+        top_k: int = 3,
+        extensions: Tuple[str, ...] = DEFAULT_EXTENSIONS,
+    ):
+        """
+        Args:
+            index_dir (str): 索引目录
+            docs_dir (Optional[str]): 文档目录，提供时在初始化时增量导入
+            chunk_size (int): 文本块的字符数
+            chunk_overlap (int): 相邻块重叠的字符数
+            top_k (int): 每次查询返回的文本块数量
+            extensions (Tuple[str, ...]): 需要导入的文件扩展名
+        """
+        super().__init__(
+            name="local_search",
+            description="在本地文档库中进行关键词检索，适合查询内部文档与资料，无需联网。"
+        )
+        self.index = LocalSearchIndex(index_dir)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.top_k = top_k
+        self.extensions = extensions
+        if docs_dir:
+            self.ingest(docs_dir)
+
+    def ingest(self, docs_dir: str) -> Dict[str, int]:
+        """增量导入目录中的文档，返回新增、更新、删除与跳过的文件数"""
+        counts = {"added": 0, "updated": 0, "deleted": 0, "skipped": 0}
+        docs = self.index.manifest["docs"]
+        root = os.path.abspath(docs_dir)
+        seen = set()
+
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(dirpath, filename)
+                doc_id = os.path.relpath(path, root)
+                seen.add(doc_id)
+                stat = os.stat(path)
+                info = {"mtime": stat.st_mtime, "size": stat.st_size}
+                previous = docs.get(doc_id)
+                if previous and previous.get("mtime") == info["mtime"] and previous.get("size") == info["size"]:
+                    counts["skipped"] += 1
+                    continue
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    chunks = list(iter_chunks(f, self.chunk_size, self.chunk_overlap))
+                self.index.add_document(doc_id, chunks, info)
+                counts["updated" if previous else "added"] += 1
+
+        for doc_id in [d for d in docs if d not in seen]:
+            self.index.delete_document(doc_id)
+            counts["deleted"] += 1
+
+        self.index.flush()
+        print(
+            f"📂 本地索引更新完成：新增 {counts['added']}，更新 {counts['updated']}，"
+            f"删除 {counts['deleted']}，未变化 {counts['skipped']}（共 {self.index.chunk_count} 个文本块）"
+        )
+        return counts
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.index.search(query, k or self.top_k)
+
+    def run(self, parameters: Dict[str, Any]) -> str:
+        query = parameters.get("query") or parameters.get("input") or ""
+        if not query:
+            return "错误：缺少查询内容 query。"
+        hits = self.search(query)
+        if not hits:
+            return f"本地文档中没有找到与 '{query}' 相关的内容。"
+        result = f"📚 本地文档搜索结果（{len(hits)} 条）:\n\n"
+        for i, hit in enumerate(hits, 1):
+            result += f"[{i}]. 来源: {hit['doc_id']}（得分 {hit['score']:.2f}）\n"
+            result += f"     {hit['text'][:300]}\n\n"
+        return result
+
+    def get_parameters(self) -> List[ToolParameter]:
+        return [ToolParameter(name="query", type="string", description="检索关键词或问题")]
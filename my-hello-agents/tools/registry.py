@@ -1,20 +1,28 @@
 
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 from .base import Tool
+from .retrieval import ToolIndex
 
 
 class ToolRegistry:
     """HelloAgents 工具注册表"""
 
-    def __init__(self):
+    def __init__(self, embed: Optional[Callable[[list[str]], Any]] = None):
+        """
+        Args:
+            embed (Optional[Callable]): 工具检索使用的嵌入函数，None 表示只用 BM25
+        """
         self._tools: dict[str, Tool] = {}
         self._functions: dict[str, dict[str, Any]] = {}
+        # 工具检索索引，注册时增量更新
+        self._index = ToolIndex(embed)
 
     def register_tool(self, tool: Tool):
         """注册 Tool 对象"""
         if tool.name in self._tools:
             print(f"⚠️ 警告:工具 '{tool.name}' 已存在，将被覆盖。")
         self._tools[tool.name] = tool
+        self._index.add(tool.name, tool.description)
         print(f"✅ 工具 '{tool.name}' 注册成功。")
 
     def registry_function(self, name: str, description: str, func: Callable[[str], str]):
@@ -32,21 +40,41 @@ class ToolRegistry:
             "description": description,
             "function": func
         }
+        self._index.add(name, description)
         print(f"✅ 工具 '{name}' 已注册。")
 
-    
-    def get_tool_description(self) -> str:
-        """获取所有可用工具的格式化描述字符串"""
-        descriptions = []
+    def select_tools(self, query: str, k: int = 5) -> list[str]:
+        """
+        按查询检索最相关的 k 个工具名称
 
-        # Tool 对象描述
-        for tool in self._tools.values():
-            descriptions.append(f"{tool.name}: {tool.description}")
-        
-        # 函数工具描述
-        for name, info in self._functions.items():
-            descriptions.append(f"{name}: {info['description']}")
+        Args:
+            query (str): 当前步骤的问题或上下文
+            k (int): 返回的工具数量
+        """
+        return self._index.search(query, k)
+
+    def get_tool_description(self, query: Optional[str] = None, k: int = 5) -> str:
+        """
+        获取可用工具的格式化描述字符串
+
+        提供 query 且工具数量超过 k 时，只描述检索出的 k 个最相关工具；
+        没有任何工具与查询相关时退回完整列表
+        """
+        names = []
+        if query is not None and len(self._tools) + len(self._functions) > k:
+            names = self.select_tools(query, k)
+        if not names:
+            names = list(self._tools) + [n for n in self._functions if n not in self._tools]
+
+        descriptions = []
+        for name in names:
+            if name in self._tools:
+                # Tool 对象描述
+                descriptions.append(f"{name}: {self._tools[name].description}")
+            elif name in self._functions:
+                # 函数工具描述
+                descriptions.append(f"{name}: {self._functions[name]['description']}")
 
         return "\n".join(descriptions) if descriptions else "暂无可用工具。"
-    
+
     
@@ -0,0 +1,165 @@
+"""工具检索 - 按查询挑选最相关的工具，避免把全部工具描述放进提示词"""
+import re
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CAMEL_PATTERN = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英文混合分词：
+    - 英文按单词切分，驼峰与下划线命名会被拆开（getWeather -> get weather）
+    - 中文连续片段取单字与相邻二字组合，不依赖分词词典
+    """
+    text = _CAMEL_PATTERN.sub(" ", text).lower()
+    tokens = _WORD_PATTERN.findall(text)
+    for run in _CJK_PATTERN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    支持增量更新的 BM25 倒排索引
+
+    文档增删只修改相关词项的倒排表与长度统计，不需要重建；
+    检索时只遍历查询词命中的倒排表。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: str, text: str):
+        """添加文档，已存在时先移除旧内容"""
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self._postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """计算查询与所有命中文档的 BM25 得分"""
+        n = len(self._doc_terms)
+        if n == 0:
+            return {}
+        avg_length = self._total_length / n or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+
+class ToolIndex:
+    """
+    工具索引：BM25 关键词检索，可选叠加向量检索
+
+    提供 embed 函数时，最终得分为
+        (1 - alpha) * BM25 得分（按本次最高分归一化） + alpha * 余弦相似度
+    向量按工具缓存，只有新注册或描述变化的工具才需要重新嵌入。
+    """
+
+    def __init__(self, embed: Optional[Callable[[List[str]], np.ndarray]] = None, alpha: float = 0.5):
+        """
+        Args:
+            embed (Optional[Callable]): 嵌入函数，例如 HelloAgentsLLM.embed，None 表示只用 BM25
+            alpha (float): 向量得分的权重
+        """
+        self.embed = embed
+        self.alpha = alpha
+        self.bm25 = BM25Index()
+        self._texts: Dict[str, str] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[Tuple[List[str], np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, name: str, description: str):
+        """注册或更新一个工具"""
+        text = f"{name} {description}"
+        if self._texts.get(name) == text:
+            return
+        self._texts[name] = text
+        self.bm25.add(name, text)
+        self._vectors.pop(name, None)
+        self._matrix = None
+
+    def remove(self, name: str):
+        self._texts.pop(name, None)
+        self.bm25.remove(name)
+        self._vectors.pop(name, None)
+        self._matrix = None
+
+    def _vector_matrix(self) -> Tuple[List[str], np.ndarray]:
+        """返回全部工具的向量矩阵，只嵌入尚未缓存的工具"""
+        if self._matrix is None:
+            missing = [name for name in self._texts if name not in self._vectors]
+            if missing:
+                vectors = np.atleast_2d(self.embed([self._texts[name] for name in missing]))
+                for name, vector in zip(missing, vectors):
+                    self._vectors[name] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            names = list(self._texts)
+            self._matrix = (names, np.stack([self._vectors[name] for name in names]))
+        return self._matrix
+
+    def search(self, query: str, k: int) -> List[str]:
+        """返回与查询最相关的 k 个工具名称"""
+        if not self._texts or k <= 0:
+            return []
+        lexical = self.bm25.scores(query)
+        top = max(lexical.values(), default=0.0)
+        scores = {name: score / top for name, score in lexical.items()} if top > 0 else {}
+
+        if self.embed is not None:
+            names, matrix = self._vector_matrix()
+            query_vector = np.atleast_2d(self.embed([query]))[0]
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            similarities = matrix @ query_vector
+            scores = {
+                name: (1 - self.alpha) * scores.get(name, 0.0) + self.alpha * float(sim)
+                for name, sim in zip(names, similarities)
+            }
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [name for name, score in ranked[:k] if score > 0]
@@ -0,0 +1,71 @@
+"""
+全局请求数 / token 数限流：单进程内并发的多局游戏共享同一份每分钟配额
+
+令牌桶连续回填，调用前按估算的 token 数预扣，调用结束后用实际用量修正。
+"""
+import time
+import asyncio
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    全局请求数 / token 数限流（每分钟），令牌桶连续回填
+
+    - 桶容量为 burst_seconds 秒的额度，突发请求不会一次性用掉整分钟的配额
+    - 调用前按估算的 token 数预扣，桶内余量不足时排队等待，先到先得
+    - 调用结束后用实际用量修正预扣值，多用的部分会让后续请求多等一会
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None, burst_seconds: float = 1.0):
+        """
+        Args:
+            rpm: 每分钟请求数上限，None 表示不限
+            tpm: 每分钟 token 数上限，None 表示不限
+            burst_seconds: 允许的突发量，以多少秒的额度计
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_capacity = max(1.0, (rpm or 0) / 60 * burst_seconds)
+        self.token_capacity = (tpm or 0) / 60 * burst_seconds
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        if self.rpm:
+            self._requests = min(self.request_capacity, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.token_capacity, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """预扣一次请求与 tokens 个 token，额度不足时等待"""
+        # 单个请求超过桶容量时按桶容量预扣，否则永远等不到
+        tokens = min(tokens, self.token_capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = (1 - self._requests) * 60 / self.rpm
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                self.waited += wait
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+    def settle(self, estimated: int, actual: int):
+        """用实际 token 用量修正预扣值"""
+        if self.tpm:
+            self._refill()
+            charged = min(estimated, self.token_capacity)
+            self._tokens = min(self.token_capacity, self._tokens - (actual - charged))
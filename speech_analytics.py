@@ -0,0 +1,263 @@
+"""
+流式发言分析：Aho–Corasick 多关键词匹配 + 按玩家增量维护的信心、犹疑、情感与怀疑度
+
+每条新消息只扫描一遍，所有关键词与玩家姓名在同一次扫描中命中；
+玩家的各项指标以累加量保存，读取时 O(1) 计算，不需要回看历史发言。
+"""
+from collections import defaultdict, deque
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+CONFIDENCE_WORDS = ["确定", "一定", "肯定", "绝对", "必须", "显然"]
+DOUBT_WORDS = ["可能", "也许", "或许", "怀疑", "不确定", "感觉"]
+POSITIVE_WORDS = ["好", "棒", "赞", "支持", "同意"]
+NEGATIVE_WORDS = ["坏", "差", "反对", "不行", "错误"]
+# 同一句中与玩家姓名同时出现时，视为对该玩家的指认或辩护
+ACCUSE_WORDS = ["狼人", "是狼", "可疑", "怀疑", "查杀", "悍跳", "投他", "出他"]
+DEFEND_WORDS = ["好人", "金水", "相信", "信任", "保他"]
+SENTENCE_BREAKS = ["。", "！", "？", "；", "!", "?", ";", "\n"]
+
+# 事件对被指向玩家怀疑度的影响，与 calculate_suspicion_score 的规则一致
+EVENT_WEIGHTS = {"vote": 0.3, "accusation": 0.2, "defense": -0.1}
+
+
+def default_lexicon() -> Dict[str, Tuple[str, ...]]:
+    """关键词 -> 类别；同一个词可以属于多个类别（如“怀疑”既是犹疑也是指认）"""
+    lexicon: Dict[str, Tuple[str, ...]] = defaultdict(tuple)
+    for category, words in [
+        ("confidence", CONFIDENCE_WORDS), ("doubt", DOUBT_WORDS),
+        ("positive", POSITIVE_WORDS), ("negative", NEGATIVE_WORDS),
+        ("accuse", ACCUSE_WORDS), ("defend", DEFEND_WORDS), ("break", SENTENCE_BREAKS),
+    ]:
+        for word in words:
+            lexicon[word] += (category,)
+    return dict(lexicon)
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick 自动机
+
+    构建时把全部模式串插入字典树并用 BFS 计算失配指针，每个状态的输出合并了其失配链上的全部模式；
+    扫描时每个字符只做一次状态转移，命中数与模式数量无关。
+    失配后的转移结果按需缓存，常见字符很快退化为一次字典查找。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._build()
+        self._delta: List[Dict[str, int]] = [dict(g) for g in self._goto]
+
+    def _insert(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        # 重复的模式串（如玩家姓名与关键词相同）只输出一次
+        if pattern not in self._out[state]:
+            self._out[state] += (pattern,)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def step(self, state: int, ch: str) -> int:
+        """单字符状态转移"""
+        nxt = self._delta[state].get(ch)
+        if nxt is None:
+            fail = state
+            while fail and ch not in self._goto[fail]:
+                fail = self._fail[fail]
+            nxt = self._goto[fail].get(ch, 0)
+            self._delta[state][ch] = nxt
+        return nxt
+
+    def feed(self, text: str, state: int = 0) -> Tuple[List[Tuple[int, str]], int]:
+        """
+        扫描一段文本，返回 ([(结束位置, 模式串), ...], 结束状态)
+
+        传入上一段文本的结束状态即可跨分片继续匹配，用于流式输入
+        """
+        delta, outputs, step = self._delta, self._out, self.step
+        matches = []
+        for i, ch in enumerate(text):
+            nxt = delta[state].get(ch)
+            state = step(state, ch) if nxt is None else nxt
+            if outputs[state]:
+                matches.extend((i, pattern) for pattern in outputs[state])
+        return matches, state
+
+
+class PlayerSpeechStats:
+    """单个玩家的累加统计量"""
+
+    __slots__ = ("messages", "chars", "confidence", "doubt", "sentiment", "suspicion_raw")
+
+    def __init__(self):
+        self.messages = 0
+        self.chars = 0
+        self.confidence = 0
+        self.doubt = 0
+        self.sentiment = 0
+        # 未截断的怀疑度累加值，读取时截断到 [0, 1]
+        self.suspicion_raw = 0.0
+
+    def scores(self) -> Dict[str, float]:
+        hedged = self.confidence + self.doubt
+        per_message = max(self.messages, 1)
+        return {
+            "messages": self.messages,
+            "confidence": self.confidence / hedged if hedged else 0.5,
+            "doubt": self.doubt / hedged if hedged else 0.5,
+            "sentiment": self.sentiment / per_message,
+            "suspicion": min(max(self.suspicion_raw, 0.0), 1.0),
+        }
+
+
+class SpeechAnalytics:
+    """
+    流式发言分析器
+
+    - observe_speech: 扫描一条发言，更新发言者的信心/犹疑/情感，
+      并把同一句中出现指认或辩护词的玩家姓名记为一次 accusation / defense
+    - observe_event: 处理投票等结构化事件，支持 {"type": "vote"/"accusation"/"defense", "target": ...}
+      以及游戏事件日志中的 day_vote 事件
+    两者的开销都只与新输入的长度有关
+    """
+
+    def __init__(self, players: Iterable[str] = (), lexicon: Optional[Mapping[str, Tuple[str, ...]]] = None):
+        self.lexicon: Dict[str, Tuple[str, ...]] = dict(lexicon or default_lexicon())
+        self.players: Dict[str, PlayerSpeechStats] = {}
+        self._automaton: Optional[AhoCorasick] = None
+        for name in players:
+            self.add_player(name)
+
+    def add_player(self, name: str):
+        """登记玩家；玩家姓名会加入自动机，下次扫描前重建"""
+        if name not in self.players:
+            self.players[name] = PlayerSpeechStats()
+            self._automaton = None
+
+    def _get_automaton(self) -> AhoCorasick:
+        if self._automaton is None:
+            self._automaton = AhoCorasick(list(self.lexicon) + list(self.players))
+        return self._automaton
+
+    def analyze(self, text: str, speaker: Optional[str] = None) -> Dict[str, Any]:
+        """
+        单次扫描分析一段发言，不修改任何状态
+
+        Returns:
+            word_count / confidence_keywords / doubt_keywords / emotion_score 与旧版 analyze_speech_pattern 一致，
+            stances 为 {玩家: "accusation" 或 "defense"}
+        """
+        analysis = {
+            "word_count": len(text),
+            "confidence_keywords": 0,
+            "doubt_keywords": 0,
+            "emotion_score": 0,
+            "stances": {},
+        }
+        sentence_names: List[str] = []
+        accuse = defend = 0
+
+        def close_sentence():
+            if accuse != defend:
+                stance = "accusation" if accuse > defend else "defense"
+                for name in sentence_names:
+                    analysis["stances"][name] = stance
+
+        matches, _ = self._get_automaton().feed(text)
+        for _, pattern in matches:
+            if pattern in self.players:
+                if pattern != speaker and pattern not in sentence_names:
+                    sentence_names.append(pattern)
+            for category in self.lexicon.get(pattern, ()):
+                if category == "confidence":
+                    analysis["confidence_keywords"] += 1
+                elif category == "doubt":
+                    analysis["doubt_keywords"] += 1
+                elif category == "positive":
+                    analysis["emotion_score"] += 1
+                elif category == "negative":
+                    analysis["emotion_score"] -= 1
+                elif category == "accuse":
+                    accuse += 1
+                elif category == "defend":
+                    defend += 1
+                elif category == "break":
+                    close_sentence()
+                    sentence_names, accuse, defend = [], 0, 0
+        close_sentence()
+        return analysis
+
+    def observe_speech(self, speaker: str, text: str) -> Dict[str, Any]:
+        """处理一条新发言，返回该条发言的分析结果"""
+        analysis = self.analyze(text, speaker=speaker)
+        self.add_player(speaker)
+        stats = self.players[speaker]
+        stats.messages += 1
+        stats.chars += analysis["word_count"]
+        stats.confidence += analysis["confidence_keywords"]
+        stats.doubt += analysis["doubt_keywords"]
+        stats.sentiment += analysis["emotion_score"]
+        for target, stance in analysis["stances"].items():
+            self.players[target].suspicion_raw += EVENT_WEIGHTS[stance]
+        return analysis
+
+    def observe_event(self, event: Mapping[str, Any]):
+        """处理一条结构化事件"""
+        event_type = event.get("type")
+        if event_type == "day_vote":
+            for target in event.get("votes", {}).values():
+                if target:
+                    self._adjust(target, EVENT_WEIGHTS["vote"])
+        elif event_type in EVENT_WEIGHTS and event.get("target"):
+            self._adjust(event["target"], EVENT_WEIGHTS[event_type])
+
+    def _adjust(self, target: str, delta: float):
+        self.add_player(target)
+        self.players[target].suspicion_raw += delta
+
+    def suspicion(self, name: str) -> float:
+        stats = self.players.get(name)
+        return stats.scores()["suspicion"] if stats else 0.0
+
+    def scores(self, name: str) -> Dict[str, float]:
+        stats = self.players.get(name)
+        return (stats or PlayerSpeechStats()).scores()
+
+    def state_dict(self) -> Dict[str, Dict[str, float]]:
+        return {name: {k: getattr(stats, k) for k in PlayerSpeechStats.__slots__} for name, stats in self.players.items()}
+
+    def load_state_dict(self, state_dict: Mapping[str, Mapping[str, float]]):
+        for name, values in state_dict.items():
+            self.add_player(name)
+            for key, value in values.items():
+                setattr(self.players[name], key, value)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """全部玩家的当前指标，按怀疑度降序"""
+        return dict(sorted(
+            ((name, stats.scores()) for name, stats in self.players.items()),
+            key=lambda item: item[1]["suspicion"], reverse=True,
+        ))
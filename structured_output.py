@@ -0,0 +1,589 @@
+"""
+结构化输出引擎：尽量在本地把模型的回复修复成合法结构，减少整轮重试
+
+处理顺序：
+1. 服务支持时使用 JSON 模式 / JSON Schema 约束输出
+2. 宽容解析：代码块围栏、单引号、Python 字面量、尾逗号、全角标点、缺失的右括号（输出被截断）
+3. 确定性修复：字段名近似匹配、Literal 枚举值模糊匹配、布尔与数字转换、数值截断到合法范围
+4. 仍不合法时，只针对出错的字段发起一次简短的重新询问，并与已修复的部分合并
+"""
+import re
+import json
+import difflib
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.S)
+_INT_PATTERN = re.compile(r"-?\d+")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.、)）])\s*")
+_TRUE_WORDS = {"true", "yes", "y", "1", "是", "对", "使用", "开枪", "同意"}
+_FALSE_WORDS = {"false", "no", "n", "0", "否", "不", "不使用", "放弃", "不同意", "none", "null", ""}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_OPEN_QUOTES = {'"': '"', "'": "'", "“": "”", "‘": "’"}
+
+
+class StructuredOutputError(Exception):
+    """本地修复与重新询问之后仍无法得到合法结构"""
+    pass
+
+
+# ---- 宽容解析 ----
+class _LenientParser:
+    """
+    递归下降解析 JSON 及其常见变体
+
+    遇到文本结尾时自动补全未闭合的字符串、对象与数组（truncated 标记为 True），
+    因此也可以对流式输出的前缀调用，得到目前为止的部分结果。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.truncated = False
+
+    def _skip(self):
+        text, n = self.text, len(self.text)
+        while self.pos < n:
+            ch = text[self.pos]
+            if ch.isspace():
+                self.pos += 1
+            elif text.startswith("//", self.pos) or ch == "#":
+                end = text.find("\n", self.pos)
+                self.pos = n if end < 0 else end + 1
+            else:
+                break
+
+    def _peek(self) -> str:
+        self._skip()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def parse(self) -> Any:
+        ch = self._peek()
+        if not ch:
+            self.truncated = True
+            return None
+        if ch == "{":
+            return self._object()
+        if ch == "[":
+            return self._array()
+        if ch in _OPEN_QUOTES:
+            return self._string()
+        if ch in "-+.0123456789":
+            return self._number()
+        return self._bare()
+
+    def _object(self) -> Dict[str, Any]:
+        self.pos += 1
+        result: Dict[str, Any] = {}
+        while True:
+            ch = self._peek()
+            if not ch:
+                self.truncated = True
+                return result
+            if ch == "}":
+                self.pos += 1
+                return result
+            if ch in ",，;":
+                self.pos += 1
+                continue
+            key = self._string() if ch in _OPEN_QUOTES else self._bare(stop=":：,，}")
+            ch = self._peek()
+            if ch in ":：":
+                self.pos += 1
+                if not self._peek():
+                    self.truncated = True
+                    return result
+                result[str(key)] = self.parse()
+            elif not ch:
+                self.truncated = True
+                return result
+            else:
+                # 缺少冒号的键，跳过
+                continue
+
+    def _array(self) -> List[Any]:
+        self.pos += 1
+        result: List[Any] = []
+        while True:
+            ch = self._peek()
+            if not ch:
+                self.truncated = True
+                return result
+            if ch == "]":
+                self.pos += 1
+                return result
+            if ch in ",，;":
+                self.pos += 1
+                continue
+            start = self.pos
+            result.append(self.parse())
+            if self.pos == start:
+                # 无法识别的字符，跳过以免死循环
+                self.pos += 1
+
+    def _string(self) -> str:
+        close = _OPEN_QUOTES[self.text[self.pos]]
+        self.pos += 1
+        chars: List[str] = []
+        text, n = self.text, len(self.text)
+        while self.pos < n:
+            ch = text[self.pos]
+            if ch == "\\" and self.pos + 1 < n:
+                nxt = text[self.pos + 1]
+                if nxt == "u" and self.pos + 6 <= n:
+                    try:
+                        chars.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                        self.pos += 6
+                        continue
+                    except ValueError:
+                        pass
+                chars.append({"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(nxt, nxt))
+                self.pos += 2
+                continue
+            if ch == close:
+                self.pos += 1
+                return "".join(chars)
+            chars.append(ch)
+            self.pos += 1
+        self.truncated = True
+        return "".join(chars)
+
+    def _number(self) -> Union[int, float, str]:
+        match = re.compile(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?").match(self.text, self.pos)
+        if not match:
+            return self._bare()
+        self.pos = match.end()
+        literal = match.group(0)
+        try:
+            return int(literal)
+        except ValueError:
+            return float(literal)
+
+    def _bare(self, stop: str = ",，]}\n") -> Any:
+        """未加引号的值：true/false/null 及 Python 写法，其余按字符串处理"""
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in stop:
+            self.pos += 1
+        word = self.text[start:self.pos].strip().rstrip("。.")
+        return _LITERALS.get(word, word)
+
+
+def extract_payload(text: str) -> str:
+    """取出回复中的结构化部分：优先取代码块内容，否则从第一个 { 或 [ 开始"""
+    fences = _FENCE_PATTERN.findall(text)
+    for block in fences:
+        if block.strip():
+            text = block
+            break
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text.strip()
+
+
+def parse_lenient(text: str) -> Tuple[Any, bool]:
+    """
+    宽容地解析模型回复
+
+    Returns:
+        (解析结果, 是否被截断)；完全无法识别结构时返回去掉首尾空白的原文
+    """
+    payload = extract_payload(text)
+    if not payload or payload[0] not in "{[" + "".join(_OPEN_QUOTES):
+        # 没有结构，只回答了一句话
+        return payload, False
+    try:
+        return json.loads(payload), False
+    except (json.JSONDecodeError, ValueError):
+        pass
+    parser = _LenientParser(payload)
+    return parser.parse(), parser.truncated
+
+
+class IncrementalJSONParser:
+    """
+    流式输出的增量解析：每次喂入片段后返回目前为止的部分结果
+
+    只有片段中出现结构性字符（括号、逗号、引号、冒号）时才重新解析，普通文字片段直接复用上次结果
+    """
+
+    _STRUCTURAL = set("{}[],:\"'：，")
+
+    def __init__(self):
+        self.buffer = ""
+        self.value: Any = None
+        self.truncated = True
+
+    def feed(self, chunk: str) -> Any:
+        self.buffer += chunk
+        if self.value is None or self._STRUCTURAL.intersection(chunk):
+            self.value, self.truncated = parse_lenient(self.buffer)
+        return self.value
+
+    def close(self) -> Any:
+        self.value, self.truncated = parse_lenient(self.buffer)
+        return self.value
+
+
+# ---- 确定性修复 ----
+def _unwrap_optional(annotation: Any) -> Tuple[Any, bool]:
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return annotation, False
+
+
+def literal_choices(annotation: Any) -> Optional[Tuple[Any, ...]]:
+    """返回 Literal（可包在 Optional 中）的可选值"""
+    annotation, _ = _unwrap_optional(annotation)
+    if get_origin(annotation) is Literal:
+        return get_args(annotation)
+    return None
+
+
+def fuzzy_choice(value: Any, choices: Sequence[Any], cutoff: float = 0.6) -> Optional[Any]:
+    """
+    把模型给出的值匹配到可选值：
+    精确匹配 -> 去空白与标点后忽略大小写匹配 -> 唯一的包含关系 -> difflib 相似度
+    """
+    if value in choices:
+        return value
+    if value is None:
+        return None
+    normalize = lambda v: re.sub(r"[\s\W_]+", "", str(v)).lower()
+    target = normalize(value)
+    if not target:
+        return None
+    normalized = {normalize(c): c for c in choices}
+    if target in normalized:
+        return normalized[target]
+    contained = [c for key, c in normalized.items() if key and (key in target or target in key)]
+    if len(contained) == 1:
+        return contained[0]
+    close = difflib.get_close_matches(target, list(normalized), n=1, cutoff=cutoff)
+    return normalized[close[0]] if close else None
+
+
+def _bounds(field_info: Any) -> Tuple[Optional[float], Optional[float]]:
+    lower = upper = None
+    for constraint in getattr(field_info, "metadata", []):
+        if getattr(constraint, "ge", None) is not None:
+            lower = constraint.ge
+        if getattr(constraint, "le", None) is not None:
+            upper = constraint.le
+    return lower, upper
+
+
+def coerce(value: Any, annotation: Any, field_info: Any = None, choices: Optional[Sequence[Any]] = None,
+           cutoff: float = 0.6) -> Any:
+    """按类型注解做确定性转换，无法转换时原样返回，交给 pydantic 报错"""
+    annotation, optional = _unwrap_optional(annotation)
+    if optional and (value is None or (isinstance(value, str) and value.strip().lower() in ("", "none", "null", "无"))):
+        return None
+
+    choices = choices if choices is not None else literal_choices(annotation)
+    if choices is not None:
+        matched = fuzzy_choice(value, choices, cutoff)
+        return matched if matched is not None else value
+
+    origin = get_origin(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return coerce_mapping(value, annotation, cutoff=cutoff) if isinstance(value, dict) else value
+    if annotation is bool:
+        if isinstance(value, str):
+            word = value.strip().lower().rstrip("。.")
+            if word in _TRUE_WORDS:
+                return True
+            if word in _FALSE_WORDS:
+                return False
+        return value
+    if annotation in (int, float):
+        if isinstance(value, str):
+            match = _INT_PATTERN.search(value) if annotation is int else re.search(r"-?\d+(\.\d+)?", value)
+            if match:
+                value = annotation(match.group(0))
+        if isinstance(value, float) and annotation is int:
+            value = round(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lower, upper = _bounds(field_info)
+            if lower is not None:
+                value = max(value, annotation(lower))
+            if upper is not None:
+                value = min(value, annotation(upper))
+        return value
+    if annotation is str:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        if isinstance(value, list):
+            return "；".join(str(v) for v in value)
+        return value
+    if origin in (list, List):
+        (item_type,) = get_args(annotation) or (Any,)
+        if isinstance(value, dict):
+            # {"steps": [...]} 之类的包装对象：取唯一的列表值
+            lists = [v for v in value.values() if isinstance(v, list)]
+            value = lists[0] if len(lists) == 1 else value
+        if isinstance(value, str) and value.strip():
+            # 没有写成列表的多行文本：每行一项；有带序号或列表符号的行时只取这些行
+            lines = [line for line in value.splitlines() if line.strip()]
+            marked = [line for line in lines if _LIST_MARKER.match(line)]
+            value = [_LIST_MARKER.sub("", line).strip() for line in (marked or lines)]
+        if isinstance(value, list) and item_type is not Any:
+            return [coerce(item, item_type, cutoff=cutoff) for item in value]
+        return value
+    return value
+
+
+def _key_segments(key: Any) -> List[str]:
+    """把键名按下划线、空白、标点与驼峰拆成小写片段：suspicionLevel -> [suspicion, level]"""
+    parts = re.split(r"[\s\W_]+", str(key))
+    return [seg.lower() for part in parts for seg in re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[^A-Z]+", part)]
+
+
+def _is_subsequence(short: str, long: str) -> bool:
+    chars = iter(long)
+    return all(c in chars for c in short)
+
+
+def _abbreviates(key: Any, name: str) -> bool:
+    """
+    key 是否是字段名的前缀或缩写：key 的各片段依次对应字段名开头的若干片段，
+    每个片段首字母相同且是对应片段的子序列，如 suspicion / susp_lvl -> suspicion_level
+    """
+    key_segments, name_segments = _key_segments(key), _key_segments(name)
+    if not key_segments or len(key_segments) > len(name_segments) or len("".join(key_segments)) < 3:
+        return False
+    return all(k[0] == n[0] and _is_subsequence(k, n) for k, n in zip(key_segments, name_segments))
+
+
+def coerce_mapping(data: Dict[str, Any], model: type, choices: Optional[Dict[str, Sequence[Any]]] = None,
+                   cutoff: float = 0.6) -> Dict[str, Any]:
+    """
+    把字典修复成 model 的字段：键名近似匹配，值按字段类型转换
+
+    键名匹配顺序：精确 -> 去空白与标点后忽略大小写 -> difflib 相似度 -> 唯一的前缀 / 缩写；
+    先处理能精确匹配的键，近似匹配只在尚未被占用的字段中查找
+    """
+    fields = model.model_fields
+    normalize = lambda k: re.sub(r"[\s\W_]+", "", str(k)).lower()
+    by_normalized = {normalize(name): name for name in fields}
+
+    matched: Dict[str, Any] = {}
+    unmatched: List[Any] = []
+    for key in data:
+        name = key if key in fields else by_normalized.get(normalize(key))
+        if name is None:
+            unmatched.append(key)
+        else:
+            matched.setdefault(name, key)
+    for key in unmatched:
+        free = {normalized: name for normalized, name in by_normalized.items() if name not in matched}
+        close = difflib.get_close_matches(normalize(key), list(free), n=1, cutoff=0.8)
+        if close:
+            matched[free[close[0]]] = key
+            continue
+        candidates = [name for name in free.values() if _abbreviates(key, name)]
+        if len(candidates) == 1:
+            matched[candidates[0]] = key
+
+    repaired: Dict[str, Any] = {}
+    names = {key: name for name, key in matched.items()}
+    for key, value in data.items():
+        name = names.get(key)
+        if name is not None:
+            field = fields[name]
+            repaired[name] = coerce(value, field.annotation, field, (choices or {}).get(name), cutoff)
+    return repaired
+
+
+class StructuredResult:
+    """一次解析的结果"""
+
+    def __init__(self, value: Any = None, data: Any = None, errors: Optional[List[Dict[str, Any]]] = None,
+                 repaired: bool = False):
+        self.value = value
+        self.data = data
+        self.errors = errors or []
+        self.repaired = repaired
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+@lru_cache(maxsize=1024)
+def _adapter(schema: Any) -> TypeAdapter:
+    """同一 schema 的校验器只构建一次（动态生成的模型由调用方缓存，类对象可直接作为键）"""
+    return TypeAdapter(schema)
+
+
+@lru_cache(maxsize=1024)
+def _json_schema(schema: Any) -> Dict[str, Any]:
+    return _adapter(schema).json_schema()
+
+
+def _is_model(schema: Any) -> bool:
+    return isinstance(schema, type) and issubclass(schema, BaseModel)
+
+
+class StructuredOutputEngine:
+    """
+    结构化输出引擎
+
+    parse 只做本地工作（解析 + 修复 + 校验）；generate 在此基础上加入 JSON 模式与一次有针对性的重新询问。
+    stats 统计 直接合法 / 本地修复 / 重新询问 / 失败 的次数，用于评估节省了多少次完整重试。
+    """
+
+    def __init__(self, fuzzy_cutoff: float = 0.6, json_mode: bool = True):
+        """
+        Args:
+            fuzzy_cutoff: 枚举值模糊匹配的最低相似度
+            json_mode: 是否尝试使用服务端的 JSON Schema 约束；服务不支持时会自动关闭
+        """
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.json_mode = json_mode
+        self.stats: Counter = Counter()
+
+    def parse(self, raw: Any, schema: Any, choices: Optional[Dict[str, Sequence[Any]]] = None) -> StructuredResult:
+        """
+        解析并修复一段回复
+
+        Args:
+            raw: 模型回复文本，或已经解析出的字典 / 列表
+            schema: pydantic 模型，或 list[str] 这样的类型
+            choices: 额外的枚举约束 {字段: 可选值}，用于注解为 str 但实际取值受限的字段
+        """
+        data, truncated = parse_lenient(raw) if isinstance(raw, str) else (raw, False)
+        errors: List[Dict[str, Any]] = []
+        if _is_model(schema):
+            if isinstance(data, str) and data:
+                data = self._from_sentence(data, schema, choices)
+            if isinstance(data, dict):
+                data = coerce_mapping(data, schema, choices, self.fuzzy_cutoff)
+                # 注解为 str 的字段没有 Literal 约束，额外的枚举约束在这里检查
+                for name, options in (choices or {}).items():
+                    if data.get(name) is not None and data[name] not in options:
+                        errors.append({"loc": (name,), "msg": "不在可选范围内", "input": data[name]})
+        else:
+            data = coerce(data, schema, cutoff=self.fuzzy_cutoff)
+
+        try:
+            value = _adapter(schema).validate_python(data)
+        except ValidationError as e:
+            return StructuredResult(data=data, errors=e.errors(include_url=False) + errors, repaired=truncated)
+        if errors:
+            return StructuredResult(data=data, errors=errors, repaired=truncated)
+        return StructuredResult(value=value, data=data, repaired=truncated or data != raw)
+
+    @staticmethod
+    def _from_sentence(text: str, schema: type, choices: Optional[Dict[str, Sequence[Any]]]) -> Dict[str, Any]:
+        """
+        没有结构的一句话（如“我投张三，因为他发言矛盾”）：
+        带枚举约束的必填字段从句中匹配取值，其余必填的文本字段以整句作为内容
+        """
+        data: Dict[str, Any] = {}
+        for name, field in schema.model_fields.items():
+            if not field.is_required():
+                continue
+            annotation, _ = _unwrap_optional(field.annotation)
+            if (choices or {}).get(name) is not None or literal_choices(annotation) is not None or annotation is str:
+                data[name] = text
+        return data
+
+    def reask_prompt(self, result: StructuredResult, schema: Any,
+                     choices: Optional[Dict[str, Sequence[Any]]] = None) -> str:
+        """生成只针对错误字段的简短追问"""
+        if not _is_model(schema) or not isinstance(result.data, dict):
+            example = json.dumps(_json_schema(schema), ensure_ascii=False)
+            return f"你上一次的输出无法解析。请只输出符合以下 JSON Schema 的内容，不要输出其他文字：{example}"
+
+        lines, names = [], []
+        for name in dict.fromkeys(str(error["loc"][0]) for error in result.errors if error.get("loc")):
+            field = schema.model_fields.get(name)
+            if field is None:
+                continue
+            names.append(f'"{name}"')
+            options = (choices or {}).get(name) or literal_choices(field.annotation)
+            hint = f"只能取以下值之一：{'、'.join(map(str, options))}" if options else f"类型为 {getattr(field.annotation, '__name__', field.annotation)}"
+            description = f"（{field.description}）" if field.description else ""
+            given = f"你给出的是 {result.data[name]!r}" if name in result.data else "你没有给出该字段"
+            lines.append(f"- {name}{description}：{hint}，{given}")
+        return ("你上一次输出中以下字段不合法：\n" + "\n".join(lines) +
+                f"\n请只输出包含 {'、'.join(names)} 的 JSON 对象，不要输出其他内容。")
+
+    def merge(self, previous: StructuredResult, raw: Any, schema: Any,
+              choices: Optional[Dict[str, Sequence[Any]]] = None) -> StructuredResult:
+        """把追问得到的字段合并进上一次已修复的部分"""
+        if _is_model(schema) and isinstance(previous.data, dict):
+            patch = self.parse(raw, schema, choices)
+            if isinstance(patch.data, dict):
+                merged = {**previous.data, **patch.data}
+                return self.parse(merged, schema, choices)
+        return self.parse(raw, schema, choices)
+
+    def response_format(self, schema: Any) -> Optional[Dict[str, Any]]:
+        """OpenAI 兼容接口的 JSON Schema 输出约束；根节点不是对象时不使用"""
+        if not self.json_mode or not _is_model(schema):
+            return None
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": _json_schema(schema)},
+        }
+
+    def generate(
+        self,
+        ask: Callable[[List[Dict[str, str]], Optional[Dict[str, Any]]], Optional[str]],
+        messages: List[Dict[str, str]],
+        schema: Any,
+        choices: Optional[Dict[str, Sequence[Any]]] = None,
+        max_reasks: int = 1,
+        response: Optional[str] = None,
+    ) -> StructuredResult:
+        """
+        调用模型并返回合法结构
+
+        Args:
+            ask: (messages, response_format) -> 回复文本；调用失败时返回 None
+            messages: 对话消息
+            schema: 期望的结构
+            choices: 额外的枚举约束
+            max_reasks: 最多追问次数
+            response: 已经拿到的回复；提供时跳过首次调用
+
+        Raises:
+            StructuredOutputError: 修复与追问后仍不合法
+        """
+        if response is None:
+            response_format = self.response_format(schema)
+            response = ask(messages, response_format)
+            if response is None and response_format is not None:
+                # 服务不支持 JSON Schema 约束，之后不再尝试
+                print("⚠️ 当前服务不支持 JSON Schema 输出约束，改为本地解析与修复。")
+                self.json_mode = False
+                response = ask(messages, None)
+        if response is None:
+            self.stats["failed"] += 1
+            raise StructuredOutputError("模型调用失败")
+
+        result = self.parse(response, schema, choices)
+        if result.ok:
+            self.stats["repaired" if result.repaired else "valid"] += 1
+            return result
+
+        for _ in range(max_reasks):
+            self.stats["reasked"] += 1
+            followup = messages + [
+                {"role": "assistant", "content": response},
+                {"role": "user", "content": self.reask_prompt(result, schema, choices)},
+            ]
+            response = ask(followup, self.response_format(schema))
+            if response is None:
+                break
+            result = self.merge(result, response, schema, choices)
+            if result.ok:
+                return result
+
+        self.stats["failed"] += 1
+        raise StructuredOutputError(f"结构化输出不合法: {result.errors}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 仓库根目录下的模块（llm_client、structured_output 等）以顶层模块导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
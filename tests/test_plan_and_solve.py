@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import threading
+import importlib.util
+
+import pytest
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "plan_and_solve", os.path.join(os.path.dirname(__file__), "..", "4.3plan_and_solve.py")
+)
+plan_and_solve = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(plan_and_solve)
+
+
+class StepLLM:
+    """按当前步骤回答，记录每一步的开始、结束时间与提示词"""
+
+    def __init__(self, delay=0.0, answer=lambda step: f"{step} 的结果"):
+        self.delay = delay
+        self.answer = answer
+        self.lock = threading.Lock()
+        self.started, self.finished, self.prompts = {}, {}, {}
+
+    def think(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        step = re.search(r"# 当前步骤：\n(.*)\n", prompt).group(1)
+        with self.lock:
+            self.started[step] = time.perf_counter()
+            self.prompts[step] = prompt
+        time.sleep(self.delay)
+        with self.lock:
+            self.finished[step] = time.perf_counter()
+        return self.answer(step)
+
+
+def diamond(width):
+    plan = [{"id": 1, "step": "准备数据", "depends_on": []}]
+    plan += [{"id": i, "step": f"分支{i}", "depends_on": [1]} for i in range(2, width + 2)]
+    plan.append({"id": width + 2, "step": "汇总", "depends_on": list(range(2, width + 2))})
+    return plan
+
+
+# ---- DAG 规范化与调度 ----
+
+def test_normalize_rejects_cycles_and_unknown_deps():
+    plan = plan_and_solve.normalize_dag_plan([
+        {"id": 1, "step": "a", "depends_on": [2]},   # 指向之后的步骤
+        {"id": 2, "step": "b", "depends_on": [1, 2]},  # 依赖自身
+        {"id": 2, "step": "c", "depends_on": [9]},   # 重复编号、未知依赖
+        "d",
+        {"step": ""},
+    ])
+    assert [(p["id"], p["step"], p["depends_on"]) for p in plan] == [
+        (1, "a", []), (2, "b", [1]), (3, "c", []), (4, "d", [3]),
+    ]
+
+
+def test_string_plan_is_sequential():
+    plan = plan_and_solve.normalize_dag_plan(["a", "b", "c"])
+    assert [p["depends_on"] for p in plan] == [[], [1], [2]]
+    assert plan_and_solve.critical_path_length(plan) == 3
+    assert plan_and_solve.critical_path_length(diamond(4)) == 3
+
+
+def test_dag_executor_respects_dependencies():
+    llm = StepLLM(delay=0.01)
+    answer = plan_and_solve.DAGExecutor(llm, max_workers=4).execute("问题", diamond(3))
+    assert answer == "汇总 的结果"
+    for branch in ("分支2", "分支3", "分支4"):
+        assert llm.started[branch] >= llm.finished["准备数据"]
+        assert llm.started["汇总"] >= llm.finished[branch]
+        assert "准备数据 的结果" in llm.prompts[branch]
+    # 每一步的提示词只包含它依赖的步骤
+    assert "准备数据 的结果" not in llm.prompts["汇总"]
+    assert "分支3 的结果" not in llm.prompts["分支2"]
+
+
+def test_dag_executor_runs_diamond_branches_in_parallel():
+    llm = StepLLM(delay=0.1)
+    started = time.perf_counter()
+    plan_and_solve.DAGExecutor(llm, max_workers=4).execute("问题", diamond(4))
+    elapsed = time.perf_counter() - started
+    # 顺序执行需要 6 x 0.1 秒，并行时约为关键路径 3 x 0.1 秒
+    assert elapsed < 0.45
+
+
+def test_execute_stream_starts_before_plan_finishes():
+    llm = StepLLM()
+    first_done = threading.Event()
+
+    def steps():
+        yield {"id": 1, "step": "第一步", "depends_on": []}
+        # 第二步要等第一步执行完才会生成：只有边规划边执行才不会卡住
+        assert first_done.wait(timeout=2)
+        yield {"id": 2, "step": "第二步", "depends_on": [1]}
+
+    original = llm.think
+    llm.think = lambda messages, **kwargs: (original(messages), first_done.set())[0]
+    assert plan_and_solve.DAGExecutor(llm).execute_stream("问题", steps()) == "第二步 的结果"
+
+
+# ---- 顺序执行器的上下文策略 ----
+
+def run_policy(policy, steps=30):
+    long_answer = lambda step: "很长的中间结果。" * 60 + f"\n事实：{step}=42"
+    executor = plan_and_solve.Executor(StepLLM(answer=long_answer), context_policy=policy)
+    executor.execute("问题", [f"第{i:02d}步" for i in range(steps)])
+    return executor.step_prompt_tokens
+
+
+@pytest.mark.parametrize("policy", [
+    plan_and_solve.DependencyPolicy(),
+    plan_and_solve.RollingSummaryPolicy(),
+    plan_and_solve.ScratchpadPolicy(max_facts=5),
+])
+def test_bounded_policies_keep_prompts_flat(policy):
+    tokens = run_policy(policy)
+    assert max(tokens[10:]) <= tokens[10] * 1.1
+
+
+def test_full_history_grows_linearly():
+    tokens = run_policy(plan_and_solve.FullHistoryPolicy())
+    assert tokens[-1] > 10 * tokens[0]
+
+
+def test_rolling_summary_uses_summarizer_when_over_budget():
+    calls = []
+    policy = plan_and_solve.RollingSummaryPolicy(summary_max_chars=200, summarizer=lambda text: calls.append(text) or "摘要")
+    run_policy(policy, steps=10)
+    assert calls and policy.summary_lines[0] == "摘要"
+    assert sum(len(line) + 1 for line in policy.summary_lines) <= 200
+
+
+def test_scratchpad_keeps_latest_facts():
+    policy = plan_and_solve.ScratchpadPolicy(max_facts=2)
+    policy.reset()
+    plan = plan_and_solve.normalize_dag_plan(["a", "b", "c"])
+    policy.record(plan, 0, "事实：x=1\n事实：y=2")
+    policy.record(plan, 1, "事实：x=3\n事实：z=4")
+    assert policy.facts == {"x": "3", "z": "4"}
+
+
+# ---- 流式计划解析 ----
+
+def feed_all(parser, text, size):
+    steps = []
+    for i in range(0, len(text), size):
+        steps.extend(parser.feed(text[i:i + size]))
+    return steps + parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, 1000])
+def test_incremental_parser_handles_any_chunking(size):
+    text = (
+        '{"id": 1, "step": "查资料", "depends_on": []}\n'
+        '{"id": 2, "step": "算结果", "depends_on": [1]}\n'
+        '{"id": 3, "step": "写总结", "depends_on": [1, 2]}'
+    )
+    steps = feed_all(plan_and_solve.IncrementalPlanParser(), text, size)
+    assert [(s["id"], s["depends_on"]) for s in steps] == [(1, []), (2, [1]), (3, [1, 2])]
+
+
+def test_incremental_parser_tolerates_garbled_lines():
+    text = (
+        "好的，以下是计划：\n"
+        "```json\n"
+        "- {'id': 1, 'step': '查资料', 'depends_on': []},\n"
+        '{"step": "没有编号", "depends_on": ["1", 1]}\n'
+        '{"id": 7, "depends_on": []}\n'
+        "```\n"
+        '{"id": 4, "step": "被截断的最后一步", "depends_on": [1'
+    )
+    parser = plan_and_solve.IncrementalPlanParser()
+    first = parser.feed(text)
+    assert [(s["id"], s["step"], s["depends_on"]) for s in first] == [(1, "查资料", []), (2, "没有编号", [1])]
+    last = parser.close()
+    assert [(s["id"], s["depends_on"]) for s in last] == [(4, [1])]
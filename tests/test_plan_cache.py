@@ -0,0 +1,60 @@
+import os
+import importlib.util
+
+import pytest
+
+from text_similarity import bigram_cosine, bigram_vector
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "plan_and_solve", os.path.join(os.path.dirname(__file__), "..", "4.3plan_and_solve.py")
+)
+plan_and_solve = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(plan_and_solve)
+PlanCache = plan_and_solve.PlanCache
+
+
+class FakeLLM:
+    """按顺序返回预设回复，并记录调用次数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def think(self, messages, response_format=None, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0) if self.responses else None
+
+
+def test_exact_template_hit_fills_slots():
+    cache = PlanCache()
+    cache.put("计算 12 加 30 的结果", ["读取 12", "加上 30", "输出结果"])
+    assert cache.get("计算 5 加 7 的结果") == ["读取 5", "加上 7", "输出结果"]
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_plan_kinds_do_not_collide():
+    cache = PlanCache()
+    question = "计算 12 加 30 的结果"
+    steps_llm = FakeLLM('["读取数字", "相加"]')
+    plan_and_solve.Planner(steps_llm, cache=cache).plan(question)
+
+    dag_llm = FakeLLM('[{"id": 1, "step": "读取数字", "depends_on": []}, {"id": 2, "step": "相加", "depends_on": [1]}]')
+    dag_plan = plan_and_solve.DAGPlanner(dag_llm, cache=cache).plan(question)
+    assert dag_llm.calls == 1
+    assert all(isinstance(step, dict) for step in dag_plan)
+
+    # 第二次各自命中自己格式的条目
+    assert cache.get(question, "dag")[1]["depends_on"] == [1]
+    assert cache.get(question) == ["读取数字", "相加"]
+
+
+def test_plan_depending_on_concrete_numbers_is_not_cached():
+    cache = PlanCache()
+    cache.put("计算 12 加 30 的结果", ["12 + 30 = 42"])
+    assert cache.get("计算 12 加 30 的结果") is None
+
+
+@pytest.mark.parametrize("a, b, expected", [("abc", "abc", 1.0), ("abc", "xyz", 0.0), ("", "abc", 0.0)])
+def test_bigram_cosine(a, b, expected):
+    assert bigram_cosine(bigram_vector(a), bigram_vector(b)) == pytest.approx(expected)
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from rate_limiter import RateLimiter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_unlimited_never_waits():
+    limiter = RateLimiter()
+
+    async def burst():
+        for _ in range(100):
+            await limiter.acquire(10_000)
+
+    run(burst())
+    assert limiter.waited == 0
+
+
+def test_request_limit_spaces_out_calls():
+    # 600 rpm = 每 0.1 秒一次，突发额度 1 次
+    limiter = RateLimiter(rpm=600, burst_seconds=0.1)
+
+    async def burst():
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+        return time.monotonic() - started
+
+    elapsed = run(burst())
+    assert 0.15 <= elapsed < 1.0
+    assert limiter.waited > 0.15
+
+
+def test_oversized_request_is_capped_to_capacity():
+    limiter = RateLimiter(tpm=6000, burst_seconds=0.1)  # 桶容量 10 个 token
+    run(limiter.acquire(1_000_000))
+    assert limiter.waited == 0
+    assert limiter._tokens == 0
+
+
+def test_settle_refunds_and_charges_difference():
+    limiter = RateLimiter(tpm=60_000, burst_seconds=1.0)  # 桶容量 1000 个 token
+    run(limiter.acquire(800))
+    limiter.settle(estimated=800, actual=300)
+    assert 700 <= limiter._tokens <= limiter.token_capacity
+
+    run(limiter.acquire(500))
+    limiter.settle(estimated=500, actual=1500)
+    assert limiter._tokens < 0  # 超出的用量让后续请求等待
@@ -0,0 +1,177 @@
+import os
+import math
+import importlib.util
+
+import pytest
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "reflection", os.path.join(os.path.dirname(__file__), "..", "4.4reflection.py")
+)
+reflection = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reflection)
+
+CodeBenchmarker = reflection.CodeBenchmarker
+
+SUM_LOOP = '''
+def total(n):
+    s = 0
+    for i in range(n):
+        s += i
+    return s
+'''
+
+SUM_FORMULA = '''
+def total(n):
+    return n * (n - 1) // 2
+'''
+
+SUM_WRONG = '''
+def total(n):
+    return n * n
+'''
+
+
+def measurement(timings, ok=True):
+    return {"ok": ok, "timings": timings, "error": None, "complexity": "O(n)"}
+
+
+def timing(n, seconds, digest="d"):
+    return {"n": n, "seconds": seconds, "digest": digest}
+
+
+# ---- 经验复杂度拟合 ----
+
+@pytest.mark.parametrize("name, f", [
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * math.log(n)),
+    ("O(n^2)", lambda n: n ** 2),
+])
+def test_fit_complexity_recovers_model(name, f):
+    timings = [{"n": n, "seconds": 1e-7 * f(n)} for n in (1000, 4000, 16000, 64000)]
+    fitted = reflection.fit_complexity(timings)
+    assert fitted["complexity"] == name
+
+
+def test_fit_complexity_exponent_is_log_slope():
+    timings = [{"n": n, "seconds": 1e-9 * n ** 2} for n in (100, 200, 400, 800)]
+    assert reflection.fit_complexity(timings)["exponent"] == pytest.approx(2.0)
+
+
+def test_fit_complexity_needs_three_points():
+    fitted = reflection.fit_complexity([{"n": 10, "seconds": 1.0}, {"n": 20, "seconds": 0.0}, {"n": 1, "seconds": 1.0}])
+    assert fitted["exponent"] is None
+    assert fitted["complexity"].startswith("未知")
+
+
+# ---- 正确性校验与加速比 ----
+
+def test_outputs_match_compares_common_sizes():
+    reference = measurement([timing(10, 1.0, "a"), timing(20, 1.0, "b")])
+    assert CodeBenchmarker.outputs_match(reference, measurement([timing(10, 0.1, "a"), timing(20, 0.1, "b"), timing(40, 0.1, "c")]))
+    assert not CodeBenchmarker.outputs_match(reference, measurement([timing(10, 0.1, "a"), timing(20, 0.1, "x")]))
+    # 参考版本无法运行时无从比较
+    assert CodeBenchmarker.outputs_match(measurement([], ok=False), measurement([timing(10, 0.1, "x")]))
+
+
+def test_speedup():
+    old = measurement([timing(10, 1.0), timing(20, 4.0)])
+    assert CodeBenchmarker.speedup(old, measurement([timing(10, 0.5), timing(20, 0.5)])) == pytest.approx(8.0)
+    # 新版本在预算内跑到了更大的规模
+    assert CodeBenchmarker.speedup(old, measurement([timing(10, 1.0), timing(20, 4.0), timing(40, 4.0)])) == float("inf")
+    assert CodeBenchmarker.speedup(old, measurement([], ok=False)) == 0.0
+    assert CodeBenchmarker.speedup(measurement([], ok=False), old) == float("inf")
+
+
+# ---- 子进程测量 ----
+
+def test_measure_reports_digests_per_size():
+    benchmarker = CodeBenchmarker(sizes=(100, 200, 400), repeat=1)
+    loop = benchmarker.measure(f"```python\n{SUM_LOOP}```")
+    formula = benchmarker.measure(SUM_FORMULA)
+    wrong = benchmarker.measure(SUM_WRONG)
+
+    assert loop["ok"] and loop["func_name"] == "total" and loop["error"] is None
+    assert [t["n"] for t in loop["timings"]] == [100, 200, 400]
+    assert CodeBenchmarker.outputs_match(loop, formula)
+    assert not CodeBenchmarker.outputs_match(loop, wrong)
+    assert "拟合的经验复杂度" in CodeBenchmarker.format_measurement(loop)
+
+
+def test_measure_reports_load_and_runtime_errors():
+    benchmarker = CodeBenchmarker(sizes=(10, 20), repeat=1)
+    assert benchmarker.measure("x = 1")["error"] == "代码中没有找到可测量的函数"
+
+    broken = benchmarker.measure("def f(n):\n    return 1 / (n - 20)")
+    assert broken["ok"] and len(broken["timings"]) == 1
+    assert broken["error"].startswith("n=20 时出错: ZeroDivisionError")
+
+
+def test_measure_stops_growing_after_size_budget():
+    benchmarker = CodeBenchmarker(sizes=(1, 2, 3), repeat=1, size_budget=0.05)
+    result = benchmarker.measure("import time\ndef f(n):\n    time.sleep(0.1)\n    return n")
+    assert [t["n"] for t in result["timings"]] == [1]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="资源上限仅在 POSIX 系统生效")
+def test_measure_applies_memory_limit_in_child():
+    benchmarker = CodeBenchmarker(sizes=(1,), repeat=1, memory_limit_mb=256)
+    result = benchmarker.measure("def f(n):\n    return len(bytearray(1024 * 1024 * 1024))")
+    assert not result["ok"]
+    assert "MemoryError" in result["error"]
+
+
+def test_measure_kills_child_on_timeout():
+    benchmarker = CodeBenchmarker(sizes=(1,), repeat=1, timeout=1)
+    result = benchmarker.measure("def f(n):\n    while True:\n        pass")
+    assert not result["ok"]
+    assert result["error"].startswith("运行超时")
+
+
+# ---- 多候选生成 ----
+
+class FakeBenchmarker:
+    """按代码内容返回预设的测量结果"""
+
+    def __init__(self, results):
+        self.results = results
+        self.measured = []
+
+    def measure(self, code):
+        self.measured.append(code)
+        return self.results[code]
+
+
+class CandidateLLM:
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.calls = []
+
+    def think_n(self, messages, n, temperature):
+        self.calls.append((n, temperature))
+        return self.candidates
+
+
+def test_best_of_n_keeps_fastest_correct_candidate():
+    reference = measurement([timing(10, 1.0, "a"), timing(20, 4.0, "b")])
+    benchmarker = FakeBenchmarker({
+        "broken": {"ok": False, "timings": [], "error": "SyntaxError"},
+        "wrong": measurement([timing(10, 0.01, "a"), timing(20, 0.01, "x")]),
+        "slow": measurement([timing(10, 0.5, "a"), timing(20, 2.0, "b")]),
+        "fast": measurement([timing(10, 0.1, "a"), timing(20, 0.5, "b")]),
+    })
+    llm = CandidateLLM(["broken", "wrong", "fast", "slow"])
+    agent = reflection.ReflectionAgent(llm, benchmarker=benchmarker, num_candidates=4, candidate_temperature=0.7)
+
+    code, best = agent._refine_best_of_n("任务", "def f(n): ...", "反馈", reference)
+    assert code == "fast" and best is benchmarker.results["fast"]
+    assert llm.calls == [(4, 0.7)]
+    assert benchmarker.measured == ["broken", "wrong", "fast", "slow"]
+
+    llm.candidates = ["broken", "wrong"]
+    assert agent._refine_best_of_n("任务", "def f(n): ...", "反馈", reference) == (None, None)
+
+
+def test_best_of_n_requires_benchmarker():
+    with pytest.raises(ValueError):
+        reflection.ReflectionAgent(CandidateLLM([]), num_candidates=2)
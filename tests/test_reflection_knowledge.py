@@ -0,0 +1,97 @@
+import os
+import importlib.util
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "reflection", os.path.join(os.path.dirname(__file__), "..", "4.4reflection.py")
+)
+reflection = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reflection)
+
+ReflectionKnowledgeStore = reflection.ReflectionKnowledgeStore
+
+PRIMES_TASK = "编写一个Python函数，找出1到n之间所有的素数 (prime numbers)。"
+
+
+def seeded_store(path=None):
+    store = ReflectionKnowledgeStore(path=path, max_feedback_chars=20)
+    store.add(PRIMES_TASK, ["试除法是 O(n√n)，请改用埃拉托斯特尼筛法" * 3, "无需改进", ""], "def primes(n): ...", 3)
+    store.add("编写一个Python函数，计算斐波那契数列的第n项。", ["递归有大量重复计算，请改用迭代"], "def fib(n): ...", 2)
+    return store
+
+
+def test_signature_ignores_case_punctuation_and_spaces():
+    assert ReflectionKnowledgeStore.signature("Find  Primes, up to N!") == ReflectionKnowledgeStore.signature("find primes up to n")
+
+
+def test_reuses_only_near_identical_tasks():
+    store = seeded_store()
+    reused = store.find_reusable("编写一个 python 函数：找出 1 到 n 之间所有的素数（Prime Numbers）")
+    assert reused is not None and reused["final_code"] == "def primes(n): ..."
+
+    # 相似但不相同的任务只作为经验注入，不直接复用
+    similar = "编写一个Python函数，找出1到n之间所有的回文素数。"
+    assert store.find_reusable(similar) is None
+    matches = store.retrieve(similar)
+    assert matches[0][1]["task"] == PRIMES_TASK
+    assert store.lesson_threshold <= matches[0][0] < store.reuse_threshold
+
+    assert store.retrieve("把一段英文文本翻译成中文") == []
+
+
+def test_reuse_threshold_is_configurable():
+    store = seeded_store()
+    similar = "编写一个Python函数，找出1到n之间所有的回文素数。"
+    score = store.retrieve(similar)[0][0]
+    store.reuse_threshold = score
+    assert store.find_reusable(similar)["task"] == PRIMES_TASK
+
+
+def test_lessons_skip_empty_and_no_change_feedback():
+    store = seeded_store()
+    lessons = store.entries[0]["lessons"]
+    assert lessons == ["试除法是 O(n√n)，请改用埃拉托斯特"]
+    text = store.format_lessons(store.retrieve(PRIMES_TASK, k=1))
+    assert text.startswith(f"- 相似任务（相似度 1.00）：{PRIMES_TASK}\n  · 评审意见：试除法")
+
+
+def test_persists_and_reloads(tmp_path):
+    path = str(tmp_path / "lessons.jsonl")
+    seeded_store(path)
+    reloaded = ReflectionKnowledgeStore(path=path)
+    assert [e["task"] for e in reloaded.entries] == [e["task"] for e in seeded_store().entries]
+    assert reloaded.find_reusable(PRIMES_TASK)["final_code"] == "def primes(n): ..."
+
+
+def test_average_iterations():
+    store = seeded_store()
+    assert store.average_iterations() == 2.5
+    assert store.average_iterations(last=1) == 2.0
+    assert ReflectionKnowledgeStore().average_iterations() == 0.0
+
+
+class ScriptedLLM:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def think(self, messages, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        return self.replies.pop(0)
+
+
+def test_agent_reuses_final_code_without_calling_llm():
+    store = ReflectionKnowledgeStore()
+    llm = ScriptedLLM(["def primes(n): ...", "请改用筛法", "def primes(n): sieve", "无需改进"])
+    first = reflection.ReflectionAgent(llm, max_iterations=3, knowledge_store=store).run(PRIMES_TASK)
+    assert first == "def primes(n): sieve"
+    assert store.entries[0]["lessons"] == ["请改用筛法"] and store.entries[0]["iterations"] == 2
+
+    # 几乎相同的任务：直接复用，不再调用模型
+    reused = reflection.ReflectionAgent(llm, knowledge_store=store).run(PRIMES_TASK.upper())
+    assert reused == first and llm.replies == [] and len(llm.prompts) == 4
+
+    # 相似任务：经验注入初始提示词
+    llm.replies = ["def palindromic_primes(n): ...", "无需改进"]
+    reflection.ReflectionAgent(llm, knowledge_store=store).run("编写一个Python函数，找出1到n之间所有的回文素数。")
+    assert "评审意见：请改用筛法" in llm.prompts[4]
@@ -0,0 +1,75 @@
+import os
+import importlib.util
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "reflection", os.path.join(os.path.dirname(__file__), "..", "4.4reflection.py")
+)
+reflection = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reflection)
+
+Memory = reflection.Memory
+
+
+def fill(memory, rounds):
+    for i in range(rounds):
+        memory.add_record("execution", f"def v{i}():\n    return {i}")
+        memory.add_record("measurement", f"被测函数：v{i}\n拟合的经验复杂度：O(n^{i})")
+        memory.add_record("reflection", f"第{i}轮反馈 " + "很长的意见" * 30)
+    return memory
+
+
+def test_last_records():
+    memory = Memory()
+    assert memory.get_last_execution() is None and memory.get_last_reflection() is None
+    fill(memory, 3)
+    assert memory.get_last_execution() == "def v2():\n    return 2"
+    assert memory.get_last_reflection().startswith("第2轮反馈")
+
+
+def test_unbounded_trajectory_keeps_every_record():
+    memory = fill(Memory(), 3)
+    trajectory = memory.get_trajectory()
+    for i in range(3):
+        assert f"def v{i}():" in trajectory and f"第{i}轮反馈" in trajectory
+    assert trajectory.count("--- 上一轮尝试（代码）---") == 3
+    assert "更早轮次的摘要" not in trajectory
+
+
+def test_window_folds_oldest_rounds_into_summaries():
+    memory = fill(Memory(window_rounds=2, summary_chars=10), 5)
+    trajectory = memory.get_trajectory()
+
+    assert trajectory.startswith("--- 更早轮次的摘要 ---\n- 第 1 轮：代码 2 行；拟合的经验复杂度：O(n^0)；反馈：第0轮反馈 很长的意……")
+    assert "- 第 3 轮：" in trajectory and "- 第 4 轮：" not in trajectory
+    assert [f"def v{i}():" in trajectory for i in range(5)] == [False, False, False, True, True]
+    # 窗口内容保持完整
+    assert trajectory.endswith(memory.get_last_reflection())
+    assert len(trajectory) < len(fill(Memory(), 5).get_trajectory()) * 0.6
+
+
+def test_incremental_trajectory_matches_rebuild():
+    memory = Memory(window_rounds=2)
+    for _ in range(5):
+        fill(memory, 1)
+        incremental = memory.get_trajectory()
+        memory._trajectory = None
+        assert memory.get_trajectory() == incremental
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "memory.json")
+    memory = fill(Memory(window_rounds=2, summary_chars=20), 4)
+    memory.save(path)
+    assert not os.path.exists(path + ".tmp")
+
+    loaded = Memory.load(path)
+    assert loaded.records == memory.records
+    assert (loaded.window_rounds, loaded.summary_chars) == (2, 20)
+    assert loaded.get_trajectory() == memory.get_trajectory()
+    assert loaded.get_last_execution() == memory.get_last_execution()
+
+    # 加载后继续追加，行为与原记忆一致
+    fill(loaded, 1)
+    fill(memory, 1)
+    assert loaded.get_trajectory() == memory.get_trajectory()
@@ -0,0 +1,81 @@
+import os
+import importlib.util
+
+# 示例脚本以数字开头，按文件路径加载
+_spec = importlib.util.spec_from_file_location(
+    "reflection", os.path.join(os.path.dirname(__file__), "..", "4.4reflection.py")
+)
+reflection = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reflection)
+
+apply_search_replace = reflection.apply_search_replace
+
+CODE = """def primes(n):
+    result = []
+    for i in range(2, n):
+        if all(i % d for d in range(2, i)):
+            result.append(i)
+    return result"""
+
+FAST_CHECK = "        if all(i % d for d in range(2, int(i ** 0.5) + 1)):"
+
+
+def test_parse_search_replace_blocks():
+    text = """说明文字
+<<<<<<< SEARCH
+    result = []
+=======
+    result = [2]
+>>>>>>> REPLACE
+<<<<<<< SEARCH
+    return result
+=======
+    return sorted(result)
+>>>>>>> REPLACE"""
+    assert reflection.parse_search_replace_blocks(text) == [
+        ("    result = []", "    result = [2]"),
+        ("    return result", "    return sorted(result)"),
+    ]
+
+
+def test_exact_match():
+    patched = apply_search_replace(CODE, [("    return result", "    return sorted(result)")])
+    assert patched == CODE.replace("return result", "return sorted(result)")
+
+
+def test_ignores_trailing_whitespace():
+    code = CODE.replace("result = []", "result = []   ")
+    search = "    result = []\n    for i in range(2, n):"
+    patched = apply_search_replace(code, [(search, "    result = []\n    for i in range(3, n):")])
+    assert "    for i in range(3, n):" in patched
+    assert "range(2, n)" not in patched
+
+
+def test_ignores_indentation_and_reindents_replacement():
+    search = "if all(i % d for d in range(2, i)):\n    result.append(i)"
+    replace = FAST_CHECK.strip() + "\n    result.append(i)"
+    patched = apply_search_replace(CODE, [(search, replace)])
+    assert patched == CODE.replace("        if all(i % d for d in range(2, i)):", FAST_CHECK)
+
+
+def test_fuzzy_match_above_threshold():
+    # 模型抄错了一个字符
+    search = "        if all(i % d for d in range(2, j)):\n            result.append(i)"
+    replace = FAST_CHECK + "\n            result.append(i)"
+    patched = apply_search_replace(CODE, [(search, replace)])
+    assert patched == CODE.replace("        if all(i % d for d in range(2, i)):", FAST_CHECK)
+
+
+def test_unlocated_block_returns_none():
+    assert apply_search_replace(CODE, [("    while True:\n        pass", "    pass")]) is None
+    assert apply_search_replace(CODE, [("    return result", "    return result"), ("    ", "x")]) is None
+    assert apply_search_replace(CODE, []) is None
+
+
+def test_blocks_apply_in_order():
+    blocks = [
+        ("    result = []", "    result = [2]"),
+        ("    for i in range(2, n):", "    for i in range(3, n, 2):"),
+    ]
+    patched = apply_search_replace(CODE, blocks)
+    assert "result = [2]" in patched and "range(3, n, 2)" in patched
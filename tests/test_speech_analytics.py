@@ -0,0 +1,58 @@
+import random
+
+from speech_analytics import AhoCorasick, SpeechAnalytics, default_lexicon
+
+
+def brute_force(text, patterns):
+    return sorted(
+        (i + len(p) - 1, p)
+        for p in set(patterns)
+        for i in range(len(text) - len(p) + 1)
+        if text.startswith(p, i)
+    )
+
+
+def test_automaton_matches_brute_force():
+    rng = random.Random(0)
+    alphabet = "abc狼人好"
+    patterns = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(30)]
+    automaton = AhoCorasick(patterns)
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        matches, _ = automaton.feed(text)
+        assert sorted(matches) == brute_force(text, patterns)
+
+
+def test_automaton_matches_across_chunks():
+    rng = random.Random(1)
+    patterns = list(default_lexicon()) + ["关羽", "张飞"]
+    automaton = AhoCorasick(patterns)
+    text = "我怀疑关羽是狼人。张飞是金水，我相信他！关羽一定在悍跳" * 3
+    expected = brute_force(text, patterns)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(text)), 5))
+        state, matches = 0, []
+        for start, end in zip([0] + cuts, cuts + [len(text)]):
+            chunk_matches, state = automaton.feed(text[start:end], state)
+            matches.extend((start + i, p) for i, p in chunk_matches)
+        assert sorted(matches) == expected
+
+
+def test_observe_speech_tracks_stances_and_keywords():
+    analytics = SpeechAnalytics(["关羽", "张飞", "刘备"])
+    analysis = analytics.observe_speech("刘备", "我确定关羽是狼人。张飞是好人，我相信他。")
+    assert analysis["stances"] == {"关羽": "accusation", "张飞": "defense"}
+    assert analysis["confidence_keywords"] == 1
+    assert analytics.suspicion("关羽") > analytics.suspicion("刘备") == analytics.suspicion("张飞") == 0.0
+
+    analytics.observe_event({"type": "day_vote", "votes": {"刘备": "关羽", "张飞": "关羽"}})
+    assert list(analytics.report())[0] == "关羽"
+    assert analytics.scores("刘备")["messages"] == 1
+
+
+def test_state_dict_round_trip():
+    analytics = SpeechAnalytics(["关羽"])
+    analytics.observe_speech("张飞", "关羽很可疑，可能是狼。")
+    restored = SpeechAnalytics()
+    restored.load_state_dict(analytics.state_dict())
+    assert restored.report() == analytics.report()
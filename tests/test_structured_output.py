@@ -0,0 +1,64 @@
+from typing import List, Literal
+
+from pydantic import BaseModel, Field
+
+from structured_output import IncrementalJSONParser, StructuredOutputEngine, coerce_mapping, parse_lenient
+
+
+class VoteModel(BaseModel):
+    vote: Literal["关羽", "张飞", "刘备"] = Field(description="投票对象")
+    reason: str = Field(description="投票理由")
+    suspicion_level: int = Field(description="怀疑程度", ge=1, le=10)
+
+
+class AnalysisModel(BaseModel):
+    suspected_players: List[str] = Field(default_factory=list)
+    confidence_level: int = 5
+
+
+def test_coerce_mapping_matches_prefix_and_abbreviated_keys():
+    data = coerce_mapping({"Vote": "关羽", "Reason": "x", "suspicion": "7"}, VoteModel)
+    assert data == {"vote": "关羽", "reason": "x", "suspicion_level": 7}
+    assert coerce_mapping({"conf_lvl": "8"}, AnalysisModel) == {"confidence_level": 8}
+
+
+def test_coerce_mapping_prefers_exact_key_and_skips_ambiguous():
+    data = coerce_mapping({"suspicion": "3", "suspicion_level": 9}, VoteModel)
+    assert data == {"suspicion_level": 9}
+
+    class TwoLevels(BaseModel):
+        trust_level: int = 0
+        trust_score: int = 0
+
+    # 前缀同时对应两个字段时不猜测
+    assert coerce_mapping({"trust": 1}, TwoLevels) == {}
+
+
+def test_parse_lenient_repairs_common_defects():
+    data, truncated = parse_lenient("```json\n{'vote': '张飞', \"reason\": \"发言矛盾\",}\n```")
+    assert data == {"vote": "张飞", "reason": "发言矛盾"} and not truncated
+
+    data, truncated = parse_lenient('{"suspected_players": ["关羽", "张飞"')
+    assert data == {"suspected_players": ["关羽", "张飞"]} and truncated
+
+
+def test_incremental_parser_returns_partial_results():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"vote": "刘') == {"vote": "刘"}
+    assert parser.feed('备", "reason"') == {"vote": "刘备"}
+    assert parser.feed(': "怀疑') == {"vote": "刘备", "reason": "怀疑"}
+    assert parser.close() == {"vote": "刘备", "reason": "怀疑"} and parser.truncated
+
+
+def test_engine_repairs_values_and_reasks_only_bad_fields():
+    engine = StructuredOutputEngine()
+    result = engine.parse('{"vote": "关 羽", "reason": "x", "suspicion_level": "15分"}', VoteModel)
+    assert result.ok and result.value.vote == "关羽" and result.value.suspicion_level == 10
+
+    result = engine.parse('{"vote": "曹操", "reason": "x", "suspicion_level": 5}', VoteModel)
+    assert not result.ok
+    prompt = engine.reask_prompt(result, VoteModel)
+    assert '"vote"' in prompt and "suspicion_level" not in prompt
+
+    merged = engine.merge(result, '{"vote": "张飞"}', VoteModel)
+    assert merged.ok and merged.value.vote == "张飞" and merged.value.suspicion_level == 5
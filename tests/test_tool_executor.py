@@ -0,0 +1,64 @@
+import os
+import sys
+import subprocess
+
+from tool import ToolExecutor
+
+
+def make_executor(top_k):
+    executor = ToolExecutor(top_k=top_k)
+    executor.registerTool("Search", "网页搜索引擎，查询实时信息", lambda q: q)
+    executor.registerTool("Calculator", "计算数学表达式", lambda q: q)
+    executor.registerTool("Weather", "查询城市天气预报", lambda q: q)
+    return executor
+
+
+def test_lists_only_relevant_tools():
+    executor = make_executor(top_k=1)
+    assert executor.getAvailableTools("帮我计算 3*7") == "- Calculator: 计算数学表达式"
+
+
+def test_lists_all_tools_without_top_k():
+    executor = make_executor(top_k=None)
+    assert executor.getAvailableTools("帮我计算 3*7").count("\n") == 2
+
+
+def test_reregistering_replaces_description():
+    executor = make_executor(top_k=1)
+    executor.registerTool("Search", "汇率换算", lambda q: q)
+    assert executor.selectTools("网页搜索", 1) != ["Search"]
+    assert executor.selectTools("汇率", 1) == ["Search"]
+
+
+def test_local_search_registration(tmp_path):
+    from tools.local_search import LocalSearchTool
+    from tools.registry import ToolRegistry
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "handbook.md").write_text("报销流程：提交发票后三个工作日内到账。", encoding="utf-8")
+    local_search = LocalSearchTool(str(tmp_path / "index"), str(docs))
+
+    registry = ToolRegistry()
+    registry.register_tool(local_search)
+    registry.registry_function("calculator", "计算数学表达式", lambda q: q)
+    assert registry.select_tools("在本地文档中查询报销流程", 1) == ["local_search"]
+
+    executor = make_executor(top_k=None)
+    executor.registerToolObject(local_search)
+    assert "handbook.md" in executor.getTool("local_search")("报销流程")
+
+
+def test_same_named_packages_do_not_shadow_my_hello_agents(tmp_path):
+    # 路径中另有名为 core / tools 的常规包时，仍然导入 my-hello-agents 中的模块
+    for name in ("core", "tools"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "__init__.py").write_text("")
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    env = dict(os.environ, PYTHONPATH=str(tmp_path))
+    proc = subprocess.run(
+        [sys.executable, "-c", "import llm_client, tool, core, tools; print(core.__file__, tools.__file__)"],
+        cwd=root, env=env, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert str(tmp_path) not in proc.stdout
@@ -0,0 +1,438 @@
+import os
+import sys
+import copy
+import json
+import types
+import random
+import asyncio
+import importlib.util
+
+import pytest
+
+
+# ---- 没有安装 agentscope 时，用最小替身模块加载 6.3agentscope.py ----
+
+class _Msg:
+    def __init__(self, name, content, role, metadata=None):
+        self.name, self.content, self.role, self.metadata = name, content, role, metadata
+
+    def get_text_content(self):
+        return self.content if isinstance(self.content, str) else str(self.content)
+
+
+class _AgentBase:
+    def __init__(self):
+        self._subscribers = {}
+
+    async def __call__(self, *args, **kwargs):
+        msg = await self.reply(*args, **kwargs)
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                await subscriber.observe(msg)
+        return msg
+
+    async def print(self, msg, last=True):
+        print(f"{msg.name}: {msg.content}")
+
+    def reset_subscribers(self, hub, subscribers):
+        self._subscribers[hub] = [s for s in subscribers if s is not self]
+
+    def remove_subscribers(self, hub):
+        self._subscribers.pop(hub, None)
+
+    def state_dict(self):
+        return {}
+
+    def load_state_dict(self, state_dict, strict=True):
+        pass
+
+
+class _ReActAgent(_AgentBase):
+    def __init__(self, name, sys_prompt, model, formatter, **kwargs):
+        super().__init__()
+        self.name = name
+
+
+class _MsgHub:
+    def __init__(self, participants, announcement=None, enable_auto_broadcast=True, name=None):
+        self.participants = list(participants)
+        self.announcement = announcement
+        self.auto = enable_auto_broadcast
+        self.name = name or id(self)
+
+    async def __aenter__(self):
+        self.set_auto_broadcast(self.auto)
+        if self.announcement is not None:
+            await self.broadcast(self.announcement)
+        return self
+
+    async def __aexit__(self, *exc):
+        for p in self.participants:
+            p.remove_subscribers(self.name)
+
+    def set_auto_broadcast(self, enable):
+        for p in self.participants:
+            if enable:
+                p.reset_subscribers(self.name, self.participants)
+            else:
+                p.remove_subscribers(self.name)
+
+    async def broadcast(self, msg):
+        for p in self.participants:
+            await p.observe(msg)
+
+
+async def _fanout_pipeline(agents, msg=None, enable_gather=True, **kwargs):
+    if enable_gather:
+        return await asyncio.gather(*[a(copy.deepcopy(msg), **kwargs) for a in agents])
+    return [await a(copy.deepcopy(msg), **kwargs) for a in agents]
+
+
+class _Placeholder:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def _stub_modules():
+    attrs = {
+        "agentscope.message": {"Msg": _Msg},
+        "agentscope.agent": {"AgentBase": _AgentBase, "ReActAgent": _ReActAgent},
+        "agentscope.pipeline": {"MsgHub": _MsgHub, "fanout_pipeline": _fanout_pipeline},
+        "agentscope.formatter": {"DashScopeMultiAgentFormatter": _Placeholder},
+        "agentscope.model": {"DashScopeChatModel": _Placeholder},
+    }
+    modules = {"agentscope": types.ModuleType("agentscope")}
+    for name, members in attrs.items():
+        module = modules[name] = types.ModuleType(name)
+        module.__dict__.update(members)
+    return modules
+
+
+@pytest.fixture(scope="module")
+def ws():
+    """加载狼人杀脚本；未安装 agentscope 时临时注入替身模块"""
+    stubs = {} if importlib.util.find_spec("agentscope") else _stub_modules()
+    saved = {name: sys.modules.get(name) for name in stubs}
+    sys.modules.update(stubs)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            "werewolf_game", os.path.join(os.path.dirname(__file__), "..", "6.3agentscope.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+def read_events(checkpoint_dir):
+    with open(os.path.join(checkpoint_dir, "events.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+# ---- 状态表与事件日志 ----
+
+def test_game_state_indexes_roles_and_factions(ws):
+    state = ws.GameState()
+    for name, role in [("甲", "狼人"), ("乙", "预言家"), ("丙", "狼人"), ("丁", "村民"), ("戊", "女巫")]:
+        state.add_player(name, role, "曹操")
+
+    assert state.alive_with_role("狼人") == ["甲", "丙"]
+    assert state.faction_alive == {"狼人阵营": 2, "好人阵营": 3}
+    assert state.check_winner() is None
+
+    assert state.kill("乙", "夜晚死亡") and not state.kill("乙", "投票出局") and not state.kill("无名", "投票出局")
+    assert state.alive_names() == ["甲", "丙", "丁", "戊"]
+    assert state.check_winner().startswith("狼人阵营胜利")
+    assert [e["seq"] for e in state.events] == [0]
+
+    state.kill("甲", "投票出局")
+    state.kill("丙", "投票出局")
+    assert state.check_winner().startswith("好人阵营胜利")
+
+
+def test_game_state_round_trip_drops_events_after_snapshot(ws):
+    state = ws.GameState()
+    for name, role in [("甲", "狼人"), ("乙", "预言家"), ("丙", "村民")]:
+        state.add_player(name, role, "刘备")
+    state.kill("丙", "夜晚死亡")
+    state.round, state.next_phase, state.witch_has_poison = 2, "day", False
+    snapshot = state.to_dict()
+    state.log_event("day_vote", votes={"甲": "乙"})  # 快照之后、未完成阶段的事件
+
+    restored = ws.GameState.from_dict(json.loads(json.dumps(snapshot)), state.events)
+    assert restored.to_dict() == snapshot
+    assert restored.alive_with_role("预言家") == ["乙"] and not restored.is_alive("丙")
+    assert [e["type"] for e in restored.events] == ["death"]
+    assert restored.log_event("day_vote", votes={})["seq"] == 1
+
+
+class Crash(Exception):
+    pass
+
+
+def test_resume_after_mid_round_crash_keeps_event_seq_contiguous(ws, tmp_path):
+    checkpoint_dir = str(tmp_path)
+    random.seed(3)
+    game = ws.ThreeKingdomsWerewolfGame(
+        player_factory=ws.scripted_player_factory("scripted", random.Random(3)),
+        verbose=False, checkpoint_dir=checkpoint_dir,
+    )
+
+    async def crash(voted_out):
+        raise Crash("进程在投票之后崩溃")
+
+    # 白天投票已写入事件日志，猎人阶段崩溃：快照仍停在第 1 轮白天开始前
+    game.hunter_phase = crash
+    result = asyncio.run(game.run_game(6))
+    assert "进程在投票之后崩溃" in result["error"]
+    with open(os.path.join(checkpoint_dir, "snapshot.json"), encoding="utf-8") as f:
+        snapshot = json.load(f)
+    assert (snapshot["state"]["round"], snapshot["state"]["next_phase"]) == (1, "day")
+    unfinished = read_events(checkpoint_dir)[snapshot["state"]["event_count"]:]
+    assert [e["type"] for e in unfinished] == ["day_vote"]
+
+    resumed = ws.ThreeKingdomsWerewolfGame.resume(
+        checkpoint_dir, player_factory=ws.scripted_player_factory("scripted", random.Random(3)), verbose=False
+    )
+    assert len(resumed.state.events) == snapshot["state"]["event_count"]
+    assert resumed.state.to_dict() == snapshot["state"]
+
+    result = asyncio.run(resumed.run_game(6))
+    assert result["winner"] is not None and "error" not in result
+
+    events = read_events(checkpoint_dir)
+    assert [e["seq"] for e in events] == list(range(len(events)))
+    assert events == resumed.state.events
+    # 第 1 轮白天重新执行，被截断的投票不会重复出现
+    vote_rounds = [e["round"] for e in events if e["type"] == "day_vote"]
+    assert vote_rounds == list(range(1, len(vote_rounds) + 1))
+    assert events[-1]["type"] == "game_over"
+
+
+# ---- 夜晚阶段调度 ----
+
+def test_phase_scheduler_passes_dependency_results(ws):
+    log = []
+
+    def phase(name, delay, result):
+        async def run(*args):
+            log.append(("start", name, args))
+            await asyncio.sleep(delay)
+            log.append(("end", name))
+            return result
+        return run
+
+    scheduler = ws.PhaseScheduler()
+    scheduler.add("werewolf", phase("werewolf", 0.05, "甲"))
+    scheduler.add("seer", phase("seer", 0.05, "乙是好人"))
+    scheduler.add("witch", phase("witch", 0, ("甲", None)), deps=("werewolf",))
+
+    loop = asyncio.new_event_loop()
+    try:
+        started = loop.time()
+        results = loop.run_until_complete(scheduler.run())
+        elapsed = loop.time() - started
+    finally:
+        loop.close()
+
+    assert results == {"werewolf": "甲", "seer": "乙是好人", "witch": ("甲", None)}
+    # 狼人与预言家并发，女巫在狼人结束后以其结果为参数开始
+    assert log[:2] == [("start", "werewolf", ()), ("start", "seer", ())]
+    assert log.index(("start", "witch", ("甲",))) > log.index(("end", "werewolf"))
+    assert elapsed < 0.09
+
+
+def test_phase_scheduler_rejects_unregistered_dependency(ws):
+    with pytest.raises(ValueError):
+        ws.PhaseScheduler().add("witch", lambda killed: killed, deps=("werewolf",))
+
+
+def test_phase_scheduler_cancels_remaining_phases_on_error(ws):
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("seer")
+            raise
+
+    async def broken():
+        raise Crash("狼人阶段出错")
+
+    scheduler = ws.PhaseScheduler().add("werewolf", broken).add("seer", slow)
+    scheduler.add("witch", lambda killed: slow(), deps=("werewolf",))
+    with pytest.raises(Crash):
+        asyncio.run(scheduler.run())
+    assert cancelled == ["seer"]
+
+
+def test_night_announcements_are_logged_in_phase_order(ws):
+    class SlowPlayer(ws.ScriptedPlayer):
+        """回复前随机等待，让并发的夜晚阶段真正交错"""
+
+        async def reply(self, *args, **kwargs):
+            await asyncio.sleep(self.rng.random() / 100)
+            return await super().reply(*args, **kwargs)
+
+    for seed in range(5):
+        random.seed(seed)
+        rng = random.Random(seed)
+        game = ws.ThreeKingdomsWerewolfGame(
+            player_factory=lambda game, name, role, character: SlowPlayer(name, role, game, rng=rng), verbose=False
+        )
+        asyncio.run(game.setup_game(6))
+        game.moderator.game_log.clear()
+        asyncio.run(game.night_phase(1))
+
+        log = game.moderator.game_log
+        # 各阶段的公告整体按 狼人 -> 预言家 -> 女巫 排列，不因并发交错
+        openings = [next(i for i, line in enumerate(log) if line.startswith(mark)) for mark in ("🐺", "🔮", "🧙")]
+        assert openings[0] == 0 and openings == sorted(openings), log
+        assert [line[:4] for line in log[openings[1]:openings[2]]] == ["🔮 预言", "查验结果"], log
+
+
+# ---- 玩家记忆压缩 ----
+
+class ListMemory:
+    def __init__(self):
+        self.content = []
+
+    async def size(self):
+        return len(self.content)
+
+    async def get_memory(self):
+        return list(self.content)
+
+    async def clear(self):
+        self.content.clear()
+
+    async def add(self, msgs):
+        self.content.extend(msgs if isinstance(msgs, list) else [msgs])
+
+
+def memory_player_factory(ws):
+    class MemoryPlayer(ws.ScriptedPlayer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.memory = ListMemory()
+
+        async def observe(self, msg):
+            await super().observe(msg)
+            await self.memory.add(msg)
+
+    return lambda game, name, role, character: MemoryPlayer(name, role, game)
+
+
+@pytest.mark.parametrize("keep_rounds", [1, 2])
+def test_compactor_keeps_only_recent_rounds(ws, keep_rounds):
+    rounds = 5
+    random.seed(0)
+    game = ws.ThreeKingdomsWerewolfGame(
+        player_factory=memory_player_factory(ws), verbose=False, memory_keep_rounds=keep_rounds
+    )
+
+    async def play():
+        await game.setup_game(6)
+        names = game.state.alive_names()
+        for rnd in range(1, rounds + 1):
+            game.state.round = rnd
+            await game.compactor.compact(rnd)
+            for speaker in names:
+                text = f"我是预言家，{names[2]}是狼人" if rnd == 1 and speaker == names[1] else f"第{rnd}轮{speaker}发言"
+                msg = ws.Msg(name=speaker, content=text, role="assistant", metadata={"round": rnd})
+                for listener in names:
+                    if listener != speaker:
+                        await game.player[listener].observe(msg)
+            game.state.log_event("day_vote", votes={names[0]: names[3]}, voted_out=None, count=1)
+        return names
+
+    names = asyncio.run(play())
+    last_folded = rounds - keep_rounds - 1
+    for listener in names:
+        msgs = game.player[listener].memory.content
+        assert msgs[0].name == "游戏主持人" and listener in msgs[0].content  # 身份消息固定保留
+        summaries = [m for m in msgs if m.name == ws.MemoryCompactor.SUMMARY_NAME]
+        assert len(summaries) == 1 and msgs[1] is summaries[0]
+        kept = {m.metadata["round"] for m in msgs[2:]}
+        assert kept == set(range(last_folded + 1, rounds + 1))
+        assert len(msgs) == 2 + (keep_rounds + 1) * (len(names) - 1)
+
+        summary = summaries[0].content
+        assert summary.startswith(f"第1-{last_folded}轮摘要")
+        assert f"第1轮：投票（{names[0]}→{names[3]}）" in summary
+        if listener != names[1]:
+            assert f"{names[1]}自称预言家（称{names[2]}是狼人）" in summary
+
+    assert game.compactor.state_dict()["pinned"] == {name: 1 for name in names}
+
+
+# ---- 脚本玩家与无头模拟 ----
+
+def scripted_game(ws, seed=0, policy="scripted"):
+    random.seed(seed)
+    game = ws.ThreeKingdomsWerewolfGame(
+        player_factory=ws.scripted_player_factory(policy, random.Random(seed)), verbose=False
+    )
+    asyncio.run(game.setup_game(6))
+    return game
+
+
+def decide(player, model):
+    msg = asyncio.run(player.reply(None, structured_model=model))
+    model(**msg.metadata)  # 决策必须能通过对应结构化模型的校验
+    return msg.metadata
+
+
+def test_scripted_player_decisions_are_valid_and_follow_role(ws):
+    game = scripted_game(ws)
+    alive = game.alive_players
+    wolves = {p.name for p in game.werewolves}
+    vote_model = ws.get_vote_model_cn(alive)
+
+    for wolf in game.werewolves:
+        for _ in range(20):
+            assert decide(wolf, vote_model)["vote"] not in wolves
+            assert decide(wolf, ws.WerewolfKillModelCN)["target"] not in wolves
+
+    seer = game.seer[0]
+    target = next(iter(wolves))
+    asyncio.run(seer.observe(ws.Msg(name="游戏主持人", content=f"查验结果：{target}是狼人", role="system")))
+    assert seer.checked == {target: "狼人"}
+    assert decide(seer, vote_model)["vote"] == target
+    assert decide(seer, ws.get_seer_model_cn(alive))["target"] != target  # 优先查验未查验过的玩家
+
+    witch = game.witch[0]
+    assert decide(witch, ws.WitchActionModelCN)["use_antidot"] is True
+    game.witch_has_antidote = False
+    assert decide(witch, ws.WitchActionModelCN)["use_antidot"] is False
+
+    speech = asyncio.run(witch.reply(None))
+    assert speech.metadata is None and speech.content
+
+
+def test_random_policy_only_picks_alive_players(ws):
+    game = scripted_game(ws, seed=1, policy="random")
+    dead = game.state.alive_names()[0]
+    game.update_alive_player([dead])
+    vote_model = ws.get_vote_model_cn(game.alive_players)
+    for player in game.alive_players:
+        vote = decide(player, vote_model)["vote"]
+        assert vote != dead and vote != player.name and game.state.is_alive(vote)
+
+
+def test_simulate_batch_is_reproducible(ws):
+    results = ws._simulate_batch(6, [1, 2, 3], "scripted")
+    again = ws._simulate_batch(6, [1, 2, 3], "scripted")
+    assert [(r["winner"], r["rounds"]) for r in results] == [(r["winner"], r["rounds"]) for r in again]
+    assert all(r["winner"] in ("好人阵营", "狼人阵营") and "error" not in r for r in results)
+
+    summary = ws.summarize_simulations(results)
+    assert summary["games"] == 3 and summary["errors"] == 0
+    assert sum(summary["win_rates"].values()) == pytest.approx(1.0)
+    assert {"setup", "night", "day"} <= set(summary["avg_phase_ms"])
@@ -0,0 +1,23 @@
+"""
+字符二元组余弦相似度：不依赖分词与向量模型，适合比较问题模板、任务描述这类短文本
+"""
+import math
+from collections import Counter
+
+BigramVector = tuple[Counter, float]
+
+
+def bigram_vector(text: str) -> BigramVector:
+    """返回 (字符二元组计数, 向量范数)，范数预先算好，重复比较时不必再算"""
+    bigrams = Counter(text[i:i + 2] for i in range(len(text) - 1))
+    return bigrams, math.sqrt(sum(v * v for v in bigrams.values()))
+
+
+def bigram_cosine(a: BigramVector, b: BigramVector) -> float:
+    """两个 bigram_vector 的余弦相似度，遍历较短的一方"""
+    (va, na), (vb, nb) = a, b
+    if not na or not nb:
+        return 0.0
+    if len(va) > len(vb):
+        va, vb = vb, va
+    return sum(c * vb.get(k, 0) for k, c in va.items()) / (na * nb)
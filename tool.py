@@ -1,12 +1,25 @@
-from typing import Dict, Any
+import os
+import sys
+from typing import Dict, Any, List, Optional
+
+# 工具检索复用 my-hello-agents 中的 BM25 工具索引
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "my-hello-agents"))
+from tools.retrieval import ToolIndex
 
 
 class ToolExecutor:
     """
     一个工具执行器，负责管理和执行工具
     """
-    def __init__(self):
+    def __init__(self, top_k: Optional[int] = None):
+        """
+        Args:
+            top_k: 提示词中最多列出的工具数量；为 None 时列出全部工具
+        """
         self.tools: Dict[str, Any] = {}
+        self.top_k = top_k
+        # 注册工具时增量更新的 BM25 索引
+        self.index = ToolIndex()
     
     def registerTool(self, name: str, description: str, func: callable):
         """
@@ -15,19 +28,36 @@ class ToolExecutor:
         if name in self.tools:
             print(f"警告：工具 '{name}' 已存在，将被覆盖。")
         self.tools[name] = {"description": description, "func": func}
+        self.index.add(name, description)
         print(f"工具 '{name}' 已注册。")
 
+    def registerToolObject(self, tool: Any):
+        """
+        注册 my-hello-agents 中的 Tool 对象（例如 LocalSearchTool），Action 的输入作为 input 参数传给 tool.run
+        """
+        self.registerTool(tool.name, tool.description, lambda tool_input: tool.run({"input": tool_input}))
+
     def getTool(self, name: str) -> callable:
         """
         根据名称获取一个工具的执行函数
         """
         return self.tools.get(name, {}).get("func")
+
+    def selectTools(self, query: str, k: int) -> List[str]:
+        """
+        用 BM25 检索与查询最相关的 k 个工具名称
+        """
+        return self.index.search(query, k)
     
-    def getAvailableTools(self) -> str:
+    def getAvailableTools(self, query: Optional[str] = None) -> str:
         """
-        获取所有可用工具的格式化描述字符串。
+        获取可用工具的格式化描述字符串。
+        设置了 top_k 并提供 query 时，只列出与 query 最相关的 top_k 个工具。
         """
+        names = list(self.tools)
+        if query and self.top_k and len(names) > self.top_k:
+            names = self.selectTools(query, self.top_k) or names
         return "\n".join([
-            f"- {name}: {info['description']}"
-            for name, info in self.tools.items()
+            f"- {name}: {self.tools[name]['description']}"
+            for name in names
         ])